@@ -45,6 +45,16 @@ class BaseAlphaSettings:
     parameters = {}
     submission_id = None
     submission_date = None
+    # number of rows before the day to generate the alpha reads, e.g. 5 if
+    # it reads up to data[-5], which bounds the window of streaming
+    # simulation; None keeps all past data in the window. Rows derived
+    # fields need (streaming.DERIVATION_MARGIN) are kept on top of it, so
+    # they should not be counted (int)
+    lookback = None
+    # CPU seconds the alpha may use in all, including its evaluation, and
+    # its generate may use on a day (float)
+    time_budget = None
+    day_time_budget = None
 
     def is_valid(self):
         """
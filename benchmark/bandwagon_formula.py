@@ -11,18 +11,7 @@ Idea:
 
 from thousandaire.alpha import BaseAlphaFormula
 from thousandaire.data_classes import Portfolio
-
-def catch_wind(data):
-    """
-    Do you feel the wind?
-
-    This function is used to check whether the price has rised/fallen
-    in consecutive x days.
-    """
-    return (all([data[x].buy < data[x + 1].buy
-                 for x in range(-len(data), -1, 1)]) or
-            all([data[x].buy > data[x + 1].buy
-                 for x in range(-len(data), -1, 1)]))
+from thousandaire.rolling import rolling
 
 class BandWagonFormula(BaseAlphaFormula):
     """
@@ -43,10 +32,12 @@ class BandWagonFormula(BaseAlphaFormula):
         portfolio = Portfolio()
         used_dataset = dataset['currency_price_tw']
         for instrument, price_data in used_dataset.items():
-            if all([item.buy for item in price_data[-self.window - 1::]]):
-                rate = ((price_data[-1].buy - price_data[-self.window - 1].buy)
-                        / price_data[-self.window - 1].buy)
-                if (catch_wind(price_data[-self.window - 1: : 1])
+            buy = rolling(price_data, 'buy', self.window + 1)
+            if buy.is_full():
+                rate = (buy.last() - buy.first()) / buy.first()
+                # Do you feel the wind?
+                if ((buy.rising() >= self.window
+                     or buy.falling() >= self.window)
                         and abs(rate) >= self.rate):
                     portfolio[instrument] = rate
         return portfolio
@@ -24,3 +24,4 @@ class AlphaSettings(BaseAlphaSettings):
     target = ('currency', 'TW')
     data_list = ['currency_price_tw']
     parameters = {'window': 2, 'rate': 0.03}
+    lookback = 3
@@ -7,6 +7,7 @@ Idea:
 """
 
 from random import randint
+import numpy as np
 from thousandaire.alpha import BaseAlphaFormula
 from thousandaire.data_classes import Portfolio
 
@@ -26,3 +27,15 @@ class DrawLotsFormula(BaseAlphaFormula):
         for instrument in self.trading_instruments:
             portfolio[instrument] = randint(-100, 100)
         return portfolio
+
+    def generate_batch(self, _date, _dataset, generators):
+        """
+        Generate positions of the given date for many replicas at once, one
+        random generator per replica.
+        """
+        draws = np.array([
+            generator.integers(-100, 101, len(self.trading_instruments))
+            for generator in generators])
+        return {
+            instrument: draws[:, column]
+            for column, instrument in enumerate(self.trading_instruments)}
@@ -20,3 +20,5 @@ class AlphaSettings(BaseAlphaSettings):
     alpha = DrawLotsFormula
     target = ('currency', 'TW')
     data_list = ['currency_price_tw']
+    # It reads no data at all.
+    lookback = 0
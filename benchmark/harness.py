@@ -0,0 +1,211 @@
+"""
+Benchmark harness measuring the speed and memory of the framework itself.
+
+Synthetic data are generated at the requested scale and committed into a
+temporary VersionStore, then the bundled alphas go through loading by
+DataLoader, `initialize`, the Simulator and the Evaluator. Timings
+and peak memory of every stage are reported as JSON, and can be compared
+against a stored baseline to catch performance regressions.
+
+Example:
+    python -m thousandaire.benchmark.harness --years 5 -o new.json \
+        --baseline old.json
+"""
+
+import argparse
+import importlib
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from thousandaire.benchmark.synthetic_data import generate_raw_data
+from thousandaire.constants import TRADING_INSTRUMENTS
+from thousandaire.data_loader import DataLoader
+from thousandaire.evaluator import Evaluator
+from thousandaire.simulation import build_simulator, initialize
+from thousandaire.version_store import VersionStore
+
+ALPHAS = {
+    'kdr': 'thousandaire.benchmark.kdr_5_settings',
+    'bandwagon': 'thousandaire.benchmark.bandwagon_settings',
+    'ngu': 'thousandaire.benchmark.ngu_settings',
+    'draw_lots': 'thousandaire.benchmark.draw_lots_settings'}
+# Number of workdays kept before start_date for alphas to warm up.
+WARM_UP_DAYS = 20
+
+def build_parser():
+    """
+    Get the benchmark scale and output options.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-n', '--instruments',
+        help='Number of instruments having data (default: all tradable).',
+        type=int, default=None)
+    parser.add_argument(
+        '-y', '--years', help='Years of data.', type=int, default=3)
+    parser.add_argument(
+        '-m', '--missing_rate', help='Rate of missing data.',
+        type=float, default=0.02)
+    parser.add_argument(
+        '--seed', help='Seed of the data generator.', type=int, default=0)
+    parser.add_argument(
+        '-a', '--alphas', help='Alphas to run, separated by spaces.',
+        nargs='*', default=list(ALPHAS), choices=list(ALPHAS))
+    parser.add_argument(
+        '-r', '--repeat',
+        help='Run each stage this many times and keep the fastest.',
+        type=int, default=1)
+    parser.add_argument(
+        '-o', '--output_path', help='Path to dump the report.',
+        action='store')
+    parser.add_argument(
+        '-b', '--baseline', help='Path of a report to compare with.',
+        action='store')
+    parser.add_argument(
+        '-t', '--tolerance',
+        help='Allowed slowdown ratio against the baseline.',
+        type=float, default=0.2)
+    return parser.parse_args()
+
+def measure(func, repeat):
+    """
+    Run func `repeat` times, then once more with memory tracing, which is
+    kept apart since tracing slows down the code a lot.
+
+    Return its last return value and a dict of the fastest wall time and
+    the peak of traced memory (in bytes).
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    tracemalloc.start()
+    value = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return value, {'seconds': best, 'peak_bytes': peak}
+
+def run_alpha(settings_path, data_all, repeat):
+    """
+    Simulate and evaluate an alpha on the bound data.
+    Return the report of the alpha.
+    """
+    settings = importlib.import_module(settings_path).AlphaSettings()
+    _, region = settings.target
+    workdays = data_all['workdays'][region]
+    settings.start_date = workdays[WARM_UP_DAYS - len(workdays)].date
+    settings.end_date = workdays[-1].date
+    results, simulate_stats = measure(
+        lambda: build_simulator(settings, data_all).run(), repeat)
+    _, evaluate_stats = measure(
+        lambda: Evaluator().run(
+            TRADING_INSTRUMENTS[settings.target], results), repeat)
+    return {
+        'days': len(results),
+        'simulate': simulate_stats,
+        'evaluate': evaluate_stats}
+
+def get_directory_size(path):
+    """
+    Return the total size in bytes of files under a directory.
+    """
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names)
+
+def run_benchmark(args):
+    """
+    Run all stages of the benchmark and return the report.
+    """
+    config = {
+        'instruments': args.instruments,
+        'years': args.years,
+        'missing_rate': args.missing_rate,
+        'seed': args.seed}
+    raw_data = generate_raw_data(
+        args.instruments, args.years, args.missing_rate, seed=args.seed)
+    with tempfile.TemporaryDirectory(prefix='versions-') as directory:
+        store = VersionStore(directory)
+        versions = {
+            name: store.commit(dataset) for name, dataset in raw_data.items()}
+        data_bytes = get_directory_size(directory)
+        raw_data, load_stats = measure(
+            lambda: DataLoader(list(versions), versions, store).get_all(),
+            args.repeat)
+    data_all, initialize_stats = measure(
+        lambda: initialize(raw_data), args.repeat)
+    stages = {
+        'load': load_stats,
+        'initialize': initialize_stats}
+    for alpha in args.alphas:
+        try:
+            stages[alpha] = run_alpha(ALPHAS[alpha], data_all, args.repeat)
+        except Exception as error: # pylint: disable=broad-except
+            # E.g. an alpha trading a fixed basket of instruments which do
+            # not all have data at this scale.
+            stages[alpha] = {
+                'error': '%s: %s' % (type(error).__name__, error)}
+            print('Warning: alpha %s failed, %s'
+                  % (alpha, stages[alpha]['error']), file=sys.stderr)
+    return {
+        'config': config,
+        'stages': stages,
+        'data_bytes': data_bytes,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+def flatten_timings(stages, prefix=''):
+    """
+    Return a dict of stage paths (e.g. 'kdr/simulate') to wall time.
+    """
+    timings = {}
+    for name, value in stages.items():
+        if not isinstance(value, dict):
+            continue
+        if 'seconds' in value:
+            timings[prefix + name] = value['seconds']
+        else:
+            timings.update(flatten_timings(value, prefix + name + '/'))
+    return timings
+
+def compare(report, baseline, tolerance):
+    """
+    Return a list of regressions: stages more than `tolerance` slower than
+    in the baseline.
+    """
+    if report['config'] != baseline['config']:
+        print('Warning: baseline was run with a different config %s.'
+              % json.dumps(baseline['config']), file=sys.stderr)
+    current = flatten_timings(report['stages'])
+    previous = flatten_timings(baseline['stages'])
+    return [
+        {'stage': stage, 'baseline': previous[stage],
+         'current': seconds, 'ratio': seconds / previous[stage]}
+        for stage, seconds in current.items()
+        if stage in previous and previous[stage] > 0
+        and seconds > previous[stage] * (1 + tolerance)]
+
+def main():
+    """
+    Run the benchmark and report.
+    """
+    args = build_parser()
+    report = run_benchmark(args)
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            report['regressions'] = compare(
+                report, json.load(file), args.tolerance)
+    if args.output_path:
+        with open(args.output_path, 'w') as file:
+            json.dump(report, file, indent=1)
+    print(json.dumps(report, indent=1))
+    if report.get('regressions'):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
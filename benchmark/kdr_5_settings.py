@@ -26,3 +26,8 @@ class AlphaSettings(BaseAlphaSettings):
     # parameters in alpha (dict)
     # optional, default value: {}
     parameters = {'k': 5}
+    # number of rows before the day to generate the alpha reads, e.g. 5 if
+    # it reads up to data[-5] (int)
+    # optional, default value: None (all rows); only shrinks the window of
+    # streaming simulation, which keeps its own margin for derived fields
+    lookback = 5
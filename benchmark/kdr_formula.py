@@ -2,9 +2,9 @@
 KDR alpha formula.
 """
 
-from collections import deque
 from thousandaire.alpha import BaseAlphaFormula
 from thousandaire.data_classes import Portfolio
+from thousandaire.rolling import rolling
 
 class AlphaFormula(BaseAlphaFormula):
     """
@@ -20,17 +20,6 @@ class AlphaFormula(BaseAlphaFormula):
         """
         BaseAlphaFormula.__init__(self, _startdate, dataset, parameters)
         self.k_days = parameters['k']
-        self.mid_last_k_days = {
-            instrument: deque(
-                (datum.buy + datum.sell) / 2
-                for datum in price_data[-self.k_days - 1: -1]
-                if all((datum.buy, datum.sell)))
-            for instrument, price_data in dataset['currency_price_tw'].items()
-        }
-        self.sum_last_k_days = {
-            instrument: sum(self.mid_last_k_days[instrument])
-            for instrument in dataset['currency_price_tw']
-        }
 
     def generate(self, _date, dataset):
         """
@@ -40,15 +29,8 @@ class AlphaFormula(BaseAlphaFormula):
         """
         portfolio = Portfolio()
         for instrument, price_data in dataset['currency_price_tw'].items():
-            if all((price_data[-1].buy, price_data[-1].sell)):
-                # maintain mid_last_k_days and sum_last_k_days for optimization.
-                new = (price_data[-1].buy + price_data[-1].sell) / 2
-                old = (self.mid_last_k_days[instrument].pop()
-                       if len(self.mid_last_k_days[instrument]) == self.k_days
-                       else 0)
-                self.mid_last_k_days[instrument].append(new)
-                self.sum_last_k_days[instrument] += new - old
+            new = price_data[-1].mid
+            if new is not None:
                 portfolio[instrument] = (
-                    self.sum_last_k_days[instrument] /
-                    len(self.mid_last_k_days[instrument]) - new)
+                    rolling(price_data, 'mid', self.k_days).mean() - new)
         return portfolio
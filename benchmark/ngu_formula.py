@@ -54,7 +54,9 @@ class NGUFormula(BaseAlphaFormula):
         for instrument in self.trading_instruments:
             today = used_dataset[instrument][-1].buy
             yesterday = used_dataset[instrument][-2].buy
-            if today > yesterday:
+            if today is None or yesterday is None:
+                pass
+            elif today > yesterday:
                 self.index[instrument] = max(
                     self.index[instrument] - 1, 0)
             elif today < yesterday:
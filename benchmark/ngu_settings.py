@@ -25,3 +25,5 @@ class AlphaSettings(BaseAlphaSettings):
     target = ('currency', 'TW')
     data_list = ['currency_price_tw']
     parameters = {'multiplier': 2, 'days': 10}
+    # It compares the last two rows, data[-1] and data[-2].
+    lookback = 2
@@ -0,0 +1,93 @@
+"""
+Generator of synthetic market data for benchmarks.
+
+Generated datasets have the same shape as what crawlers produce for
+`currency_price_tw` and `workdays`, so they can go through DataLoader-like
+loading, `simulation.initialize` and the Simulator unchanged.
+"""
+
+import datetime
+import random
+from thousandaire.constants import OFFICIAL_CURRENCY, TRADING_INSTRUMENTS
+from thousandaire.data_classes import Data, Dataset
+
+TARGET = ('currency', 'TW')
+PRICE_DATASET = 'currency_price_tw'
+START_DATE = datetime.datetime(2015, 1, 1)
+# Fraction of weekdays which are holidays.
+HOLIDAY_RATE = 0.02
+
+def generate_workdays(start_date, years, holiday_rate, rng):
+    """
+    Return a Data of workdays: weekdays in the given period, with a
+    fraction `holiday_rate` of them randomly removed as holidays.
+    """
+    workdays = Data('workdays', [])
+    end_date = start_date.replace(year=start_date.year + years)
+    date = start_date
+    while date < end_date:
+        if date.weekday() < 5 and rng.random() >= holiday_rate:
+            workdays.append((date,))
+        date += datetime.timedelta(days=1)
+    return workdays
+
+def generate_prices(workdays, instrument, missing_rate, rng):
+    """
+    Return a Data of buy/sell prices of the instrument on workdays.
+
+    Middle prices follow a geometric random walk and spreads are drawn
+    around 0.2%. A fraction `missing_rate` of days is missing: half of them
+    have no row at all, the other half have a row without prices.
+    """
+    history = Data(instrument, ['buy', 'sell'])
+    price = rng.uniform(0.1, 40)
+    for workday in workdays:
+        price *= 1 + rng.gauss(0, 0.005)
+        dice = rng.random()
+        if dice < missing_rate / 2:
+            continue
+        if dice < missing_rate:
+            history.append((workday.date, None, None))
+            continue
+        spread = price * rng.uniform(0.001, 0.003)
+        history.append((workday.date, price - spread, price + spread))
+    return history
+
+def generate_raw_data(instruments=None, years=3, missing_rate=0.02, seed=0):
+    """
+    Return raw data in the format of DataLoader.get_all(), over `years`
+    years from START_DATE.
+
+    instruments: number of instruments having data, at most the number of
+        tradable instruments of the target. The official currency always has
+        data (with constant price 1), the others are filled in the order of
+        TRADING_INSTRUMENTS. Remaining instruments have no data at all.
+        If None, all tradable instruments have data.
+    """
+    tradable = TRADING_INSTRUMENTS[TARGET]
+    if instruments is None:
+        instruments = len(tradable)
+    if not 1 <= instruments <= len(tradable):
+        raise ValueError(
+            'Number of instruments should be in [1, %d].' % len(tradable))
+    rng = random.Random(seed)
+    _, region = TARGET
+    base = OFFICIAL_CURRENCY[region]
+    workdays = generate_workdays(START_DATE, years, HOLIDAY_RATE, rng)
+    with_data = [
+        instrument for instrument in tradable
+        if instrument != base][:instruments - 1]
+    prices = {}
+    for instrument in tradable:
+        if instrument == base:
+            prices[instrument] = Data(instrument, ['buy', 'sell'])
+            prices[instrument].extend(
+                (workday.date, 1., 1.) for workday in workdays)
+        elif instrument in with_data:
+            prices[instrument] = generate_prices(
+                workdays, instrument, missing_rate, rng)
+        else:
+            prices[instrument] = Data(instrument, ['buy', 'sell'])
+    return {
+        PRICE_DATASET: Dataset(PRICE_DATASET, prices),
+        'workdays': Dataset('workdays', {region: workdays})}
@@ -0,0 +1,366 @@
+"""
+Distributed simulation with a coordinator and workers on other hosts.
+
+The coordinator serves a broker (a multiprocessing BaseManager) holding a
+job queue, a result queue and the objects of its VersionStore. Each job is
+an alpha settings path, optionally with a point of a parameter sweep, and
+the dataset versions to simulate on. Workers pull jobs, fetch objects of
+those versions they do not have yet into a local cache (a VersionStore,
+verified by hash), keep the bound data of the last versions warm, run the
+alpha and push results back.
+
+A worker reports a job when it starts it, so that a job running longer
+than the timeout on its worker (e.g. one which hangs, or whose host is gone)
+is queued again for another worker, up to MAX_ATTEMPTS times. The first
+result of a job wins.
+
+Coordinate:
+    python -m thousandaire.cluster coordinate --port 50000 --authkey secret \
+        -p thousandaire.benchmark.kdr_5_settings --sweep '{"k": [3, 5, 10]}' \
+        --timeout 600
+Work (on every host, as many as cores):
+    python -m thousandaire.cluster work --host coordinator-host \
+        --port 50000 --authkey secret --processes 8
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from multiprocessing.managers import BaseManager
+from thousandaire.constants import DATA_LIST_ALL, DATA_DIR
+from thousandaire.data_loader import DataLoader
+from thousandaire.scheduler import ERROR, OK, TIMEOUT
+from thousandaire.simulation import handle_result, initialize, run_alpha
+from thousandaire.version_store import VersionStore
+
+DEFAULT_PORT = 50000
+CACHE_DIR = os.path.join(DATA_DIR, 'cluster_cache')
+# Seconds workers wait for the coordinator to start.
+CONNECT_TIMEOUT = 60
+# Seconds between two checks of running jobs against the timeout.
+POLL_INTERVAL = 1
+# Attempts of a job before it gets a timeout result.
+MAX_ATTEMPTS = 2
+
+JOBS = queue.Queue()
+RESULTS = queue.Queue()
+OBJECTS = {}
+
+class ObjectServer: # pylint: disable=too-few-public-methods
+    """
+    Serve objects of the coordinator's VersionStore to workers.
+    """
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, digest):
+        """
+        Return the content of an object.
+        """
+        return self.store.get(digest)
+
+def set_store_path(path):
+    """
+    Initialize the broker process with the VersionStore to serve.
+    """
+    OBJECTS['server'] = ObjectServer(VersionStore(path))
+
+def get_jobs():
+    """
+    Return the job queue of the broker.
+    """
+    return JOBS
+
+def get_results():
+    """
+    Return the result queue of the broker.
+    """
+    return RESULTS
+
+def get_objects():
+    """
+    Return the object server of the broker.
+    """
+    return OBJECTS['server']
+
+class Broker(BaseManager):
+    """
+    Manager serving queues and objects between coordinator and workers.
+    """
+
+Broker.register('get_jobs', callable=get_jobs)
+Broker.register('get_results', callable=get_results)
+Broker.register('get_objects', callable=get_objects)
+
+def build_parser():
+    """
+    Get the role and its options.
+    """
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    coordinate_parser = subparsers.add_parser(
+        'coordinate', help='Serve jobs and collect results.')
+    coordinate_parser.add_argument(
+        '-p', '--alpha_settings_paths',
+        help='Paths of alpha settings files, separated by spaces.',
+        nargs='*')
+    coordinate_parser.add_argument(
+        '--sweep',
+        help='A JSON object of parameter names to lists of values. Every '
+             'alpha runs on every combination of them.',
+        type=json.loads, default=None)
+    coordinate_parser.add_argument(
+        '-s', '--skip_evaluation',
+        help='Running the simulation without evaluation..',
+        action='store_true')
+    coordinate_parser.add_argument(
+        '-q', '--quiet_mode',
+        help='Running the simulation without output to screen.',
+        action='store_true')
+    coordinate_parser.add_argument(
+        '-o', '--output_path',
+        help='Path to dump simulation results, into a directory per job.',
+        action='store')
+    coordinate_parser.add_argument(
+        '--host', help='Interface to serve on.', default='')
+    coordinate_parser.add_argument(
+        '--timeout',
+        help='Wall seconds a job may run on a worker before it is queued '
+             'again for another worker.',
+        type=float, default=None)
+    work_parser = subparsers.add_parser(
+        'work', help='Run jobs from a coordinator.')
+    work_parser.add_argument(
+        '--host', help='Host of the coordinator.', default='127.0.0.1')
+    work_parser.add_argument(
+        '--processes', help='Number of worker processes.',
+        type=int, default=os.cpu_count())
+    work_parser.add_argument(
+        '--cache_path', help='Directory to cache data objects in.',
+        default=CACHE_DIR)
+    for sub in (coordinate_parser, work_parser):
+        sub.add_argument(
+            '--port', help='Port of the broker.', type=int,
+            default=DEFAULT_PORT)
+        sub.add_argument(
+            '--authkey', help='Shared secret of the broker.', required=True)
+    return parser.parse_args()
+
+def snapshot_versions(store):
+    """
+    Return latest version ids of all datasets, committing datasets which
+    have no versions yet (legacy files), so that workers can fetch them.
+    """
+    versions = {}
+    for data_name in DATA_LIST_ALL:
+        versions[data_name] = store.resolve(data_name)
+        if versions[data_name] is None:
+            versions[data_name] = store.commit(
+                DataLoader([data_name], store=store).get_all()[data_name])
+    return versions
+
+def build_jobs(alpha_settings_paths, versions, sweep=None,
+               skip_evaluation=False):
+    """
+    Return jobs of alphas on every point of the sweep.
+    """
+    sweep = {} if sweep is None else sweep
+    points = [
+        dict(zip(sweep, values))
+        for values in itertools.product(*sweep.values())]
+    return [
+        {'job_id': job_id,
+         'alpha_settings_path': path,
+         'parameters': parameters,
+         'skip_evaluation': skip_evaluation,
+         'versions': versions}
+        for job_id, (path, parameters) in enumerate(
+            itertools.product(alpha_settings_paths, points))]
+
+def expire(started, timeout):
+    """
+    Return ids of jobs which have run for more than timeout seconds, and
+    drop them from started.
+
+    started: a dict of ids of running jobs to when they started.
+    """
+    if timeout is None:
+        return []
+    now = time.time()
+    expired = [
+        job_id for job_id, start in started.items() if now - start > timeout]
+    for job_id in expired:
+        del started[job_id]
+    return expired
+
+def coordinate(jobs, broker, store, timeout=None):
+    """
+    Serve jobs to workers and yield (job, result) in the order they finish.
+
+    broker: a Broker which is not started yet.
+    timeout: wall seconds a job may run on a worker before it is queued
+        again, or None for no limit.
+    result: a dict of `status` ('ok', 'timeout' or 'error'), and `result`
+        (what run_alpha returns) or `error` (the traceback or the reason).
+    """
+    broker.start(set_store_path, (store.path,))
+    try:
+        job_queue = broker.get_jobs() # pylint: disable=no-member
+        for job in jobs:
+            job_queue.put(job)
+        results = broker.get_results() # pylint: disable=no-member
+        attempts = {job['job_id']: 1 for job in jobs}
+        started = {}
+        while attempts:
+            try:
+                job_id, result = results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                job_id = None
+            if job_id in attempts and result is None:
+                started[job_id] = time.time()
+            elif job_id in attempts:
+                del attempts[job_id]
+                started.pop(job_id, None)
+                yield jobs[job_id], result
+            for job_id in expire(started, timeout):
+                if attempts[job_id] < MAX_ATTEMPTS:
+                    attempts[job_id] += 1
+                    job_queue.put(jobs[job_id])
+                    continue
+                del attempts[job_id]
+                yield jobs[job_id], {
+                    'status': TIMEOUT,
+                    'error': 'Over the timeout of %.1f seconds in %d attempts'
+                             % (timeout, MAX_ATTEMPTS)}
+    finally:
+        broker.shutdown()
+
+def fetch(cache, objects, digest):
+    """
+    Copy an object into the cache unless it is already there.
+    """
+    if os.path.isfile(cache.object_path(digest)):
+        return
+    if cache.put(objects.get(digest)) != digest:
+        raise IOError('Object %s is corrupted in transfer.' % digest)
+
+def load_versions(cache, objects, versions):
+    """
+    Fetch the given dataset versions into the cache and return bound data.
+    """
+    for data_name, version in versions.items():
+        fetch(cache, objects, version)
+        for content in cache.get_manifest(
+                data_name, version)['instruments'].values():
+            for digest in content['segments']:
+                fetch(cache, objects, digest)
+    data_all = initialize(
+        DataLoader(list(versions), versions, cache).get_all())
+    data_all['versions'] = versions
+    return data_all
+
+def connect(address, authkey, timeout=CONNECT_TIMEOUT):
+    """
+    Connect to the broker, waiting up to timeout seconds for it to start.
+    """
+    broker = Broker(address=address, authkey=authkey)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            broker.connect()
+            return broker
+        except ConnectionRefusedError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.5)
+
+def work(address, authkey, cache_path=CACHE_DIR):
+    """
+    Run jobs of the coordinator until it goes away.
+    """
+    broker = connect(address, authkey)
+    # pylint: disable=no-member
+    jobs = broker.get_jobs()
+    results = broker.get_results()
+    objects = broker.get_objects()
+    cache = VersionStore(cache_path)
+    loaded_versions = None
+    data_all = None
+    while True:
+        try:
+            job = jobs.get()
+        except (EOFError, OSError):
+            return
+        try:
+            results.put((job['job_id'], None))
+            if job['versions'] != loaded_versions:
+                data_all = load_versions(cache, objects, job['versions'])
+                loaded_versions = job['versions']
+            result = {'status': OK, 'result': run_alpha(
+                data_all, job['alpha_settings_path'], job['skip_evaluation'],
+                {'parameters': job['parameters']})}
+        except TimeoutError:
+            result = {'status': TIMEOUT, 'error': traceback.format_exc()}
+        except Exception: # pylint: disable=broad-except
+            result = {'status': ERROR, 'error': traceback.format_exc()}
+        try:
+            results.put((job['job_id'], result))
+        except (EOFError, OSError):
+            return
+
+def handle_job(job, result, args):
+    """
+    Handle the result of a job by simulation.handle_result, including the
+    status and error of a job which failed. With an output path, each job
+    has a directory of its own there, named by its job id.
+    """
+    label = job['alpha_settings_path']
+    if job['parameters']:
+        label = '%s %s' % (label, json.dumps(job['parameters']))
+    output_path = None
+    if args.output_path:
+        output_path = os.path.join(args.output_path, str(job['job_id']))
+        os.makedirs(output_path, exist_ok=True)
+    results_set = None
+    if result['status'] == OK:
+        instruments, results, eval_results, profile_results = result['result']
+        results_set = (results, eval_results, instruments, profile_results)
+    handle_result(
+        label, results_set, args.quiet_mode, output_path, {
+            'data_versions': job['versions'],
+            'parameters': job['parameters'],
+            'status': result['status'],
+            'error': result.get('error')})
+
+def main():
+    """
+    Coordinate, or work for a coordinator.
+    """
+    args = build_parser()
+    authkey = args.authkey.encode('utf-8')
+    if args.command == 'work':
+        processes = [
+            multiprocessing.Process(
+                target=work,
+                args=((args.host, args.port), authkey, args.cache_path))
+            for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return
+    store = VersionStore()
+    jobs = build_jobs(
+        args.alpha_settings_paths, snapshot_versions(store), args.sweep,
+        args.skip_evaluation)
+    broker = Broker(address=(args.host, args.port), authkey=authkey)
+    for job, result in coordinate(jobs, broker, store, args.timeout):
+        handle_job(job, result, args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Unit tests for distributed simulation.
+"""
+
+import multiprocessing
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from thousandaire import cluster
+from thousandaire.benchmark.synthetic_data import generate_raw_data
+from thousandaire.version_store import VersionStore
+
+ALPHA = 'thousandaire.benchmark.kdr_5_settings'
+AUTHKEY = b'secret'
+
+def get_free_port():
+    """
+    Return a port which is free to listen on.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class TestCluster(unittest.TestCase):
+    """
+    Unit test object for a coordinator with local workers.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = VersionStore(self.path)
+        # Synthetic data covering the dates of the alpha settings.
+        self.versions = {
+            name: self.store.commit(dataset)
+            for name, dataset in generate_raw_data(
+                instruments=6, years=6).items()}
+        self.address = ('127.0.0.1', get_free_port())
+        self.workers = []
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.join(10)
+            if worker.is_alive():
+                worker.terminate()
+        shutil.rmtree(self.path)
+
+    def start_workers(self, count):
+        """
+        Start local workers with caches of their own.
+        """
+        for index in range(count):
+            worker = multiprocessing.Process(
+                target=cluster.work,
+                args=(self.address, AUTHKEY, '%s/cache%d' % (self.path, index)))
+            worker.start()
+            self.workers.append(worker)
+
+    def coordinate(self, jobs, timeout=None):
+        """
+        Return a dict of job ids to results of jobs.
+        """
+        broker = cluster.Broker(address=self.address, authkey=AUTHKEY)
+        return {
+            job['job_id']: result
+            for job, result in cluster.coordinate(
+                jobs, broker, self.store, timeout)}
+
+    def test_sweep(self):
+        """
+        Every job of a sweep should get its result from the workers.
+        """
+        jobs = cluster.build_jobs(
+            [ALPHA, 'thousandaire.no_such_settings'], self.versions,
+            {'k': [3, 5]}, skip_evaluation=True)
+        self.start_workers(2)
+        results = self.coordinate(jobs)
+        self.assertEqual(len(results), 4)
+        for job in jobs:
+            result = results[job['job_id']]
+            if job['alpha_settings_path'] == ALPHA:
+                self.assertEqual(result['status'], cluster.OK)
+                self.assertGreater(len(result['result'][1]), 100)
+            else:
+                self.assertEqual(result['status'], cluster.ERROR)
+        pnls = [
+            [sum(today.pnl.values()) for today in results[job_id]['result'][1]]
+            for job_id in (0, 1)]
+        self.assertNotEqual(pnls[0], pnls[1])
+
+    def test_requeue(self):
+        """
+        A job started by a worker which goes away should be run again by
+        another worker after the timeout.
+        """
+        jobs = cluster.build_jobs([ALPHA], self.versions, skip_evaluation=True)
+        def stall():
+            broker = cluster.connect(self.address, AUTHKEY)
+            # pylint: disable=no-member
+            job = broker.get_jobs().get()
+            broker.get_results().put((job['job_id'], None))
+            self.start_workers(2)
+        thread = threading.Thread(target=stall)
+        thread.start()
+        results = self.coordinate(jobs, timeout=2)
+        thread.join()
+        self.assertEqual(results[0]['status'], cluster.OK)
+
+    def test_timeout(self):
+        """
+        A job which times out in all attempts should get a timeout result.
+        """
+        jobs = cluster.build_jobs([ALPHA], self.versions)
+        def stall():
+            broker = cluster.connect(self.address, AUTHKEY)
+            # pylint: disable=no-member
+            for _ in range(cluster.MAX_ATTEMPTS):
+                job = broker.get_jobs().get()
+                broker.get_results().put((job['job_id'], None))
+        thread = threading.Thread(target=stall)
+        thread.start()
+        results = self.coordinate(jobs, timeout=1)
+        thread.join()
+        self.assertEqual(results[0]['status'], cluster.TIMEOUT)
+
+if __name__ == '__main__':
+    unittest.main()
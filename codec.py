@@ -0,0 +1,261 @@
+"""
+Compact binary encoding of data rows.
+
+Rows of a Data object, i.e. (date, value, ...) tuples, are stored column by
+column:
+    dates: ticks, i.e. day ordinals of daily rows, or seconds since
+        1970-01-01 of rows within days (e.g. intraday bars), as the first
+        tick and the deltas between rows in the smallest unsigned integer
+        type which fits them.
+    fields: a presence bitmap (np.packbits) of values which are not None,
+        and the present values by kind, chosen per field:
+            float64 or float32: numbers, where NaN is a value of its own.
+            int64 and bool: integers and booleans.
+            object: anything else (e.g. strings), pickled as a list.
+The columns may then be compressed by zlib as one block.
+
+Encoded content decodes either straight into arrays (decode_arrays), or
+back into rows (decode_rows), where None and NaN stay apart.
+
+Layout:
+    MAGIC | header length (uint32) | JSON header | (compressed) columns
+"""
+
+import datetime
+import json
+import pickle
+import struct
+import zlib
+import numpy as np
+
+MAGIC = b'TDC2'
+DEFAULT_DTYPE = 'float64'
+DELTA_DTYPES = ('uint8', 'uint16', 'uint32')
+MIDNIGHT = datetime.time()
+SECONDS_PER_DAY = 86400
+# Day ordinal of 1970-01-01, where ticks in seconds start.
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+INT64_MIN = int(np.iinfo(np.int64).min)
+INT64_MAX = int(np.iinfo(np.int64).max)
+
+def rows_to_arrays(rows, fields):
+    """
+    Return day ordinals (int64) and a dict of fields to arrays of the given
+    rows: float64 with NaN for None for numbers, or object arrays for other
+    fields.
+    """
+    columns = list(zip(*rows)) if rows else [()] * (len(fields) + 1)
+    ordinals = np.array(
+        [date.toordinal() for date in columns[0]], dtype=np.int64)
+    values = {}
+    for field, column in zip(fields, columns[1:]):
+        try:
+            values[field] = np.array(
+                [np.nan if value is None else value for value in column],
+                dtype=np.float64)
+        except (TypeError, ValueError):
+            values[field] = np.array(column, dtype=object)
+    return ordinals, values
+
+def get_date_type(dates):
+    """
+    Return the name of the type of dates, which should be all datetime or
+    all date.
+    """
+    if all(isinstance(date, datetime.datetime) for date in dates):
+        return 'datetime'
+    if all(isinstance(date, datetime.date) for date in dates):
+        return 'date'
+    raise TypeError('Dates should be all datetime or all date.')
+
+def get_resolution(dates):
+    """
+    Return 'day' if all dates are days (or datetimes at midnight), else
+    'second'. Raise ValueError for dates which do not fit in seconds.
+    """
+    resolution = 'day'
+    for date in dates:
+        if not isinstance(date, datetime.datetime) or date.time() == MIDNIGHT:
+            continue
+        if date.microsecond or date.tzinfo is not None:
+            raise ValueError(
+                'Only naive datetimes in whole seconds can be encoded.')
+        resolution = 'second'
+    return resolution
+
+def to_ticks(dates, resolution):
+    """
+    Return int64 ticks of dates in the given resolution.
+    """
+    if resolution == 'day':
+        return np.array([date.toordinal() for date in dates], dtype=np.int64)
+    return np.array([
+        (date.toordinal() - EPOCH_ORDINAL) * SECONDS_PER_DAY
+        + date.hour * 3600 + date.minute * 60 + date.second
+        for date in dates], dtype=np.int64)
+
+def get_kind(values, dtype=None):
+    """
+    Return how present values of a field are stored.
+
+    dtype: 'float32' or 'float64' for numbers, float64 by default.
+    """
+    types = set(map(type, values))
+    if not types:
+        return dtype or DEFAULT_DTYPE
+    if all(issubclass(kind, (bool, np.bool_)) for kind in types):
+        return 'bool'
+    if dtype is None and all(
+            issubclass(kind, (int, np.integer))
+            and not issubclass(kind, (bool, np.bool_)) for kind in types):
+        if INT64_MIN <= min(values) and max(values) <= INT64_MAX:
+            return 'int64'
+    if all(issubclass(kind, (int, float, np.number)) for kind in types):
+        return dtype or DEFAULT_DTYPE
+    return 'object'
+
+def encode_values(values, kind):
+    """
+    Return bytes of present values of a field stored as kind.
+    """
+    if kind == 'object':
+        content = pickle.dumps(list(values))
+        return struct.pack('<Q', len(content)) + content
+    return np.array(values, dtype=kind).tobytes()
+
+def encode(rows, fields, dtypes=None, compress=True):
+    """
+    Encode rows into bytes.
+
+    fields: names of fields other than `date`.
+    dtypes: an optional dict of fields to 'float32' or 'float64', for
+        fields of numbers. Numbers of other fields are stored in float64,
+        which is lossless, or int64 if they are all integers.
+    compress: whether to compress the columns by zlib.
+    """
+    dtypes = {} if dtypes is None else dtypes
+    columns = list(zip(*rows)) if rows else [()] * (len(fields) + 1)
+    resolution = get_resolution(columns[0])
+    ticks = to_ticks(columns[0], resolution)
+    deltas = np.diff(ticks)
+    if (deltas < 0).any():
+        raise ValueError('Rows should be in date order.')
+    header = {
+        'fields': list(fields),
+        'kinds': [],
+        'count': len(rows),
+        'first': int(ticks[0]) if len(rows) > 0 else None,
+        'date_type': get_date_type(columns[0]),
+        'resolution': resolution,
+        'delta_dtype': next(
+            (dtype for dtype in DELTA_DTYPES
+             if len(deltas) == 0 or deltas.max() <= np.iinfo(dtype).max),
+            'uint64'),
+        'compressed': compress}
+    parts = [deltas.astype(header['delta_dtype']).tobytes()]
+    for field, column in zip(fields, columns[1:]):
+        present = np.array([value is not None for value in column], dtype=bool)
+        values = [value for value in column if value is not None]
+        header['kinds'].append(get_kind(values, dtypes.get(field)))
+        parts.append(np.packbits(present).tobytes())
+        parts.append(encode_values(values, header['kinds'][-1]))
+    body = b''.join(parts)
+    if compress:
+        body = zlib.compress(body)
+    header = json.dumps(header).encode('utf-8')
+    return MAGIC + struct.pack('<I', len(header)) + header + body
+
+def parse(content):
+    """
+    Return the header and the uncompressed columns of encoded content.
+    """
+    if content[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not encoded by codec.')
+    start = len(MAGIC) + 4
+    (length,) = struct.unpack('<I', content[len(MAGIC):start])
+    header = json.loads(content[start:start + length].decode('utf-8'))
+    body = content[start + length:]
+    if header['compressed']:
+        body = zlib.decompress(body)
+    return header, body
+
+def decode_values(body, offset, kind, count):
+    """
+    Return present values of a field stored as kind from offset, and the
+    offset after them.
+    """
+    if kind == 'object':
+        (length,) = struct.unpack('<Q', body[offset:offset + 8])
+        values = np.empty(count, dtype=object)
+        # Assigned one by one, since values may be sequences themselves.
+        for index, value in enumerate(
+                pickle.loads(body[offset + 8:offset + 8 + length])):
+            values[index] = value
+        return values, offset + 8 + length
+    values = np.frombuffer(body, kind, count, offset)
+    return values, offset + values.nbytes
+
+def decode(content):
+    """
+    Return the header, ticks (int64, see to_ticks), and a dict of fields to
+    (presence mask, present values) of encoded content.
+    """
+    header, body = parse(content)
+    count = header['count']
+    deltas = np.frombuffer(body, header['delta_dtype'], max(count - 1, 0))
+    offset = deltas.nbytes
+    ticks = np.empty(count, dtype=np.int64)
+    if count > 0:
+        ticks[0] = header['first']
+        np.cumsum(deltas, out=ticks[1:])
+        ticks[1:] += header['first']
+    columns = {}
+    for field, kind in zip(header['fields'], header['kinds']):
+        bitmap = np.frombuffer(body, np.uint8, (count + 7) // 8, offset)
+        offset += bitmap.nbytes
+        present = np.unpackbits(bitmap, count=count).astype(bool)
+        values, offset = decode_values(
+            body, offset, kind, int(present.sum()))
+        columns[field] = (present, values)
+    return header, ticks, columns
+
+def decode_arrays(content):
+    """
+    Decode content into dates and a dict of fields to arrays.
+
+    Dates are day ordinals (int64) of daily rows, or datetime64[s] of rows
+    within days. Fields of numbers are float64 arrays with NaN for None (so
+    that None and NaN are alike there), other fields are object arrays with
+    None.
+    """
+    header, ticks, columns = decode(content)
+    arrays = {}
+    for field, kind in zip(header['fields'], header['kinds']):
+        present, values = columns[field]
+        if kind == 'object':
+            arrays[field] = np.full(len(ticks), None, dtype=object)
+        else:
+            arrays[field] = np.full(len(ticks), np.nan)
+        arrays[field][present] = values
+    if header['resolution'] == 'second':
+        return ticks.astype('datetime64[s]'), arrays
+    return ticks, arrays
+
+def decode_rows(content):
+    """
+    Decode content back into rows, with None for nulls.
+    """
+    header, ticks, columns = decode(content)
+    if header['resolution'] == 'second':
+        dates = ticks.astype('datetime64[s]').astype(datetime.datetime).tolist()
+    elif header['date_type'] == 'datetime':
+        dates = [datetime.datetime.fromordinal(x) for x in ticks.tolist()]
+    else:
+        dates = [datetime.date.fromordinal(x) for x in ticks.tolist()]
+    fields = []
+    for field in header['fields']:
+        present, values = columns[field]
+        column = np.full(len(ticks), None, dtype=object)
+        column[present] = values if values.dtype == object else values.tolist()
+        fields.append(column.tolist())
+    return list(zip(dates, *fields))
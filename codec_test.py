@@ -0,0 +1,96 @@
+"""
+Unit tests for the codec of stored data.
+"""
+
+import unittest
+from datetime import datetime
+import numpy as np
+from thousandaire import codec
+
+class TestCodec(unittest.TestCase):
+    """
+    Unit test object for codec.
+    """
+    def setUp(self):
+        self.rows = [
+            (datetime(2020, 1, 2), 30.1234, 30.2234),
+            (datetime(2020, 1, 3), None, None),
+            (datetime(2020, 1, 6), 30.5, None),
+            (datetime(2021, 3, 1), 31.25, 31.5)]
+
+    def test_round_trip(self):
+        """
+        Rows should be decoded as they were, with or without compression.
+        """
+        for compress in (True, False):
+            content = codec.encode(self.rows, ['buy', 'sell'], None, compress)
+            self.assertEqual(codec.decode_rows(content), self.rows)
+
+    def test_decode_arrays(self):
+        """
+        Arrays should have ordinals and NaN for nulls, and float32 fields
+        should be stored in 4 bytes per value.
+        """
+        float64 = codec.encode(self.rows, ['buy', 'sell'], None, False)
+        float32 = codec.encode(
+            self.rows, ['buy', 'sell'], {'buy': 'float32'}, False)
+        self.assertEqual(len(float64) - len(float32), 3 * 4)
+        ordinals, values = codec.decode_arrays(float32)
+        np.testing.assert_array_equal(
+            ordinals, [row[0].toordinal() for row in self.rows])
+        np.testing.assert_allclose(
+            values['buy'], [30.1234, np.nan, 30.5, 31.25], rtol=1e-7)
+        np.testing.assert_array_equal(
+            np.isnan(values['sell']), [False, True, True, False])
+
+    def test_none_and_nan(self):
+        """
+        None and NaN should be told apart in rows.
+        """
+        rows = [(datetime(2020, 1, 2), None), (datetime(2020, 1, 3), np.nan)]
+        decoded = codec.decode_rows(codec.encode(rows, ['buy']))
+        self.assertIsNone(decoded[0][1])
+        self.assertTrue(np.isnan(decoded[1][1]))
+
+    def test_other_kinds(self):
+        """
+        Integers, booleans and other values should keep their types.
+        """
+        rows = [
+            (datetime(2020, 1, 2), 3, True, 'open', None),
+            (datetime(2020, 1, 3), None, False, None, (1, 2)),
+            (datetime(2020, 1, 6), 2 ** 40, None, 'closed', (3, 4))]
+        content = codec.encode(rows, ['count', 'flag', 'state', 'pair'])
+        decoded = codec.decode_rows(content)
+        self.assertEqual(decoded, rows)
+        self.assertIs(type(decoded[0][1]), int)
+        self.assertIs(type(decoded[0][2]), bool)
+        _, values = codec.decode_arrays(content)
+        np.testing.assert_array_equal(values['count'], [3, np.nan, 2 ** 40])
+        self.assertEqual(list(values['state']), ['open', None, 'closed'])
+
+    def test_seconds(self):
+        """
+        Rows within days should be encoded in seconds.
+        """
+        rows = [
+            (datetime(2020, 1, 2, 9, 0), 1.),
+            (datetime(2020, 1, 2, 9, 0, 1), 2.),
+            (datetime(2020, 1, 3), 3.)]
+        content = codec.encode(rows, ['price'])
+        self.assertEqual(codec.decode_rows(content), rows)
+        dates, _ = codec.decode_arrays(content)
+        np.testing.assert_array_equal(
+            dates, np.array([row[0] for row in rows], dtype='datetime64[s]'))
+
+    def test_invalid_rows(self):
+        """
+        Rows out of date order or below seconds cannot be encoded.
+        """
+        with self.assertRaises(ValueError):
+            codec.encode(self.rows[::-1], ['buy', 'sell'])
+        with self.assertRaises(ValueError):
+            codec.encode([(datetime(2020, 1, 2, 9, 30, 0, 5), 1.)], ['buy'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+"""
+Combine an alpha pool into the portfolio we actually trade.
+
+Given N alphas of the ResultStore, the combined position of each day is the
+weighted sum of their positions. Pnl and cost are then computed again on the
+combined positions in one vectorized pass, so that positions netted between
+alphas do not pay trading costs. Daily pnl and positions are read from the
+memory-mapped matrices of the store, so nothing is unpickled per alpha.
+
+Combined positions can also be re-priced under other cost models, e.g. to
+see how the results of a single alpha hold up with fees or market impact.
+
+Example:
+    python -m thousandaire.combiner -i alpha-1 alpha-2 \
+        -w inverse_vol --cap 0.1 -o combined
+    python -m thousandaire.combiner -i alpha-1 -m spread spread_fee impact
+"""
+
+import argparse
+import json
+import os
+import pickle
+import numpy as np
+from thousandaire.constants import RESULT_STORE_DIR, TRADING_CONFIGS
+from thousandaire.constants import TRADING_INSTRUMENTS
+from thousandaire.cost_models import COST_MODELS
+from thousandaire.result_store import ResultStore
+from thousandaire.simulation import initialize
+
+WEIGHTINGS = ('equal', 'inverse_vol')
+
+def build_parser():
+    """
+    Get alphas to combine and weighting options.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-i', '--submission_ids',
+        help='Submission ids of alphas in the result store, separated by '
+             'spaces (default: all alphas of the store).',
+        nargs='*', default=None)
+    parser.add_argument(
+        '-r', '--result_store', help='Path of the result store.',
+        default=RESULT_STORE_DIR)
+    parser.add_argument(
+        '-w', '--weighting', help='How to weight alphas.',
+        choices=WEIGHTINGS, default='equal')
+    parser.add_argument(
+        '-c', '--cap', help='Maximal weight of a single alpha.',
+        type=float, default=None)
+    parser.add_argument(
+        '-m', '--cost_models',
+        help='Also report results re-priced under these cost models.',
+        nargs='*', choices=sorted(COST_MODELS), default=[])
+    parser.add_argument(
+        '-o', '--output_path', help='Path to dump combined results.',
+        action='store')
+    return parser.parse_args()
+
+def get_weights(pnls, weighting='equal', cap=None):
+    """
+    Return weights (summing up to 1) of alphas.
+
+    pnls: daily pnl of alphas (alphas x days, NaN on missing days).
+    weighting: 'equal', or 'inverse_vol' for weights inversely proportional
+        to the standard deviation of daily pnl. Alphas without volatility
+        get no weight.
+    cap: if given, no weight exceeds it; excess weights are redistributed
+        proportionally among the other alphas.
+    """
+    if weighting == 'equal':
+        weights = np.ones(len(pnls))
+    elif weighting == 'inverse_vol':
+        valid = ~np.isnan(pnls)
+        counts = np.maximum(valid.sum(axis=1), 1)
+        means = np.where(valid, pnls, 0.).sum(axis=1) / counts
+        vols = np.sqrt(np.where(
+            valid, (pnls - means[:, None]) ** 2, 0.).sum(axis=1) / counts)
+        weights = np.divide(
+            1., vols, out=np.zeros(len(pnls)), where=vols > 0)
+    else:
+        raise ValueError('Unknown weighting: %s' % weighting)
+    if weights.sum() == 0:
+        raise ZeroDivisionError('All weights are zero.')
+    weights = weights / weights.sum()
+    if cap is not None:
+        if cap * np.count_nonzero(weights) < 1:
+            raise ValueError('Cap %s is too small for %d alphas.'
+                             % (cap, np.count_nonzero(weights)))
+        capped = np.zeros(len(weights), dtype=bool)
+        while (weights > cap).any():
+            capped |= weights > cap
+            free = 1 - cap * capped.sum()
+            weights = np.where(
+                capped, cap,
+                weights * free / weights[~capped].sum())
+    return weights
+
+def combine_positions(store, entries, dates, weights):
+    """
+    Return combined positions (days x instruments) on dates.
+
+    entries: index entries of alphas in the ResultStore.
+        Alphas contribute nothing on dates outside their results.
+    """
+    combined = None
+    for entry, weight in zip(entries, weights):
+        first_date, positions = store.get_positions(entry)
+        if combined is None:
+            combined = np.zeros((len(dates), positions.shape[1]))
+        if weight == 0:
+            continue
+        days = first_date + np.arange(len(positions))
+        index = np.searchsorted(dates, days)
+        # Days of the alpha which are not in dates hold no position.
+        inside = index < len(dates)
+        inside[inside] = dates[index[inside]] == days[inside]
+        combined[index[inside]] += weight * positions[inside]
+    return combined
+
+def price_matrices(price_dataset, workdays, instruments, dates):
+    """
+    Return middle prices and half spreads (days x instruments, NaN if
+    missing) used for pnl of each date.
+
+    As in the simulator, pnl of a date is computed with prices of the
+    previous workday.
+    price_dataset: a bound Dataset with derived fields.
+    workdays: a DataController of workdays of the region.
+    """
+    workday_dates = np.array(
+        [today.date for today in workdays], dtype='datetime64[D]')
+    middle_prices = np.full((len(workday_dates), len(instruments)), np.nan)
+    half_spreads = np.full((len(workday_dates), len(instruments)), np.nan)
+    for column, instrument in enumerate(instruments):
+        rows = [row for row in price_dataset[instrument] if row.valid]
+        if not rows:
+            continue
+        index = np.searchsorted(workday_dates, np.array(
+            [row.date for row in rows], dtype='datetime64[D]'))
+        middle_prices[index, column] = [row.mid for row in rows]
+        half_spreads[index, column] = [row.half_spread for row in rows]
+    previous = np.searchsorted(workday_dates, dates) - 1
+    if (previous < 0).any():
+        raise ValueError('No prices before %s.' % dates[0])
+    return middle_prices[previous], half_spreads[previous]
+
+def combine(store, entries, data_all, weighting='equal', cap=None):
+    """
+    Combine alphas of the ResultStore on the same target.
+
+    entries: index entries of alphas, see ResultStore.select.
+    data_all: bound data from simulation.initialize, used for prices.
+
+    Return a dict of weights, dates, combined positions, prices used for
+    pnl (see price_matrices), and re-computed pnl and cost (days x
+    instruments) under the cost model of the target.
+    """
+    targets = {entry.get('target') for entry in entries}
+    if len(targets) != 1 or None in targets:
+        raise ValueError('Alphas should have exactly one target: %s.'
+                         % targets)
+    dates, pnls = store.get_pnl_matrix(entries)
+    weights = get_weights(pnls, weighting, cap)
+    combined = {
+        'target': targets.pop(),
+        'weights': weights,
+        'dates': dates,
+        'positions': combine_positions(store, entries, dates, weights)}
+    _, region = combined['target']
+    config = TRADING_CONFIGS[combined['target']]
+    combined['middle_prices'], combined['half_spreads'] = price_matrices(
+        data_all[region][config['price_dataset']],
+        data_all['workdays'][region],
+        TRADING_INSTRUMENTS[combined['target']], dates)
+    combined['pnl'], combined['cost'] = config['pnl_function'].calculate_matrix(
+        combined['positions'], combined['middle_prices'],
+        combined['half_spreads'], config.get('cost_model'))
+    return combined
+
+def reprice(combined, cost_models):
+    """
+    Return combined results re-priced under each of the given cost models,
+    as a dict of names to copies of combined with their own pnl and cost.
+
+    cost_models: a dict of names to cost models.
+    """
+    pnl_function = TRADING_CONFIGS[combined['target']]['pnl_function']
+    repriced = {}
+    for name, cost_model in cost_models.items():
+        pnl, cost = pnl_function.calculate_matrix(
+            combined['positions'], combined['middle_prices'],
+            combined['half_spreads'], cost_model)
+        repriced[name] = dict(combined, pnl=pnl, cost=cost)
+    return repriced
+
+def summarize(combined):
+    """
+    Return headline numbers of combined results.
+    """
+    pnl = combined['pnl'].sum(axis=1)
+    cost = combined['cost'].sum(axis=1)
+    turnover = np.abs(np.diff(combined['positions'], axis=0)).sum(axis=1) / 2
+    # A flat pnl has no volatility, and then no sharpe.
+    volatility = np.std(pnl)
+    return {
+        'returns': float(np.mean(pnl) * 252),
+        'sharpe': float(np.mean(pnl) / volatility) if volatility > 0 else 0.,
+        'trading_costs': float(np.mean(cost) * 252),
+        'turnover': float(turnover.mean()),
+        'gross_position': float(
+            np.abs(combined['positions']).sum(axis=1).mean())}
+
+def main():
+    """
+    Combine stored results and report.
+    """
+    args = build_parser()
+    store = ResultStore(args.result_store)
+    combined = combine(
+        store, store.select(args.submission_ids), initialize(),
+        args.weighting, args.cap)
+    if args.output_path:
+        with open(os.path.join(args.output_path, 'combined'), 'wb') as file:
+            pickle.dump(combined, file)
+    print(json.dumps(summarize(combined), indent=1))
+    for name, repriced in reprice(combined, {
+            name: COST_MODELS[name] for name in args.cost_models}).items():
+        print(name, json.dumps(summarize(repriced), indent=1))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Unit tests for the alpha-pool combiner.
+"""
+
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from thousandaire.benchmark.synthetic_data import generate_raw_data
+from thousandaire.combiner import combine, reprice, summarize
+from thousandaire.constants import TRADING_INSTRUMENTS
+from thousandaire.cost_models import COST_MODELS
+from thousandaire.data_classes import Data, Portfolio
+from thousandaire.result_store import ResultStore
+from thousandaire.simulation import initialize
+
+TARGET = ('currency', 'TW')
+
+def make_results(dates, positions):
+    """
+    Build simulation results holding the given positions.
+    """
+    results = Data('result', ['pnl', 'cost', 'position'])
+    results.extend([
+        (date, {'USD': 0.}, {'USD': 0.}, Portfolio(position, TARGET))
+        for date, position in zip(dates, positions)])
+    return results
+
+class TestCombiner(unittest.TestCase):
+    """
+    Unit test object for combine.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.data_all = initialize(generate_raw_data(instruments=4, years=1))
+        cls.dates = [
+            today.date for today in cls.data_all['workdays']['TW']][10:60]
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = ResultStore(self.path)
+        rng = np.random.default_rng(0)
+        width = len(TRADING_INSTRUMENTS[TARGET])
+        # Two alphas overlapping on dates[20:40], of 50 dates.
+        self.positions = [
+            rng.normal(size=(40, width)), rng.normal(size=(30, width))]
+        self.store.add('alpha-0', make_results(
+            self.dates[:40], self.positions[0]))
+        self.store.add('alpha-1', make_results(
+            self.dates[20:], self.positions[1]))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_combined_positions(self):
+        """
+        Positions should be weighted sums over the union of dates.
+        """
+        combined = combine(
+            self.store, self.store.select(), self.data_all, 'equal')
+        np.testing.assert_array_equal(
+            combined['dates'],
+            np.array(self.dates, dtype='datetime64[D]'))
+        expected = np.zeros((len(self.dates), self.positions[0].shape[1]))
+        expected[:40] += self.positions[0] / 2
+        expected[20:] += self.positions[1] / 2
+        np.testing.assert_allclose(combined['positions'], expected)
+        self.assertEqual(combined['pnl'].shape, expected.shape)
+
+    def test_flat_pnl(self):
+        """
+        A pool without positions should have no sharpe rather than fail.
+        """
+        self.store.add('alpha-0', make_results(
+            self.dates, np.zeros((50, self.positions[0].shape[1]))))
+        combined = combine(
+            self.store, self.store.select(['alpha-0']), self.data_all)
+        self.assertEqual(summarize(combined)['sharpe'], 0.)
+
+    def test_reprice(self):
+        """
+        Re-pricing should change only costs, which are at least the half
+        spread under every model.
+        """
+        combined = combine(
+            self.store, self.store.select(), self.data_all, 'equal')
+        repriced = reprice(combined, COST_MODELS)
+        self.assertEqual(set(repriced), set(COST_MODELS))
+        # The target's own model is the half spread.
+        np.testing.assert_allclose(
+            repriced['spread']['cost'], combined['cost'])
+        for name, result in repriced.items():
+            np.testing.assert_allclose(result['pnl'], combined['pnl'])
+            np.testing.assert_array_equal(
+                result['positions'], combined['positions'])
+            if name != 'spread':
+                self.assertTrue((result['cost'] >= combined['cost']).all())
+                self.assertGreater(
+                    result['cost'].sum(), combined['cost'].sum())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,8 @@ Global constants shared by the whole package.
 """
 
 import os
+import thousandaire.cost_models
+import thousandaire.derived_fields
 import thousandaire.pnl_calculation
 
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -19,7 +21,23 @@ OFFICIAL_CURRENCY = {
 TRADING_CONFIGS = {
     ('currency', 'TW'): {
         'price_dataset': 'currency_price_tw',
-        'pnl_function': thousandaire.pnl_calculation.CurrencyPnl}
+        'pnl_function': thousandaire.pnl_calculation.CurrencyPnl,
+        'cost_model': thousandaire.cost_models.SpreadCost()}
 }
 TRADING_REGIONS = ['TW']
+DERIVED_FIELDS = {
+    'currency_price_tw': thousandaire.derived_fields.CURRENCY_PRICE}
 TIMESTAMP_FILE_SUFFIX = '_timestamp_file.pkl'
+CRAWLER_CACHE_DIR = os.path.join(DATA_DIR, 'http_cache')
+# Cached responses younger than this (in seconds) are used without
+# revalidation.
+CRAWLER_CACHE_TTL = 12 * 60 * 60
+CRAWLER_CACHE_MAX_SIZE = 256 * 1024 * 1024
+CRAWLER_TIMEOUT = 30
+CRAWL_CHECKPOINT_DIR = os.path.join(DATA_DIR, 'crawl_checkpoints')
+RESULT_STORE_DIR = os.path.join(DATA_DIR, 'result_store')
+PRODUCTION_DIR = os.path.join(DATA_DIR, 'production')
+VERSIONS_DIR = os.path.join(DATA_DIR, 'versions')
+# Storage type of fields by dataset, 'float32' or 'float64' (the default).
+STORAGE_DTYPES = {}
+STORAGE_COMPRESSION = True
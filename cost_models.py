@@ -0,0 +1,57 @@
+"""
+Transaction cost models.
+
+A cost model maps arrays of quantity changes, middle prices and half
+spreads (all of the same shape, e.g. days x instruments) to the cost of
+each trade, in the base currency. As pnl functions assume an investment
+of size 1, costs are fractions of the investment.
+
+Models are plugged into pnl functions by `cost_model` of TRADING_CONFIGS,
+and can be swapped to re-price stored positions without simulating again
+(see combiner.reprice).
+"""
+
+import numpy as np
+
+class SpreadCost: # pylint: disable=too-few-public-methods
+    """
+    Pay half of the spread on every unit traded.
+    """
+    def __call__(self, quantity_changes, middle_prices, half_spreads):
+        return np.abs(quantity_changes * half_spreads)
+
+class SpreadFeeCost(SpreadCost): # pylint: disable=too-few-public-methods
+    """
+    Pay half of the spread, plus a fee proportional to the value traded.
+    """
+    def __init__(self, fee_rate=0.0005):
+        self.fee_rate = fee_rate
+
+    def __call__(self, quantity_changes, middle_prices, half_spreads):
+        return (
+            SpreadCost.__call__(
+                self, quantity_changes, middle_prices, half_spreads)
+            + self.fee_rate * np.abs(quantity_changes) * middle_prices)
+
+class ImpactCost(SpreadCost): # pylint: disable=too-few-public-methods
+    """
+    Pay half of the spread, plus market impact which grows faster than the
+    value traded: coefficient * value ** exponent, where the value traded is
+    a fraction of the investment. The coefficient thus depends on the size
+    of the investment and the liquidity of the market.
+    """
+    def __init__(self, coefficient=0.01, exponent=1.5):
+        self.coefficient = coefficient
+        self.exponent = exponent
+
+    def __call__(self, quantity_changes, middle_prices, half_spreads):
+        value = np.abs(quantity_changes) * middle_prices
+        return (
+            SpreadCost.__call__(
+                self, quantity_changes, middle_prices, half_spreads)
+            + self.coefficient * value ** self.exponent)
+
+COST_MODELS = {
+    'spread': SpreadCost(),
+    'spread_fee': SpreadFeeCost(),
+    'impact': ImpactCost()}
@@ -4,24 +4,116 @@ Prototype of Crawler objects.
 
 import os
 import pickle
+import shutil
+import requests
+from thousandaire.constants import CRAWL_CHECKPOINT_DIR, CRAWLER_TIMEOUT
 from thousandaire.constants import DATA_DIR, TIMESTAMP_FILE_SUFFIX
+from thousandaire.version_store import VersionStore, write_atomically
+
+# Kinds of checkpoint records.
+PAGE = 'page'
+DONE = 'done'
+
+class CrawlCheckpoint:
+    """
+    Progress of a crawl of a dataset, kept on disk so that a crawl which
+    fails halfway resumes where it stopped.
+
+    Records are appended to a journal file per instrument: rows of a page
+    as soon as it is crawled, and all new rows with the last modified date
+    once the instrument is finished. A record cut short by a crash is
+    ignored when loading. The checkpoint belongs to the version of the
+    dataset which the crawl started from, and is dropped if another version
+    has been committed since.
+    """
+    def __init__(self, dataset_name, base_version,
+                 directory=CRAWL_CHECKPOINT_DIR):
+        self.path = os.path.join(directory, dataset_name)
+        base_path = os.path.join(self.path, 'base')
+        base = repr(base_version).encode('utf-8')
+        if os.path.isfile(base_path):
+            with open(base_path, 'rb') as file:
+                if file.read() != base:
+                    self.clear()
+        write_atomically(base_path, base)
+
+    def journal_path(self, instrument):
+        """
+        Return the path of the journal of an instrument.
+        """
+        return os.path.join(self.path, '%s.journal' % instrument)
+
+    def load(self, instrument):
+        """
+        Return a list of records of an instrument, which are (PAGE, page
+        number, rows) and (DONE, Data of all new rows, last modified date).
+        """
+        records = []
+        try:
+            with open(self.journal_path(instrument), 'rb') as file:
+                while True:
+                    records.append(pickle.load(file))
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            pass
+        return records
+
+    def append(self, instrument, record):
+        """
+        Append a record to the journal of an instrument and flush it to
+        disk.
+        """
+        with open(self.journal_path(instrument), 'ab') as file:
+            pickle.dump(record, file)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def clear(self):
+        """
+        Remove the checkpoint, e.g. once the crawl is committed.
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
 
 class BaseCrawler:
     """
     This is prototype for all Crawler objects.
     """
-    def __init__(self, dataset_name):
+    def __init__(self, dataset_name, cache=None, store=None):
         """
         TO-BE-INCLUDED!
         Please call this before your own initialization.
         Initialize `self.dataset_name` as `dataset_name`.
+
+        cache: an optional ResponseCache used by `fetch`.
+            It can also be plugged in later by `set_cache`.
+        store: the VersionStore the dataset is committed into; the default
+            one if None.
         """
         self.dataset_name = dataset_name
+        self.cache = cache
+        self.store = VersionStore() if store is None else store
+        self.checkpoint = None
+        # Last modified dates of instruments, kept by crawlers.
+        self.last_modified_date = {}
+
+    def fetch(self, url):
+        """
+        Return the content (in bytes) of the given url.
+
+        Crawlers should download pages through this method, so that responses
+        are served from the cache when one is set.
+        """
+        if self.cache is None:
+            return requests.get(url, timeout=CRAWLER_TIMEOUT).content
+        return self.cache.get(url)
 
     def get_last_modified_date(self):
         """
-        Return the last modified date of the dataset.
+        Return the last modified date of the dataset, committed with its
+        latest version, or from the legacy timestamp file.
         """
+        metadata = self.store.get_metadata(self.dataset_name)
+        if metadata is not None and 'last_modified' in metadata:
+            return metadata['last_modified']
         path = self.dataset_name + TIMESTAMP_FILE_SUFFIX
         timestamp_file = os.path.join(DATA_DIR, path)
         if os.path.isfile(timestamp_file):
@@ -29,9 +121,70 @@ class BaseCrawler:
                 return pickle.load(file)
         return {}
 
+    def set_cache(self, cache):
+        """
+        Set the ResponseCache used by `fetch`. None disables caching.
+        """
+        self.cache = cache
+
+    def set_checkpoint(self, checkpoint):
+        """
+        Set the CrawlCheckpoint used by `crawl_instruments`. None disables
+        checkpoints.
+        """
+        self.checkpoint = checkpoint
+
+    def get_pages(self, instrument):
+        """
+        Return a list of (page number, rows) of an instrument saved in the
+        checkpoint, in the order they were crawled.
+        """
+        if self.checkpoint is None:
+            return []
+        return [
+            record[1:] for record in self.checkpoint.load(instrument)
+            if record[0] == PAGE]
+
+    def save_page(self, instrument, page, rows):
+        """
+        Save rows of a crawled page of an instrument into the checkpoint, so
+        that a resumed crawl continues after it.
+        """
+        if self.checkpoint is not None:
+            self.checkpoint.append(instrument, (PAGE, page, rows))
+
+    def crawl_instruments(self, instruments, crawl):
+        """
+        Return a dict of instruments to Data of new rows, crawled one by one
+        by crawl(instrument, crawled), where crawled is the dict so far.
+
+        Each instrument is saved with its last modified date (in the dict
+        `self.last_modified_date`) into the checkpoint as soon as it is
+        crawled, and instruments already saved there are not crawled again.
+        """
+        crawled = {}
+        for instrument in instruments:
+            done = [
+                record for record in (
+                    self.checkpoint.load(instrument)
+                    if self.checkpoint is not None else [])
+                if record[0] == DONE]
+            if done:
+                _, crawled[instrument], last_date = done[-1]
+                self.last_modified_date[instrument] = last_date
+                continue
+            crawled[instrument] = crawl(instrument, crawled)
+            if self.checkpoint is not None:
+                self.checkpoint.append(instrument, (
+                    DONE, crawled[instrument],
+                    self.last_modified_date[instrument]))
+        return crawled
+
     def set_last_modified_date(self, date_dict):
         """
-        Set the last modified date of the dataset to the given dict of dates.
+        Set the last modified date of the dataset to the given dict of dates
+        in the legacy timestamp file. Crawls committed into the VersionStore
+        keep the date with the data instead.
         """
         path = self.dataset_name + TIMESTAMP_FILE_SUFFIX
         timestamp_file = os.path.join(DATA_DIR, path)
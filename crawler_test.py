@@ -0,0 +1,104 @@
+"""
+Unit tests for resumable crawls.
+"""
+
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+from thousandaire.crawlers.currency_price_tw import Crawler
+from thousandaire.data_classes import Dataset
+from thousandaire.get_data import call_crawlers
+from thousandaire.version_store import VersionStore
+
+DATASET = 'currency_price_tw'
+# Rows of each page, from the newest.
+PAGES = [
+    [('2020-01-08', '30.1', '30.2'), ('2020-01-07', '30.0', '-')],
+    [('2020-01-06', '29.9', '30.0')]]
+
+def make_table(rows):
+    """
+    Build a page table in the layout of the crawled site.
+    """
+    return '<table><tbody><tr />%s</tbody></table>' % ''.join(
+        '<tr><td><a>%s</a></td><td /><td /><td>%s</td><td>%s</td></tr>'
+        % row for row in rows)
+
+class TestResumableCrawl(unittest.TestCase):
+    """
+    Unit test object for crawls resumed from checkpoints.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = VersionStore(self.path)
+        self.store.commit(Dataset(DATASET, {}), {'last_modified': {}})
+        self.requests = []
+        self.failing = None
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def get_table(self, target):
+        """
+        Serve pages, failing on targets starting with self.failing.
+        """
+        self.requests.append(target)
+        if self.failing is not None and target.startswith(self.failing):
+            raise ConnectionError('Upstream is down.')
+        page = int(target.split('&page=')[1]) - 1
+        return make_table(PAGES[page] if page < len(PAGES) else [])
+
+    def crawl(self):
+        """
+        Crawl into the store, with checkpoints in its directory.
+        """
+        with mock.patch.object(Crawler, 'get_table', self.get_table):
+            return call_crawlers([DATASET], store=self.store,
+                                 checkpoint_dir=self.path)
+
+    def test_resume(self):
+        """
+        A failed crawl should resume after instruments already crawled, and
+        dates should be committed with the data.
+        """
+        self.failing = 'CAD'
+        with self.assertRaises(ConnectionError):
+            self.crawl()
+        self.assertEqual(self.store.get_metadata(DATASET)['last_modified'], {})
+        crawled = {target.split('&')[0] for target in self.requests} - {'CAD'}
+        self.failing = None
+        self.requests = []
+        self.crawl()
+        self.assertFalse(crawled & {
+            target.split('&')[0] for target in self.requests})
+        dataset = self.store.load(DATASET)
+        self.assertEqual(
+            [row.date for row in dataset['USD']],
+            [datetime(2020, 1, 6), datetime(2020, 1, 7), datetime(2020, 1, 8)])
+        self.assertEqual(len(dataset['CAD']), 3)
+        self.assertEqual(len(dataset['TWD']), 3)
+        self.assertEqual(
+            self.store.get_metadata(DATASET)['last_modified']['CAD'],
+            datetime(2020, 1, 8))
+        # Nothing new upstream, so nothing should be appended.
+        self.crawl()
+        self.assertEqual(len(self.store.load(DATASET)['USD']), 3)
+
+    def test_resume_pages(self):
+        """
+        A crawl failing on a page should resume from that page.
+        """
+        self.failing = 'USD&page=2'
+        with self.assertRaises(ConnectionError):
+            self.crawl()
+        self.failing = None
+        self.requests = []
+        self.crawl()
+        self.assertNotIn('USD&page=1', self.requests)
+        self.assertIn('USD&page=2', self.requests)
+        self.assertEqual(len(self.store.load(DATASET)['USD']), 3)
+
+if __name__ == '__main__':
+    unittest.main()
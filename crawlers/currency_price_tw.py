@@ -4,7 +4,6 @@ Get currency price
 
 from datetime import datetime
 import xml.etree.ElementTree as ET
-import requests
 from thousandaire.crawler import BaseCrawler
 from thousandaire.data_classes import Data, Dataset
 
@@ -22,8 +21,8 @@ class Crawler(BaseCrawler):
     """
     Crawling new data and update.
     """
-    def __init__(self, dataset_name):
-        BaseCrawler.__init__(self, dataset_name)
+    def __init__(self, dataset_name, store=None):
+        BaseCrawler.__init__(self, dataset_name, store=store)
         #instrument will read from file in the future
         self.base = 'TWD'
         self.instruments = [
@@ -39,18 +38,21 @@ class Crawler(BaseCrawler):
         """
         locate the place of 'table'
         """
-        response = requests.get(self.url + target)
-        text = response.content.decode('utf-8')
+        text = self.fetch(self.url + target).decode('utf-8')
         start = text.find('<table')
         end = text.find('</table>') + len('</table>')
         return text[start : end]
 
     def crawl_data(self, instrument):
         """
-        Crawl target data.
+        Crawl target data, from the newest page to the last modified date.
+        Pages saved in the checkpoint are not crawled again.
         """
         history = Data(instrument, ['buy', 'sell'])
         counter = 1
+        for counter, rows in self.get_pages(instrument):
+            history.extend(rows)
+            counter += 1
         synchronized = False
         while not synchronized:
             table = self.get_table('%s&page=%d' % (instrument, counter))
@@ -58,12 +60,18 @@ class Crawler(BaseCrawler):
             rows = list(tree[0][1:])
             if not rows:
                 break
+            page = []
+            # Pages shift when new rows come, so rows of resumed pages may
+            # be seen again.
+            previous = history[-1].date if len(history) > 0 else None
             for row in rows:
                 grids = list(row)
                 date = datetime.strptime(grids[0][0].text, '%Y-%m-%d')
                 if date == self.last_modified_date[instrument]:
                     synchronized = True
                     break
+                if previous is not None and date >= previous:
+                    continue
                 buy = float(grids[3].text) if is_float(grids[3].text) else None
                 sell = float(grids[4].text) if is_float(grids[4].text) else None
                 # Data come from BANK OF TAIWAN, which offers discount for
@@ -72,13 +80,25 @@ class Crawler(BaseCrawler):
                     buy += 0.03 if instrument == 'USD' else buy * 0.001
                 if sell:
                     sell -= 0.03 if instrument == 'USD' else sell * 0.001
-                history.append((date, buy, sell))
+                page.append((date, buy, sell))
+                previous = date
+            history.extend(page)
+            if not synchronized:
+                self.save_page(instrument, counter, page)
             counter += 1
         if len(history) > 0:
             self.last_modified_date[instrument] = history[0].date
             history.reverse()
         return history
 
+    def crawl_instrument(self, instrument, crawled):
+        """
+        Crawl an instrument, or fill the base instrument.
+        """
+        if instrument == self.base:
+            return self.fill_data(instrument, crawled)
+        return self.crawl_data(instrument)
+
     def fill_data(self, instrument, data):
         """
         Manually fill data of base instrument.
@@ -95,10 +115,6 @@ class Crawler(BaseCrawler):
         """
         Get the historical instrument data
         """
-        return_data = {}
-        for instrument in self.instruments:
-            return_data[instrument] = (
-                self.crawl_data(instrument)
-                if instrument != self.base
-                else self.fill_data(instrument, return_data))
+        return_data = self.crawl_instruments(
+            self.instruments, self.crawl_instrument)
         return self.last_modified_date, Dataset(self.dataset_name, return_data)
@@ -12,20 +12,20 @@ class Crawler(BaseCrawler):
     """
     Set the newest workday and update
     """
-    def __init__(self, dataset_name):
-        BaseCrawler.__init__(self, dataset_name)
+    def __init__(self, dataset_name, store=None):
+        BaseCrawler.__init__(self, dataset_name, store=store)
         # regions will be read from file in the future
         self.regions = ['TW']
         last_modified_date = self.get_last_modified_date()
         self.last_modified_date = {
             region: last_modified_date.get(region) for region in self.regions}
 
-    def set_workdays(self, region):
+    def set_workdays(self, region, _crawled=None):
         """
         Set workdays in the region
         """
         dataset_name = 'currency_price_' + region.lower()
-        reference_data = DataLoader([dataset_name]).get_all()
+        reference_data = DataLoader([dataset_name], store=self.store).get_all()
         # We set workdays as dates in USD/TWD because this is the pair with
         # the longest trade history. If region is US, we use JPY instead.
         reference_currency = OFFICIAL_CURRENCY[region]
@@ -43,7 +43,5 @@ class Crawler(BaseCrawler):
         """
         Get the workdays in every region
         """
-        return_data = {}
-        for region in self.regions:
-            return_data[region] = self.set_workdays(region)
+        return_data = self.crawl_instruments(self.regions, self.set_workdays)
         return self.last_modified_date, Dataset(self.dataset_name, return_data)
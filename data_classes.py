@@ -3,8 +3,10 @@ Adjust data into the format we want.
 """
 
 import collections
+import collections.abc
 import numpy as np
 from thousandaire.constants import TRADING_INSTRUMENTS
+from thousandaire.trading_calendar import CalendarCursor, TradingCalendar
 
 def protect(func):
     """
@@ -71,7 +73,7 @@ class DataIterator():
                 self.__index - len(self.__data_controller)]
         raise StopIteration
 
-class DataController():
+class DataController(): # pylint: disable=too-many-instance-attributes
     """
     Control the data privacy.
     """
@@ -81,6 +83,12 @@ class DataController():
         self.__end = len(self.__data)
         self.__key = key
         self.__workdays = None
+        # Rows are days self.__offset, self.__offset + 1, ... of the calendar.
+        self.__calendar = None
+        self.__offset = 0
+        # Data synchronized with workdays keep the current day in a cursor
+        # shared by their Dataset instead of in self.__end.
+        self.__cursor = None
         # empty_row and fields other than `date` are used in many methods,
         # so we cache them to improve performance.
         self.__empty_row = (
@@ -115,6 +123,10 @@ class DataController():
                 We reset the start index and stop index according to our
                 assumption, and return a newly generated DataController.
         """
+        if self.__cursor is None:
+            end = self.__end
+        else:
+            end = max(self.__cursor.index - self.__offset, 0)
         if isinstance(index, slice):
             if index.step == 0:
                 raise IndexError("slice step cannot be zero")
@@ -122,9 +134,9 @@ class DataController():
             stop = index.stop
             step = 1 if index.step is None else index.step
             if start is None:
-                start = -self.__end if step > 0 else -1
+                start = -end if step > 0 else -1
             if stop is None:
-                stop = 0 if step > 0 else -self.__end - 1
+                stop = 0 if step > 0 else -end - 1
             if start >= 0 or stop > 0:
                 raise IndexError("list index out of range")
             return_data = Data(self.__data.name, self.__fields)
@@ -137,23 +149,32 @@ class DataController():
             )
         if index >= 0:
             raise IndexError("list index out of range")
-        if self.__end + index < 0:
+        if end + index < 0:
             if len(self.__workdays) + index >= 0:
                 return_datum = Data(self.__data.name, self.__fields)
                 return_datum.append(
                     (self.__workdays[index].date, self.__empty_row))
                 return return_datum
             raise IndexError("list index out of range")
-        return self.__data[self.__end + index]
+        return self.__data[end + index]
 
     def __iter__(self):
         return DataIterator(self)
 
     def __len__(self):
-        return self.__end
+        return self.__get_end()
 
     def __str__(self):
-        return str(self.__data[: self.__end])
+        return str(self.__data[: self.__get_end()])
+
+    def __get_end(self):
+        """
+        Return the number of rows before the current simulating day.
+        """
+        if self.__cursor is None:
+            return self.__end
+        # The cursor stops at the last row, i.e. at most len(self.__data).
+        return max(self.__cursor.index - self.__offset, 0)
 
     def authorize(self, key):
         """
@@ -162,6 +183,28 @@ class DataController():
         """
         return key == self.__key
 
+    @protect
+    def add_fields(self, derivations):
+        """
+        Append derived fields to every row of the data.
+        Will be called by the Dataset.
+
+        derivations: a sequence of (field name, function) pairs. See
+            derived_fields.py for how the functions are called.
+        """
+        names = [name for name, _ in derivations]
+        derived_data = Data(self.__data.name, self.__fields + names)
+        previous = None
+        for row in self.__data:
+            values = row._asdict()
+            for name, function in derivations:
+                values[name] = function(values, previous)
+            previous = derived_data.data_type(*values.values())
+            list.append(derived_data, previous)
+        self.__data = derived_data
+        self.__fields = self.__fields + names
+        self.__empty_row = tuple(None for _ in self.__fields)
+
     @protect
     def extend(self, extend_object):
         """
@@ -171,9 +214,39 @@ class DataController():
                 and self.name == extend_object.name):
             self.__data.extend(extend_object)
             self.__end = len(self.__data)
+            self.__calendar = None
+            self.__cursor = None
         else:
             raise TypeError("Data in a dataset must be the same types.")
 
+    def get_calendar(self):
+        """
+        Return the TradingCalendar of the data and the index of the first row
+        in it.
+
+        Data synchronized with workdays share the calendar of the workdays.
+        Otherwise a calendar of dates of the data is built once.
+        """
+        if self.__calendar is None:
+            self.__calendar = TradingCalendar(row.date for row in self.__data)
+            self.__offset = 0
+        return self.__calendar, self.__offset
+
+    def get_index(self):
+        """
+        Return the calendar index of the current simulating day.
+        """
+        if self.__cursor is not None:
+            return self.__cursor.index
+        _, offset = self.get_calendar()
+        return offset + self.__end
+
+    def get_fields(self):
+        """
+        Return names of fields other than `date`.
+        """
+        return list(self.__fields)
+
     def get_today(self):
         """
         Return the date of the current simulating day.
@@ -182,9 +255,10 @@ class DataController():
         portfolio for the next real-life trading day.
         None will be returned as the next workday is still unknown.
         """
-        if self.__end == len(self.__data):
+        end = self.__get_end()
+        if end == len(self.__data):
             return None
-        return self.__data[self.__end].date
+        return self.__data[end].date
 
     @protect
     def move_forward(self):
@@ -197,7 +271,13 @@ class DataController():
                 call this method.
             (2) The self.__data may not be as old as workdays data, so we
                 should check it to know we should move self.__end.
+
+        Data synchronized with workdays move their shared cursor instead,
+        i.e. all data of their Dataset move together.
         """
+        if self.__cursor is not None:
+            self.__cursor.move_forward()
+            return
         if self.__end == len(self.__data):
             raise ValueError("Date not found.")
         if (self.__end == 0
@@ -215,18 +295,16 @@ class DataController():
                 raise a ValueError.
             (2) When the target date is earlier than the earliest data we have,
                 just keep the index at the earliest data we have.
+
+        Data synchronized with workdays set their shared cursor instead.
         """
+        if self.__cursor is not None:
+            self.__cursor.set_date(target_date)
+            return
         if self.__data[-1].date < target_date:
             raise ValueError("Date not found.")
-        left = -len(self.__data)
-        right = 0
-        while left < right - 1:
-            mid = (left + right) // 2
-            if self.__data[mid].date > target_date:
-                right = mid
-            else:
-                left = mid
-        self.__end = len(self.__data) + left
+        calendar, offset = self.get_calendar()
+        self.__end = max(calendar.index_on_or_before(target_date) - offset, 0)
 
     def set_key(self, key):
         """
@@ -237,11 +315,14 @@ class DataController():
         self.__key = key
 
     @protect
-    def set_workdays(self, workdays):
+    def set_workdays(self, workdays, cursor=None):
         """
         Synchronize all data with workdays.
         Will be called by the Dataset.
 
+        cursor: a CalendarCursor of the workdays shared with other data of
+            the Dataset. A new one is created if None.
+
         We have raw data, workdays data and synchronized data in this method.
         Synchronized data will contain only dates of workdays data.
         However, if the date is earlier than our raw data,
@@ -267,27 +348,31 @@ class DataController():
                 regardless of their existence in raw data.
         """
         self.__workdays = workdays
-        data_index = -len(self.__data)
-        workdays_index = -len(workdays)
+        # Rows are placed by the calendar of workdays, and only its visible
+        # days, from offset to stop, are synchronized.
+        calendar, offset = workdays.get_calendar()
+        stop = offset + len(workdays)
+        start = offset
+        if len(self.__data) > 0:
+            start = max(
+                calendar.index_on_or_after(self.__data[0].date), offset)
+        rows = {}
+        for row in self.__data:
+            index = calendar.index_on_or_before(row.date)
+            if start <= index < stop and calendar.date_of(index) == row.date:
+                rows.setdefault(index, row)
         sync_data = Data(self.__data.name, self.__fields)
-        while workdays_index < 0 and data_index < 0:
-            if self.__data[data_index].date > workdays[workdays_index].date:
-                if data_index != -len(self.__data):
-                    sync_data.append(
-                        (workdays[workdays_index].date, *self.__empty_row))
-                workdays_index += 1
-            elif self.__data[data_index].date < workdays[workdays_index].date:
-                data_index += 1
-            else:
-                sync_data.append(self.__data[data_index])
-                workdays_index += 1
-                data_index += 1
-        remaining_data = [
-            (workdays[x].date, *self.__empty_row)
-            for x in range(workdays_index, 0)]
-        sync_data.extend(remaining_data)
+        sync_data.extend(
+            rows[index] if index in rows
+            else (calendar.date_of(index), *self.__empty_row)
+            for index in range(start, stop))
         self.__data = sync_data
         self.__end = len(self.__data)
+        self.__calendar = calendar
+        self.__offset = start
+        self.__cursor = (
+            CalendarCursor(calendar, offset + len(workdays))
+            if cursor is None else cursor)
 
 class Dataset(dict):
     """
@@ -299,20 +384,46 @@ class Dataset(dict):
         for instrument, values in data.items():
             self[instrument] = DataController(values)
         self.data_name = data_name
+        # Shared by all instruments after set_workdays.
+        self.cursor = None
+
+    def authorize(self, key):
+        """
+        Raise an IOError unless the key is correct for all data.
+        """
+        if not all(self[instrument].authorize(key) for instrument in self):
+            raise IOError('Permission denied.')
 
     def move_forward(self, key=None):
         """
         Move to next workday.
         """
-        for instrument in self:
-            self[instrument].move_forward(auth_key=key)
+        if self.cursor is None:
+            for instrument in self:
+                self[instrument].move_forward(auth_key=key)
+            return
+        self.authorize(key)
+        self.cursor.move_forward()
 
     def set_date(self, target, key=None):
         """
         Set the current date to the given date.
         """
+        if self.cursor is None:
+            for instrument in self:
+                self[instrument].set_date(target, auth_key=key)
+            return
+        self.authorize(key)
+        self.cursor.set_date(target)
+
+    def derive_fields(self, derivations, key=None):
+        """
+        Append derived fields to all data.
+        Should be called after set_workdays, so that the derived fields are
+        computed only once for the aligned data.
+        """
         for instrument in self:
-            self[instrument].set_date(target, auth_key=key)
+            self[instrument].add_fields(derivations, auth_key=key)
 
     def set_key(self, key):
         """
@@ -325,16 +436,47 @@ class Dataset(dict):
         """
         Synchronize all data with workdays.
         Should be called only by the simulator.
+
+        Data of all instruments are aligned with the same workdays, so they
+        share one calendar and one cursor of the current day.
         """
+        calendar, offset = workdays.get_calendar()
+        self.cursor = CalendarCursor(calendar, offset + len(workdays))
         for instrument in self:
-            self[instrument].set_workdays(workdays, auth_key=key)
+            self[instrument].set_workdays(
+                workdays, self.cursor, auth_key=key)
 
-class Portfolio(dict):
+INSTRUMENT_INDEX = {}
+
+def get_instrument_index(encoding):
+    """
+    Return a dict mapping tradable instruments of the encoding to their
+    positions in TRADING_INSTRUMENTS[encoding]. Cached per encoding.
+    """
+    if encoding not in INSTRUMENT_INDEX:
+        if encoding not in TRADING_INSTRUMENTS:
+            raise KeyError('Invalid encoding method: %r' % (encoding,))
+        INSTRUMENT_INDEX[encoding] = {
+            instrument: index for index, instrument
+            in enumerate(TRADING_INSTRUMENTS[encoding])}
+    return INSTRUMENT_INDEX[encoding]
+
+class Portfolio(collections.abc.MutableMapping):
     """
     Set the portfolio
+
+    Alphas use a portfolio like a dict of instruments to positions.
+    Positions are kept in a dict until the portfolio is bound to an encoding
+    (a target in TRADING_INSTRUMENTS), which the simulator does right after
+    generation. From then on, positions live in `self.positions`, a float
+    array aligned with TRADING_INSTRUMENTS[encoding], so that normalization
+    and encoding are vectorized and need no extra copy.
     """
     def __init__(self, np_array=None, encoding=None):
-        dict.__init__(self)
+        self.encoding = None
+        self.positions = None
+        self.__pending = {}
+        self.__held = None
         if np_array is not None:
             if isinstance(np_array, np.ndarray):
                 self.decode_from_nparray(np_array, encoding)
@@ -342,37 +484,124 @@ class Portfolio(dict):
                 raise TypeError(
                     'The input is %s, not a numpy array.' % type(np_array))
 
-    def decode_from_nparray(self, np_array, encoding):
+    def __getitem__(self, instrument):
+        if self.encoding is None:
+            return self.__pending[instrument]
+        index = get_instrument_index(self.encoding)[instrument]
+        if not self.__held[index]:
+            raise KeyError(instrument)
+        return self.positions[index]
+
+    def __setitem__(self, instrument, position):
+        if self.encoding is None:
+            self.__pending[instrument] = position
+            return
+        index = get_instrument_index(self.encoding).get(instrument)
+        if index is None:
+            raise KeyError('%s is not tradable.' % instrument)
+        self.positions[index] = position
+        self.__held[index] = True
+
+    def __delitem__(self, instrument):
+        if self.encoding is None:
+            del self.__pending[instrument]
+            return
+        index = get_instrument_index(self.encoding)[instrument]
+        if not self.__held[index]:
+            raise KeyError(instrument)
+        self.positions[index] = 0.
+        self.__held[index] = False
+
+    def __iter__(self):
+        if self.encoding is None:
+            return iter(self.__pending)
+        instruments = TRADING_INSTRUMENTS[self.encoding]
+        return (instruments[index] for index in np.flatnonzero(self.__held))
+
+    def __len__(self):
+        if self.encoding is None:
+            return len(self.__pending)
+        return int(self.__held.sum())
+
+    def __repr__(self):
+        return 'Portfolio(%r)' % dict(self)
+
+    def bind(self, encoding):
+        """
+        Move positions into an array aligned with TRADING_INSTRUMENTS[encoding].
+        Raise a KeyError if some instruments are not tradable.
+        """
+        if self.encoding == encoding:
+            return
+        index = get_instrument_index(encoding)
+        positions = np.zeros(len(index))
+        held = np.zeros(len(index), dtype=bool)
+        for instrument, position in self.items():
+            if instrument not in index:
+                raise KeyError('%s is not tradable.' % instrument)
+            positions[index[instrument]] = position
+            held[index[instrument]] = True
+        self.encoding = encoding
+        self.positions = positions
+        self.__pending = {}
+        self.__held = held
+
+    def decode_from_nparray(self, np_array, encoding, held=None):
         """
         Decode numpy array into portfolio.
+
+        held: an optional bool array of which instruments are held. All
+            instruments are held by default.
         """
         if encoding is None:
             raise KeyError('Invalid encoding method: %r' % encoding)
-        if len(np_array) != len(TRADING_INSTRUMENTS[encoding]):
+        if len(np_array) != len(get_instrument_index(encoding)):
             raise ValueError(
                 'Input dimension does not match number of instruments.')
-        for index, instrument in TRADING_INSTRUMENTS[encoding]:
-            self[instrument] = np_array[index]
+        self.encoding = encoding
+        self.positions = np.array(np_array, dtype=float)
+        self.__pending = {}
+        self.__held = (
+            np.ones(len(np_array), dtype=bool) if held is None
+            else np.array(held, dtype=bool))
 
     def encode_to_nparray(self, encoding):
         """
         Encode the positions into numpy type.
+
+        If the portfolio is bound to the encoding, `self.positions` itself
+        is returned instead of a copy.
         """
+        if self.encoding == encoding:
+            return self.positions
         return np.array([
             self.get(instrument, 0)
-            for instrument in TRADING_INSTRUMENTS[encoding]])
+            for instrument in TRADING_INSTRUMENTS[encoding]], dtype=float)
 
     def is_tradable(self, tradable_list):
         """
         Check if all instruments of the portfolio are tradable.
         """
+        if (self.encoding is not None
+                and tradable_list is TRADING_INSTRUMENTS[self.encoding]):
+            return True
         return all(instrument in tradable_list for instrument in self)
 
     def normalize(self):
         """
         Normalize positions to make sure the summation of absolute values is 1.
         The simulator will call this method.
+
+        Raise a ZeroDivisionError if positions are given but all zero.
         """
-        position_sum = sum(map(abs, self.values()))
-        for instrument in self:
-            self[instrument] = self[instrument] / position_sum
+        if self.encoding is None:
+            position_sum = sum(map(abs, self.values()))
+            for instrument in self:
+                self[instrument] = self[instrument] / position_sum
+            return
+        if not self.__held.any():
+            return
+        position_sum = np.abs(self.positions).sum()
+        if position_sum == 0:
+            raise ZeroDivisionError('Positions are all zero.')
+        self.positions /= position_sum
@@ -3,16 +3,19 @@ Unit tests for data classes
 
 Implemented:
     Data
+    Dataset (derived fields)
+    Portfolio
 
 TODO:
     DataController
-    Dataset
-    Portfolio
 """
 
 import unittest
 from datetime import datetime
-from thousandaire.data_classes import Data
+import numpy as np
+from thousandaire.constants import TRADING_INSTRUMENTS
+from thousandaire.data_classes import Data, Dataset, Portfolio
+from thousandaire.derived_fields import CURRENCY_PRICE
 
 class TestData(unittest.TestCase):
     """
@@ -75,5 +78,112 @@ class TestData(unittest.TestCase):
             TypeError, self.data.extend, [(3, 5, 7, 9), (2, 4, 6, 8)])
         self.assertRaises(TypeError, self.data.extend, *self.data_list[0])
 
+class TestDataset(unittest.TestCase):
+    """
+    Unit test object for Dataset.
+    """
+    def setUp(self):
+        workdays = Data('workdays', [])
+        workdays.extend([(datetime(2020, 1, day),) for day in range(27, 31)])
+        prices = Data('test', ['buy', 'sell'])
+        prices.extend([
+            (datetime(2020, 1, 27), 27, 29), (datetime(2020, 1, 28), 30, 32),
+            (datetime(2020, 1, 30), 28, None)])
+        self.workdays = Dataset('workdays', {'TW': workdays})
+        self.dataset = Dataset('test', {'test': prices})
+
+    def test_derive_fields(self):
+        """
+        Test derive_fields method in Dataset.
+        """
+        self.dataset.set_workdays(self.workdays['TW'])
+        self.dataset.derive_fields(CURRENCY_PRICE)
+        data = self.dataset['test']
+        self.assertEqual(
+            [item.valid for item in data], [True, True, False, False])
+        self.assertEqual([item.mid for item in data], [28, 31, None, None])
+        self.assertEqual(
+            [item.half_spread for item in data], [1, 1, None, None])
+        self.assertEqual(
+            [item.returns for item in data], [None, 31 / 28 - 1, None, None])
+        self.assertEqual([item.buy for item in data], [27, 30, None, 28])
+
+    def test_set_date(self):
+        """
+        Test set_date method in Dataset, on and between workdays.
+        """
+        prices = Data('test', ['buy', 'sell'])
+        prices.extend([(datetime(2020, 1, 28), 30, 32)])
+        dataset = Dataset('test', {'test': prices})
+        dataset.set_workdays(self.workdays['TW'])
+        data = dataset['test']
+        for target, today in (
+                (datetime(2020, 1, 27), datetime(2020, 1, 28)),
+                (datetime(2020, 1, 29), datetime(2020, 1, 29)),
+                (datetime(2020, 1, 29, 12), datetime(2020, 1, 29))):
+            dataset.set_date(target)
+            self.assertEqual(data.get_today(), today)
+        self.assertEqual(data.get_index(), 2)
+        self.assertRaises(ValueError, dataset.set_date, datetime(2020, 1, 31))
+
+class TestPortfolio(unittest.TestCase):
+    """
+    Unit test object for Portfolio.
+    """
+    def setUp(self):
+        self.target = ('currency', 'TW')
+        self.portfolio = Portfolio()
+        self.portfolio['USD'] = 3
+        self.portfolio['JPY'] = -1
+
+    def test_bind(self):
+        """
+        Test bind method in Portfolio.
+        """
+        self.portfolio.bind(self.target)
+        self.assertEqual(dict(self.portfolio), {'USD': 3, 'JPY': -1})
+        self.assertEqual(self.portfolio.get('EUR', 0), 0)
+        self.portfolio['EUR'] = 2
+        self.assertEqual(len(self.portfolio), 3)
+        self.assertRaises(KeyError, self.portfolio.__setitem__, 'XXX', 1)
+        untradable = Portfolio()
+        untradable['XXX'] = 1
+        self.assertRaises(KeyError, untradable.bind, self.target)
+
+    def test_normalize(self):
+        """
+        Test normalize method in Portfolio.
+        """
+        self.portfolio.bind(self.target)
+        self.portfolio.normalize()
+        self.assertEqual(dict(self.portfolio), {'USD': 0.75, 'JPY': -0.25})
+        empty = Portfolio()
+        empty.bind(self.target)
+        empty.normalize()
+        self.assertEqual(len(empty), 0)
+        zero = Portfolio()
+        zero['USD'] = 0
+        zero.bind(self.target)
+        self.assertRaises(ZeroDivisionError, zero.normalize)
+
+    def test_encoding(self):
+        """
+        Test encode_to_nparray and decode_from_nparray in Portfolio.
+        """
+        instruments = TRADING_INSTRUMENTS[self.target]
+        expected = np.array([
+            {'USD': 3, 'JPY': -1}.get(instrument, 0)
+            for instrument in instruments], dtype=float)
+        np.testing.assert_array_equal(
+            self.portfolio.encode_to_nparray(self.target), expected)
+        self.portfolio.bind(self.target)
+        self.assertIs(
+            self.portfolio.encode_to_nparray(self.target),
+            self.portfolio.positions)
+        decoded = Portfolio(expected, self.target)
+        self.assertEqual(len(decoded), len(instruments))
+        self.assertEqual(decoded['USD'], 3)
+        self.assertRaises(ValueError, Portfolio, expected[1:], self.target)
+
 if __name__ == '__main__':
     unittest.main()
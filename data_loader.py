@@ -4,17 +4,40 @@ Implementation of DataLoader module.
 
 import os
 import pickle
+from thousandaire.codec import rows_to_arrays
 from thousandaire.constants import DATA_DIR
 from thousandaire.data_classes import Dataset
+from thousandaire.version_store import LATEST, VersionStore
 
 class DataLoader:
     """
     This object loads data from archieved files and feeds back data in Dataset
     format defined in dataset.py.
+
+    Datasets are loaded from the VersionStore, at the latest version unless
+    pinned by `versions` (a dict of dataset names to version ids). Datasets
+    without any version are loaded from their legacy pickle files.
+    `self.versions` records the version id loaded for each dataset (None
+    for legacy files or missing data).
+
+    With as_arrays, datasets are decoded straight into arrays instead of
+    Datasets, as dicts of instruments to (dates, dict of fields to arrays),
+    see codec.decode_arrays.
     """
-    def __init__(self, data_list):
+    def __init__(self, data_list, versions=None, store=None, as_arrays=False):
         self.data = {}
+        self.versions = {}
+        store = VersionStore() if store is None else store
+        versions = {} if versions is None else versions
         for data_name in data_list:
+            version = store.resolve(data_name, versions.get(data_name, LATEST))
+            self.versions[data_name] = version
+            if version is not None and as_arrays:
+                self.data[data_name] = store.load_arrays(data_name, version)
+                continue
+            if version is not None:
+                self.data[data_name] = store.load(data_name, version)
+                continue
             data_path = os.path.join(DATA_DIR, data_name)
             try:
                 with open(data_path, "rb") as file:
@@ -22,6 +45,10 @@ class DataLoader:
             except FileNotFoundError:
                 self.data[data_name] = Dataset(data_name, {})
                 print("Warning: %s does not exist." % (data_name))
+            if as_arrays:
+                self.data[data_name] = {
+                    instrument: rows_to_arrays(list(data), data.get_fields())
+                    for instrument, data in self.data[data_name].items()}
 
     def get_all(self):
         """
@@ -29,6 +56,12 @@ class DataLoader:
         """
         return self.data
 
+    def get_versions(self):
+        """
+        Return version ids of loaded datasets.
+        """
+        return self.versions
+
     def get_update(self):
         """
         TO-DO: Update the data and return those new data.
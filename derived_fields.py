@@ -0,0 +1,48 @@
+"""
+Fields derived from raw fields of datasets.
+
+Derivations are computed once per aligned Dataset (see
+Dataset.derive_fields), and then read like raw fields, e.g.
+`price_data[-1].mid`.
+
+A derivation is a pair of its field name and a function, which maps the
+values of the current row (a dict of raw fields and previously derived
+fields) and the previous row (None on the first row) to the derived value.
+"""
+
+def is_valid(values, _previous):
+    """
+    Whether both buy and sell prices are available.
+    """
+    return values['buy'] is not None and values['sell'] is not None
+
+def half_spread(values, _previous):
+    """
+    Half of the spread between sell and buy prices.
+    """
+    if not values['valid']:
+        return None
+    return (values['sell'] - values['buy']) / 2
+
+def middle_price(values, _previous):
+    """
+    Middle of buy and sell prices.
+    """
+    if not values['valid']:
+        return None
+    return values['buy'] + values['half_spread']
+
+def daily_return(values, previous):
+    """
+    Return of the middle price since the previous row.
+    None if either middle price is not available.
+    """
+    if (previous is None or previous.mid is None or values['mid'] is None):
+        return None
+    return values['mid'] / previous.mid - 1
+
+CURRENCY_PRICE = (
+    ('valid', is_valid),
+    ('half_spread', half_spread),
+    ('mid', middle_price),
+    ('returns', daily_return))
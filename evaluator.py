@@ -2,10 +2,14 @@
 Evaluator calculates indicators for an alpha to evaluate alpha performance.
 """
 
-from multiprocessing import Array, Process, Queue
-import ctypes
+from multiprocessing import Process, Queue, shared_memory
 import pickle
+import queue
+import time
 import numpy as np
+from thousandaire.memory import POLL_INTERVAL, UsageSampler
+from thousandaire.profiler import NullProfiler
+from thousandaire.tracing import name_process, span, traced
 
 COSTS = 'costs'
 DATES = 'dates'
@@ -14,34 +18,126 @@ POSITIONS_RAW = 'positions_raw'
 POSITIONS_NP = 'positions_np'
 INDICATORS_ALL = {}
 INDICATORS_DEFAULT = []
+# Kinds of encoded fields.
+ARRAY = 'array'
+ROWS = 'rows'
+PICKLED = 'pickled'
 
-def encode_data(instruments, data):
+def share(array, blocks):
     """
-    Encode data into numpy type.
+    Copy a np.array into a new shared memory block appended to blocks, and
+    return its descriptor (name, shape, dtype).
+    """
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+    blocks.append(block)
+    return block.name, array.shape, array.dtype.str
+
+def attach(descriptor, blocks):
+    """
+    Return a np.array view of a shared memory block without copying it.
+    The attached block is appended to blocks, which should be closed after
+    the view is no longer used.
+    """
+    name, shape, dtype = descriptor
+    block = shared_memory.SharedMemory(name=name)
+    blocks.append(block)
+    array = np.ndarray(shape, dtype, buffer=block.buf)
+    array.flags.writeable = False
+    return array
+
+def decode_field(encoded, blocks):
+    """
+    Return the value of an encoded field, attaching its blocks to blocks.
+    """
+    kind, descriptor, keys = encoded
+    array = attach(descriptor, blocks)
+    if kind == ARRAY:
+        return array
+    if kind == ROWS:
+        return dict(zip(keys, array))
+    return pickle.loads(array)
+
+def release(blocks, unlink=False):
+    """
+    Close shared memory blocks, and also free them if unlink is True.
+    """
+    for block in blocks:
+        block.close()
+        if unlink:
+            block.unlink()
+
+def detach(value, fields):
+    """
+    Return value, where arrays which may share memory with any array of
+    fields (decoded fields, as arrays or dicts of rows) are copied, also
+    within dicts, lists and tuples. Shared memory blocks are released right
+    after an indicator returns, so its results must not point into them.
+    """
+    if isinstance(value, np.ndarray):
+        arrays = []
+        for decoded in fields:
+            if isinstance(decoded, dict):
+                arrays.extend(decoded.values())
+            else:
+                arrays.append(decoded)
+        if any(
+                isinstance(array, np.ndarray)
+                and np.may_share_memory(value, array) for array in arrays):
+            return np.array(value, copy=True)
+        return value
+    if isinstance(value, dict):
+        return {key: detach(item, fields) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [detach(item, fields) for item in value]
+        return items if isinstance(value, list) else tuple(items)
+    return value
+
+def encode_data(instruments, data, blocks):
+    """
+    Encode data into shared memory, and return descriptors of its fields.
+    Numeric arrays are shared as they are, so indicators read them without
+    copying; other fields are shared pickled.
 
     instruments: all instruments we need here to construct 2D np.array.
-        data: a Data with following fields:
+        data: a Data of simulation results, or anything with a length which
+            iterates over them (e.g. a ResultSpool), read in one pass and
+            encoded into:
             dates: a list-like objects which stores dates.
             pnls: a np.array which stores each instrument's pnl.
             costs: a np.array which stores each instrument's trading cost.
-            positions_raw: a list-like of dict-like objects which map
-                instruments (str) to their positions (float).
+            positions_raw: a list-like of dict-like objects (Portfolio)
+                which map instruments (str) to their positions (float).
             positions_np: the np-version of positions_raw.
+    blocks: a list to append created shared memory blocks to. They should
+        be released, with unlink, after all indicators are done.
+
+    Each field is encoded as (kind, descriptor, keys), where kind is one of
+    ARRAY, ROWS (a dict of keys to rows of a 2D array) and PICKLED.
     """
-    dates = [item.date for item in data]
-    pnls = {instrument: np.array([item.pnl[instrument] for item in data])
-            for instrument in instruments}
-    costs = {instrument: np.array([item.cost[instrument] for item in data])
-             for instrument in instruments}
-    positions_raw = [item.position_raw for item in data]
-    positions_np = np.array([item.position_np for item in data])
-    serialized = lambda var: Array(ctypes.c_char, pickle.dumps(var), lock=False)
+    instruments = list(instruments)
+    dates = []
+    pnls = np.empty((len(instruments), len(data)), dtype=np.float64)
+    costs = np.empty((len(instruments), len(data)), dtype=np.float64)
+    positions_raw = []
+    for index, item in enumerate(data):
+        dates.append(item.date)
+        pnls[:, index] = [item.pnl[instrument] for instrument in instruments]
+        costs[:, index] = [
+            item.cost[instrument] for instrument in instruments]
+        positions_raw.append(item.position)
+    positions_np = np.array(
+        [position.positions for position in positions_raw])
+    def pickled(var):
+        return PICKLED, share(
+            np.frombuffer(pickle.dumps(var), dtype=np.uint8), blocks), None
     return {
-        COSTS: serialized(costs),
-        DATES: serialized(dates),
-        PNLS: serialized(pnls),
-        POSITIONS_RAW: serialized(positions_raw),
-        POSITIONS_NP: serialized(positions_np)}
+        COSTS: (ROWS, share(costs, blocks), instruments),
+        DATES: pickled(dates),
+        PNLS: (ROWS, share(pnls, blocks), instruments),
+        POSITIONS_RAW: pickled(positions_raw),
+        POSITIONS_NP: (ARRAY, share(positions_np, blocks), None)}
 
 
 class Evaluator:
@@ -76,33 +172,121 @@ class Evaluator:
                     'Indicator not found: %s' % indicator_name)
             self.indicators.append(indicator)
 
-    def run(self, instruments, data):
+    @traced('Evaluator.run', 'evaluation')
+    def run(self, instruments, data, profiler=None, parallel=True,
+            memory=None):
         """
         Run all specified evaluation functions and return their results.
+
+        profiler: an optional Profiler to record time spent in encoding and
+            in each indicator.
+        memory: an optional dict to fill with the peak usage (PSS, see
+            memory) in bytes of each indicator, sampled in its process (in
+            this process while it runs if not parallel).
+        parallel: whether to run each indicator in its own process. Daemonic
+            processes, e.g. workers of a multiprocessing.Pool, cannot have
+            children, so they should run indicators in this process.
+        """
+        if profiler is None:
+            profiler = NullProfiler()
+        blocks = []
+        try:
+            with profiler.phase('encode_data'):
+                encoded = encode_data(instruments, data, blocks)
+            if parallel:
+                return self.run_processes(encoded, profiler, memory)
+            return self.run_here(encoded, profiler, memory)
+        finally:
+            # Blocks must outlive every indicator reading them.
+            release(blocks, unlink=True)
+
+    def run_here(self, encoded, profiler, memory):
+        """
+        Run indicators one by one in this process on encoded data.
+        """
+        results = {}
+        for indicator in self.indicators:
+            start = time.perf_counter()
+            with UsageSampler() as sampler, span(
+                    'indicator:%s' % indicator.__name__, 'evaluation'):
+                results[indicator.__name__] = indicator(**encoded)
+            profiler.record(
+                'indicator:%s' % indicator.__name__,
+                time.perf_counter() - start)
+            if memory is not None:
+                memory[indicator.__name__] = sampler.peak
+        return results
+
+    def run_processes(self, encoded, profiler, memory):
+        """
+        Run every indicator in its own process on encoded data.
         """
         processes = []
         results_queue = Queue()
         for indicator in self.indicators:
             process = Process(
-                target=evaluate,
-                args=(results_queue, indicator),
-                kwargs=encode_data(instruments, data))
-            process.start()
+                target=evaluate, args=(results_queue, indicator),
+                kwargs=encoded)
+            with span('start_process', 'evaluation'):
+                process.start()
             processes.append(process)
-        for process in processes:
-            process.join()
         results = {}
-        while not results_queue.empty():
-            indicator_name, result = results_queue.get()
+        # Results are read before joining, since a process does not exit
+        # until the queue takes all it has put, which may fill the pipe.
+        while len(results) < len(processes):
+            alive = any(process.is_alive() for process in processes)
+            try:
+                indicator_name, result, seconds, usage = results_queue.get(
+                    timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if alive:
+                    continue
+                break
             results[indicator_name] = result
+            profiler.record('indicator:%s' % indicator_name, seconds)
+            if memory is not None:
+                memory[indicator_name] = usage
+        for process in processes:
+            process.join()
         return results
 
-def evaluate(results, indicator, **serialized):
+    def run_values(self, values):
+        """
+        Run indicators in this process on inputs which are not encoded, e.g.
+        results of many replicas computed as arrays.
+
+        values: a dict of fields (PNLS, COSTS, ...) to values in the same
+            formats as encode_data describes. Only fields needed by the
+            indicators are required.
+        """
+        return {
+            indicator.__name__: indicator.func(*(
+                values[field] for field in indicator.needed_fields))
+            for indicator in self.indicators}
+
+    def get_needed_fields(self):
+        """
+        Return the set of fields needed by the indicators.
+        """
+        return {
+            field for indicator in self.indicators
+            for field in indicator.needed_fields}
+
+def evaluate(results, indicator, **encoded):
     """
     Decode all shared variables into evalution function inputs, and return
-    their results by results (a multiprocess.Queue).
+    their results by results (a multiprocess.Queue), together with the wall
+    time spent in the indicator and the peak usage of the process (see
+    memory).
     """
-    results.put((indicator.__name__, indicator(**serialized)))
+    name_process('indicator:%s' % indicator.__name__)
+    start = time.perf_counter()
+    with UsageSampler() as sampler, span(
+            'indicator:%s' % indicator.__name__, 'evaluation'):
+        result = indicator(**encoded)
+    results.put((
+        indicator.__name__, result, time.perf_counter() - start,
+        sampler.peak))
 
 def get_all_indicators():
     """
@@ -121,16 +305,25 @@ def inputs(*needed_fields):
     """
     Decorator for eval_functions to extract their inputs from encoded data.
     Only fields in needed_fields will be decoded to improve the performance.
+    Numeric fields are read-only views of shared memory, valid only during
+    the call, so results which are views of them are copied (see detach).
 
     All and only functions decorated by this will be considered as indicators.
     They will be registered into indicator_list for lookup.
     """
     def middle(func):
         def final(**available_fileds):
-            return func(*(
-                pickle.loads(available_fileds[field])
-                for field in needed_fields))
+            blocks = []
+            try:
+                values = [
+                    decode_field(available_fileds[field], blocks)
+                    for field in needed_fields]
+                return detach(func(*values), values)
+            finally:
+                release(blocks)
         final.__name__ = func.__name__
+        final.func = func
+        final.needed_fields = needed_fields
         # register the function into INDICATORS_ALL
         INDICATORS_ALL[final.__name__] = final
         return final
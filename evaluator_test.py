@@ -0,0 +1,64 @@
+"""
+Unit tests for Evaluator.
+"""
+
+import unittest
+import numpy as np
+from thousandaire.benchmark.synthetic_data import generate_raw_data
+from thousandaire.constants import TRADING_INSTRUMENTS
+from thousandaire.evaluator import (
+    INDICATORS_ALL, PNLS, POSITIONS_NP, Evaluator, inputs)
+from thousandaire.simulation import build_simulator, initialize
+from thousandaire.simulation import load_settings
+
+class TestEvaluator(unittest.TestCase):
+    """
+    Unit test object for Evaluator.
+    """
+    def setUp(self):
+        data_all = initialize(generate_raw_data(instruments=4, years=2))
+        settings = load_settings('thousandaire.benchmark.kdr_5_settings')
+        workdays = data_all['workdays']['TW']
+        settings.start_date = workdays[20 - len(workdays)].date
+        settings.end_date = workdays[-1].date
+        self.instruments = TRADING_INSTRUMENTS[settings.target]
+        self.results = build_simulator(settings, data_all).run()
+
+    def test_same_as_direct(self):
+        """
+        Indicators on shared memory should match those on the results.
+        """
+        pnls = sum(
+            np.array([today.pnl[instrument] for today in self.results])
+            for instrument in self.instruments)
+        results = Evaluator(['sharpe', 'returns']).run(
+            self.instruments, self.results)
+        self.assertAlmostEqual(
+            results['sharpe'], np.mean(pnls) / np.std(pnls))
+        self.assertAlmostEqual(results['returns'], np.mean(pnls) * 252)
+
+    def test_views_copied(self):
+        """
+        Results which are views of shared memory should outlive it.
+        """
+        @inputs(PNLS, POSITIONS_NP)
+        def views(pnls, positions_np):
+            return {'pnls': pnls, 'first': (positions_np[0], positions_np.T)}
+        try:
+            for parallel in (True, False):
+                results = Evaluator(['views']).run(
+                    self.instruments, self.results, parallel=parallel)
+                first, transposed = results['views']['first']
+                np.testing.assert_array_equal(
+                    first, self.results[0].position.positions)
+                np.testing.assert_array_equal(
+                    transposed[:, -1], self.results[-1].position.positions)
+                self.assertEqual(
+                    list(results['views']['pnls'][self.instruments[0]]),
+                    [today.pnl[self.instruments[0]]
+                     for today in self.results])
+        finally:
+            del INDICATORS_ALL[views.__name__]
+
+if __name__ == '__main__':
+    unittest.main()
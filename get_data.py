@@ -3,32 +3,51 @@ Call crawlers to get up-to-date data and save them to files.
 """
 
 import importlib
-import os
-import pickle
-from thousandaire.constants import DATA_DIR, DATA_LIST_ALL
+from thousandaire.constants import CRAWL_CHECKPOINT_DIR, DATA_LIST_ALL
+from thousandaire.crawler import CrawlCheckpoint
 from thousandaire.data_loader import DataLoader
+from thousandaire.response_cache import ResponseCache
+from thousandaire.version_store import VersionStore
 
-def call_crawlers(dataset_list):
+def call_crawlers(dataset_list, cache=None, store=None,
+                  checkpoint_dir=CRAWL_CHECKPOINT_DIR):
     """
     Call crawlers to get latest data.
+    Each updated dataset is committed as a new version into the store,
+    together with its last modified dates.
+
+    Crawlers save their progress into a CrawlCheckpoint, so a crawl which
+    fails, e.g. on a network error, resumes where it stopped when called
+    again. The checkpoint is removed once the dataset is committed.
+
+    cache: an optional ResponseCache shared by all crawlers.
+    store: the VersionStore to commit into; the default one if None.
+    checkpoint_dir: where crawlers save their progress.
+
+    Return a dict of dataset names to committed version ids.
     """
+    store = VersionStore() if store is None else store
+    versions = {}
     for dataset_name in dataset_list:
         crawler_module = importlib.import_module(
             'thousandaire.crawlers.%s' % dataset_name)
-        crawler = crawler_module.Crawler(dataset_name)
-        cur_data = DataLoader([dataset_name]).get_all()[dataset_name]
+        crawler = crawler_module.Crawler(dataset_name, store)
+        crawler.set_cache(cache)
+        checkpoint = CrawlCheckpoint(
+            dataset_name, store.resolve(dataset_name), checkpoint_dir)
+        crawler.set_checkpoint(checkpoint)
+        cur_data = DataLoader([dataset_name], store=store).get_all()[
+            dataset_name]
         last_date, new_data = crawler.update()
-        if not os.path.isdir(DATA_DIR):
-            os.mkdir(DATA_DIR)
-        data_path = os.path.join(DATA_DIR, dataset_name)
-        with open(data_path, 'wb') as file:
-            for key in new_data:
-                if key in cur_data.keys():
-                    cur_data[key].extend(new_data[key])
-                else:
-                    cur_data[key] = new_data[key]
-            pickle.dump(cur_data, file)
-        crawler.set_last_modified_date(last_date)
+        for key in new_data:
+            if key in cur_data.keys():
+                cur_data[key].extend(new_data[key])
+            else:
+                cur_data[key] = new_data[key]
+        versions[dataset_name] = store.commit(
+            cur_data, {'last_modified': last_date})
+        checkpoint.clear()
+    return versions
 
 if __name__ == '__main__':
-    call_crawlers(DATA_LIST_ALL)
+    call_crawlers(DATA_LIST_ALL, ResponseCache())
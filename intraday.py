@@ -0,0 +1,276 @@
+"""
+Intraday data: many bars per day, e.g. quotes sampled during a session.
+
+Bars are kept column by column in np.arrays, timestamps as int64 seconds
+and fields in float64 or float32 as chosen per field, so that millions of
+bars per instrument stay compact. Arrays are read-only and shared by
+copies of the data.
+
+An IntradayDataset is bound like a Dataset. Once synchronized with
+workdays, an alpha generating the portfolio of a day sees all bars before
+that day, plus the bars of that day's session before the cutoff time of
+the dataset, and nothing else: the bars themselves stay private to the
+controllers. IntradayData can also be resampled into daily open, high,
+low, close, VWAP and volume by resample_daily, which loaders run before
+binding, and the result is a usual Dataset aligned by set_workdays.
+"""
+
+import datetime
+import numpy as np
+from thousandaire.data_classes import Data, Dataset, protect
+from thousandaire.trading_calendar import CalendarCursor
+
+SECONDS_PER_DAY = 86400
+# Day ordinal of 1970-01-01, where timestamps start.
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+DAILY_FIELDS = ['open', 'high', 'low', 'close', 'vwap', 'volume']
+
+def to_timestamps(times):
+    """
+    Return int64 seconds since 1970-01-01 of naive datetimes.
+    """
+    return np.array(times, dtype='datetime64[s]').astype(np.int64)
+
+def to_ordinals(timestamps):
+    """
+    Return day ordinals of int64 timestamps.
+    """
+    return timestamps // SECONDS_PER_DAY + EPOCH_ORDINAL
+
+def read_only(array):
+    """
+    Return the array flagged read-only.
+    """
+    array.flags.writeable = False
+    return array
+
+class IntradayData:
+    """
+    Bars of an instrument in time order.
+    """
+    def __init__(self, name, fields, timestamps, values, dtypes=None):
+        """
+        fields: names of fields other than `time`.
+        timestamps: int64 seconds since 1970-01-01, in time order.
+        values: a dict of fields to arrays aligned with timestamps, with NaN
+            for missing values.
+        dtypes: an optional dict of fields to 'float32' or 'float64'.
+            Fields not in it are kept in float64.
+        """
+        dtypes = {} if dtypes is None else dtypes
+        self.name = name
+        self.fields = list(fields)
+        self.timestamps = read_only(np.array(timestamps, dtype=np.int64))
+        if (np.diff(self.timestamps) < 0).any():
+            raise ValueError('Bars should be in time order.')
+        self.values = {
+            field: read_only(np.array(
+                values[field], dtype=dtypes.get(field, 'float64')))
+            for field in self.fields}
+
+    @classmethod
+    def from_rows(cls, name, fields, rows, dtypes=None):
+        """
+        Build IntradayData from rows of (datetime, value, ...), with None
+        for missing values.
+        """
+        columns = list(zip(*rows)) if rows else [()] * (len(fields) + 1)
+        values = {
+            field: [np.nan if value is None else value for value in column]
+            for field, column in zip(fields, columns[1:])}
+        return cls(name, fields, to_timestamps(columns[0]), values, dtypes)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def resample_daily(self, price='price', volume='volume'):
+        """
+        Return a Data of daily bars, i.e. rows of (date, open, high, low,
+        close, vwap, volume), of bars with both price and volume.
+        vwap is None on days without volume.
+        """
+        valid = ~(np.isnan(self.values[price]) | np.isnan(self.values[volume]))
+        prices = self.values[price][valid].astype(np.float64)
+        volumes = self.values[volume][valid].astype(np.float64)
+        ordinals = to_ordinals(self.timestamps[valid])
+        daily = Data(self.name, list(DAILY_FIELDS))
+        if len(ordinals) == 0:
+            return daily
+        starts = np.flatnonzero(np.diff(ordinals, prepend=ordinals[0] - 1))
+        ends = np.append(starts[1:], len(ordinals)) - 1
+        total_volumes = np.add.reduceat(volumes, starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            vwaps = np.add.reduceat(prices * volumes, starts) / total_volumes
+        vwaps = np.where(total_volumes > 0, vwaps, np.nan)
+        columns = [
+            prices[starts], np.maximum.reduceat(prices, starts),
+            np.minimum.reduceat(prices, starts), prices[ends], vwaps,
+            total_volumes]
+        dates = [
+            datetime.datetime.fromordinal(ordinal)
+            for ordinal in ordinals[starts].tolist()]
+        daily.extend(
+            (date, *(None if np.isnan(value) else value for value in row))
+            for date, row in zip(dates, np.column_stack(columns).tolist()))
+        return daily
+
+class IntradayController:
+    """
+    Control the data privacy of IntradayData, like DataController.
+    """
+    def __init__(self, data, cutoff=None, key=None):
+        """
+        cutoff: a datetime.time; bars of the current day before it are
+            visible. None for no bars of the current day.
+        """
+        self.name = data.name
+        self.__data = data
+        self.__key = key
+        self.cutoff = cutoff
+        self.__cursor = None
+        # For each workday, the first bar of it and the first bar at or
+        # after its cutoff.
+        self.__starts = None
+        self.__cutoffs = None
+
+    def authorize(self, key):
+        """
+        Check if the key is correct to authorize the key holder to access
+        the data.
+        """
+        return key == self.__key
+
+    def set_key(self, key):
+        """
+        Set key for permission control.
+        """
+        if self.__key is not None:
+            raise IOError("Permission denied: the key is unchangeable.")
+        self.__key = key
+
+    def get_fields(self):
+        """
+        Return names of fields other than `time`.
+        """
+        return list(self.__data.fields)
+
+    @protect
+    def set_workdays(self, workdays, cursor=None):
+        """
+        Locate the session of every workday. Bars on other days are never
+        part of a session, but are returned by get_bars.
+
+        cursor: a CalendarCursor of the workdays shared with other data of
+            the Dataset. A new one is created if None.
+        """
+        calendar, offset = workdays.get_calendar()
+        day_starts = (calendar.ordinals - EPOCH_ORDINAL) * SECONDS_PER_DAY
+        timestamps = self.__data.timestamps
+        self.__starts = np.searchsorted(timestamps, day_starts)
+        if self.cutoff is None:
+            self.__cutoffs = self.__starts
+        else:
+            self.__cutoffs = np.searchsorted(timestamps, day_starts + (
+                self.cutoff.hour * 3600 + self.cutoff.minute * 60
+                + self.cutoff.second))
+        self.__cursor = (
+            CalendarCursor(calendar, offset + len(workdays))
+            if cursor is None else cursor)
+
+    def get_today(self):
+        """
+        Return the date of the current simulating day, or None after the last
+        workday.
+        """
+        index = self.__cursor.index
+        if index >= len(self.__cursor.calendar):
+            return None
+        return self.__cursor.calendar.date_of(index)
+
+    def __get_stop(self):
+        """
+        Return the index of the first bar not visible.
+        """
+        index = self.__cursor.index
+        if index >= len(self.__cutoffs):
+            return len(self.__data)
+        return self.__cutoffs[index]
+
+    def __get_bars(self, start, stop):
+        bars = {'time': self.__data.timestamps[start:stop].astype(
+            'datetime64[s]')}
+        for field in self.__data.fields:
+            bars[field] = self.__data.values[field][start:stop]
+        return bars
+
+    def get_session(self):
+        """
+        Return bars of the current day before the cutoff, as a dict of
+        `time` (datetime64) and fields to read-only arrays.
+        """
+        index = self.__cursor.index
+        start = (
+            self.__starts[index] if index < len(self.__starts)
+            else len(self.__data))
+        return self.__get_bars(start, self.__get_stop())
+
+    def get_bars(self, days):
+        """
+        Return all bars from the start of the workday `days` workdays before
+        the current day up to the cutoff of the current day, in the same
+        format as get_session.
+        """
+        first = max(self.__cursor.index - days, 0)
+        start = (
+            self.__starts[first] if first < len(self.__starts)
+            else len(self.__data))
+        return self.__get_bars(start, self.__get_stop())
+
+    @protect
+    def move_forward(self):
+        """
+        Move to next workday.
+        """
+        self.__cursor.move_forward()
+
+    @protect
+    def set_date(self, target_date):
+        """
+        Set the current day to target_date.
+        """
+        self.__cursor.set_date(target_date)
+
+    @protect
+    def add_fields(self, derivations):
+        """
+        Derived fields of daily rows do not apply to bars.
+        """
+        raise TypeError('Intraday data have no derived fields.')
+
+class IntradayDataset(Dataset):
+    """
+    Dataset of IntradayData, bound like a Dataset.
+    """
+    def __init__(self, data_name, data, cutoff=None):
+        """
+        data: a dict of instruments to IntradayData.
+        cutoff: see IntradayController.
+        """
+        super().__init__(data_name, {})
+        for instrument, values in data.items():
+            self[instrument] = IntradayController(values, cutoff)
+
+def resample_daily(data_name, data, price='price', volume='volume'):
+    """
+    Return a Dataset of daily bars of all instruments, see
+    IntradayData.resample_daily. Loaders should run it on raw IntradayData
+    before binding, since daily bars of a day include bars after its cutoff.
+
+    data: a dict of instruments to IntradayData.
+    """
+    return Dataset(data_name, {
+        instrument: values.resample_daily(price, volume)
+        for instrument, values in data.items()})
@@ -0,0 +1,88 @@
+"""
+Unit tests for intraday data.
+"""
+
+import unittest
+from datetime import datetime, time
+import numpy as np
+from thousandaire.data_classes import Data, DataController
+from thousandaire.intraday import IntradayData, IntradayDataset
+from thousandaire.intraday import resample_daily
+
+class TestIntraday(unittest.TestCase):
+    """
+    Unit test object for IntradayData and IntradayDataset.
+    """
+    def setUp(self):
+        rows = [
+            (datetime(2020, 1, 2, 9, 0), 30., 1.),
+            (datetime(2020, 1, 2, 11, 0), 32., 3.),
+            (datetime(2020, 1, 2, 13, 0), None, 5.),
+            (datetime(2020, 1, 4, 10, 0), 40., 1.),
+            (datetime(2020, 1, 6, 9, 30), 31., 2.),
+            (datetime(2020, 1, 6, 12, 0), 29., 2.)]
+        self.data = IntradayData.from_rows(
+            'quote', ['price', 'volume'], rows, {'price': 'float32'})
+        workdays = Data('workdays', [])
+        workdays.extend([(datetime(2020, 1, day),) for day in (2, 3, 6)])
+        self.workdays = DataController(workdays)
+
+    def test_resample_daily(self):
+        """
+        Daily bars should skip missing prices, and be aligned to workdays
+        like any Data.
+        """
+        daily = self.data.resample_daily()
+        self.assertEqual(
+            [tuple(row) for row in daily],
+            [(datetime(2020, 1, 2), 30., 32., 30., 32., 31.5, 4.),
+             (datetime(2020, 1, 4), 40., 40., 40., 40., 40., 1.),
+             (datetime(2020, 1, 6), 31., 31., 29., 29., 30., 4.)])
+        dataset = resample_daily('quote', {'USD': self.data})
+        dataset.set_workdays(self.workdays)
+        self.assertEqual(
+            [row.close for row in dataset['USD']], [32., None, 29.])
+
+    def test_session(self):
+        """
+        Only bars of the current day before the cutoff should be visible.
+        """
+        dataset = IntradayDataset(
+            'quote', {'USD': self.data}, cutoff=time(10))
+        dataset.set_workdays(self.workdays)
+        dataset.set_date(datetime(2020, 1, 2))
+        np.testing.assert_array_equal(
+            dataset['USD'].get_session()['price'], [30.])
+        dataset.move_forward()
+        self.assertEqual(dataset['USD'].get_today(), datetime(2020, 1, 3))
+        self.assertEqual(len(dataset['USD'].get_session()['price']), 0)
+        dataset.move_forward()
+        bars = dataset['USD'].get_bars(1)
+        np.testing.assert_array_equal(bars['volume'], [1., 2.])
+        self.assertEqual(
+            bars['time'][-1], np.datetime64('2020-01-06T09:30:00'))
+        with self.assertRaises(ValueError):
+            bars['price'][0] = 0.
+
+    def test_no_future_bars(self):
+        """
+        No bar at or after the cutoff of the current day should be
+        reachable from the bound dataset.
+        """
+        dataset = IntradayDataset(
+            'quote', {'USD': self.data}, cutoff=time(10))
+        dataset.set_workdays(self.workdays)
+        dataset.set_date(datetime(2020, 1, 2))
+        self.assertFalse(hasattr(dataset, 'resample_daily'))
+        for item in [dataset] + list(dataset.values()):
+            for name, value in vars(item).items():
+                if not name.startswith('_'):
+                    self.assertNotIsInstance(value, (IntradayData, dict))
+        for days in (0, 1, 100):
+            bars = dataset['USD'].get_bars(days)
+            self.assertTrue(
+                (bars['time'] < np.datetime64('2020-01-02T10:00:00')).all())
+        self.assertEqual(len(dataset['USD'].get_session()['price']), 1)
+
+if __name__ == '__main__':
+    unittest.main()
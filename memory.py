@@ -0,0 +1,193 @@
+"""
+Memory accounting of simulation processes.
+
+Usage of a process is its proportional set size (PSS), i.e. its private
+pages plus its share of pages shared with other processes, so that pages
+inherited from the parent by fork are not counted once per child. It is
+read from /proc on Linux, falling back to the resident set size (RSS)
+where PSS is not available. The peak RSS of getrusage is not used, since a
+forked process starts from the high-water mark of its parent.
+"""
+
+import gc
+import os
+import signal
+import sys
+import threading
+import types
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+# Seconds between two checks of usage against a budget.
+POLL_INTERVAL = 0.1
+MEGABYTE = 2 ** 20
+# Objects shared by everything, which are not part of any data.
+IGNORED_TYPES = (type, types.ModuleType, types.FunctionType)
+
+def get_usage(pid='self'):
+    """
+    Return the current usage of a process in bytes, or None if the process
+    does not exist anymore.
+    """
+    try:
+        with open('/proc/%s/smaps_rollup' % pid) as file:
+            for line in file:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except FileNotFoundError:
+        pass
+    except OSError:
+        return None
+    try:
+        with open('/proc/%s/statm' % pid) as file:
+            return int(file.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return None
+
+def get_descendants(pid):
+    """
+    Return pids of all descendants of a process.
+    """
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/%s/stat' % entry) as file:
+                stat = file.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, so fields follow its ')'.
+        parent = int(stat[stat.rindex(')') + 2:].split()[1])
+        children.setdefault(parent, []).append(int(entry))
+    descendants = []
+    pending = [pid]
+    while pending:
+        found = children.get(pending.pop(), [])
+        descendants.extend(found)
+        pending.extend(found)
+    return descendants
+
+def get_tree_usage(pid):
+    """
+    Return the total usage in bytes of a process and all its descendants,
+    e.g. an alpha process and its indicator processes.
+    """
+    return sum(
+        usage or 0
+        for usage in map(get_usage, [pid] + get_descendants(pid)))
+
+def terminate_tree(pid):
+    """
+    Send SIGTERM to a process and then to all its descendants.
+    """
+    descendants = get_descendants(pid)
+    for target in [pid] + descendants:
+        try:
+            os.kill(target, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+def exit_on_terminate():
+    """
+    Turn SIGTERM into SystemExit in this process, so that a terminated
+    process still runs its finally blocks, e.g. to unlink shared memory.
+    """
+    def handler(signum, _frame):
+        sys.exit(128 + signum)
+    signal.signal(signal.SIGTERM, handler)
+
+def get_size(obj):
+    """
+    Return the total size in bytes of an object and all objects it refers
+    to, counting every object once. Arrays count their data if they own it.
+    """
+    seen = set()
+    size = 0
+    objects = [obj]
+    while objects:
+        found = []
+        for item in objects:
+            if id(item) in seen or isinstance(item, IGNORED_TYPES):
+                continue
+            seen.add(id(item))
+            size += sys.getsizeof(item)
+            found.append(item)
+        objects = gc.get_referents(*found)
+    return size
+
+class MemoryBudget:
+    """
+    Watch process trees against a budget and terminate those going over.
+    """
+    def __init__(self, budget):
+        """
+        budget: max usage in bytes of a process and its descendants.
+        """
+        self.budget = budget
+        self.peaks = {}
+        self.aborted = {}
+
+    def check(self, name, process):
+        """
+        Record the usage of a live multiprocessing.Process as `name`, and
+        terminate it if it is over the budget.
+        Return whether the process has been aborted.
+        """
+        if name in self.aborted:
+            return True
+        if not process.is_alive():
+            return False
+        usage = get_tree_usage(process.pid)
+        self.peaks[name] = max(self.peaks.get(name, 0), usage)
+        if usage <= self.budget:
+            return False
+        terminate_tree(process.pid)
+        self.aborted[name] = usage
+        return True
+
+    def get_results(self, name):
+        """
+        Return a dict of the budget, the sampled peak usage and whether the
+        process has been aborted, for the process recorded as `name`.
+        """
+        return {
+            'budget': self.budget,
+            'peak_usage': self.peaks.get(name, 0),
+            'aborted': name in self.aborted}
+
+class UsageSampler:
+    """
+    Sample the usage of this process in a background thread while in its
+    context, and keep the peak. Processes should not fork in the context,
+    since forked processes do not have the thread.
+    """
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.sample()
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        self.sample()
+
+    def sample(self):
+        """
+        Record the current usage, and return the peak so far.
+        """
+        self.peak = max(self.peak, get_usage() or 0)
+        return self.peak
+
+    def watch(self):
+        """
+        Sample every interval until stopped.
+        """
+        while not self.stopped.wait(self.interval):
+            self.sample()
@@ -0,0 +1,88 @@
+"""
+Unit tests for memory accounting.
+"""
+
+import time
+import unittest
+from multiprocessing import Event, Process, Queue
+import numpy as np
+from thousandaire.memory import MEGABYTE, MemoryBudget, UsageSampler
+from thousandaire.memory import get_size, get_usage
+
+def hold(megabytes, ready):
+    """
+    Keep an array of the given size in memory until terminated.
+    """
+    array = np.ones(megabytes * MEGABYTE // 8)
+    ready.set()
+    while array.any():
+        time.sleep(0.1)
+
+def sample_usage(results):
+    """
+    Put the peak usage of a short task into results.
+    """
+    with UsageSampler() as sampler:
+        sum(range(1000))
+    results.put(sampler.peak)
+
+class TestMemory(unittest.TestCase):
+    """
+    Unit test object for memory accounting.
+    """
+    def test_get_size(self):
+        """
+        Shared objects should be counted once, and arrays by their data.
+        """
+        array = np.zeros(MEGABYTE // 8)
+        self.assertGreater(get_size({'a': array}), MEGABYTE)
+        self.assertLess(get_size([array, array]), 2 * MEGABYTE)
+
+    def test_budget(self):
+        """
+        Only the process over the budget should be aborted.
+        """
+        budget = MemoryBudget(200 * MEGABYTE)
+        processes = {}
+        for name, megabytes in (('small', 1), ('large', 300)):
+            ready = Event()
+            processes[name] = Process(target=hold, args=(megabytes, ready))
+            processes[name].start()
+            ready.wait()
+        try:
+            self.assertFalse(budget.check('small', processes['small']))
+            self.assertTrue(budget.check('large', processes['large']))
+            processes['large'].join(5)
+            self.assertFalse(processes['large'].is_alive())
+            self.assertTrue(budget.get_results('large')['aborted'])
+            self.assertFalse(budget.get_results('small')['aborted'])
+        finally:
+            for process in processes.values():
+                process.terminate()
+                process.join()
+
+    def test_sampler(self):
+        """
+        The sampler should catch a peak which is gone by its end.
+        """
+        with UsageSampler(0.01) as sampler:
+            array = np.ones(100 * MEGABYTE // 8)
+            time.sleep(0.1)
+            del array
+        self.assertGreater(sampler.peak, get_usage() + 50 * MEGABYTE)
+
+    def test_forked_sampler(self):
+        """
+        A forked process should not report the peak of its parent.
+        """
+        array = np.ones(200 * MEGABYTE // 8)
+        del array
+        results = Queue()
+        process = Process(target=sample_usage, args=(results,))
+        process.start()
+        peak = results.get()
+        process.join()
+        self.assertLess(peak, 100 * MEGABYTE)
+
+if __name__ == '__main__':
+    unittest.main()
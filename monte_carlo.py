@@ -0,0 +1,236 @@
+"""
+Monte Carlo simulation of stochastic alphas over many seeded replicas.
+
+Every replica is a full simulation and evaluation of the alpha with its
+own seed, run on a process pool over data loaded once. The distribution of
+each indicator over replicas is then summarized by its mean, standard
+deviation and quantiles.
+
+Alphas whose formula implements generate_batch(date, data, generators)
+can instead run all replicas in one pass (--batch). It is called once a
+day with a np.random.Generator per replica and returns a dict of
+instruments to arrays of positions, one per replica. Pnl of all replicas
+is then computed by the vectorized pnl function. Replicas of the batch
+mode draw from their numpy generators, so they are reproducible by seed
+but differ from replicas of the pool mode.
+
+Example:
+    python -m thousandaire.monte_carlo \
+        -p thousandaire.benchmark.draw_lots_settings -n 100 --seed 7
+"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import numpy as np
+from thousandaire.combiner import price_matrices
+from thousandaire.constants import TRADING_CONFIGS, TRADING_INSTRUMENTS
+from thousandaire.data_classes import Portfolio, get_instrument_index
+from thousandaire.evaluator import COSTS, DATES, PNLS, POSITIONS_NP
+from thousandaire.evaluator import POSITIONS_RAW, Evaluator
+from thousandaire.simulation import COST_MODEL, PRICE_DATASET, PNL_FUNCTION
+from thousandaire.simulation import build_simulator, initialize
+from thousandaire.simulation import load_settings
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# Data and alpha of replicas, set in each worker of the pool.
+CONTEXT = {}
+
+def build_parser():
+    """
+    Get the alpha path and replica options.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-p', '--alpha_settings_path', help='Path of alpha settings file.',
+        required=True)
+    parser.add_argument(
+        '-n', '--replicas', help='Number of replicas.', type=int,
+        default=100)
+    parser.add_argument(
+        '--seed', help='Seed of the first replica; replica i uses seed + i.',
+        type=int, default=0)
+    parser.add_argument(
+        '--seeds', help='Seeds of replicas, instead of -n and --seed.',
+        type=int, nargs='*', default=None)
+    parser.add_argument(
+        '--processes', help='Number of worker processes.', type=int,
+        default=multiprocessing.cpu_count())
+    parser.add_argument(
+        '--batch',
+        help='Run all replicas in one pass by generate_batch of the alpha.',
+        action='store_true')
+    parser.add_argument(
+        '-o', '--output_path',
+        help='Path to dump indicators of every replica and the summary.',
+        action='store')
+    return parser.parse_args()
+
+def set_context(data_all, alpha_settings_path):
+    """
+    Initialize a worker of the pool with the data and the alpha.
+    """
+    CONTEXT['data_all'] = data_all
+    CONTEXT['alpha_settings_path'] = alpha_settings_path
+
+def run_replica(seed):
+    """
+    Simulate and evaluate one replica of the alpha in CONTEXT.
+    Both `random` and `np.random` are seeded.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    settings = load_settings(CONTEXT['alpha_settings_path'])
+    results = build_simulator(settings, CONTEXT['data_all']).run()
+    return Evaluator().run(
+        TRADING_INSTRUMENTS[settings.target], results, parallel=False)
+
+def run_replicas(data_all, alpha_settings_path, seeds, processes):
+    """
+    Return indicators of replicas of the given seeds, run on a pool.
+    """
+    with multiprocessing.Pool(
+            processes, set_context, (data_all, alpha_settings_path)) as pool:
+        return pool.map(run_replica, seeds)
+
+class BatchFormula: # pylint: disable=too-few-public-methods
+    """
+    Adapt a formula with generate_batch to the Simulator.
+
+    Normalized positions of all replicas are kept day by day, and the
+    portfolio of the first replica is handed to the Simulator.
+    """
+    def __init__(self, formula, target, generators):
+        self.formula = formula
+        self.target = target
+        self.generators = generators
+        self.positions = []
+
+    def __call__(self, date, data):
+        index = get_instrument_index(self.target)
+        positions = np.zeros((len(self.generators), len(index)))
+        for instrument, values in self.formula.generate_batch(
+                date, data, self.generators).items():
+            if instrument not in index:
+                raise KeyError(
+                    'Some instruments on %s are not tradable.' % date)
+            positions[:, index[instrument]] = values
+        sums = np.abs(positions).sum(axis=1, keepdims=True)
+        if (sums == 0).any():
+            raise ZeroDivisionError('Zero position on %s' % date)
+        positions /= sums
+        self.positions.append(positions)
+        return Portfolio(positions[0], self.target)
+
+def simulate_batch(settings, data_all, seeds):
+    """
+    Simulate replicas of the given seeds in one pass by generate_batch.
+    Return dates and normalized positions of shape (days, replicas,
+    instruments).
+    """
+    target = settings.target
+    simulator = build_simulator(settings, data_all)
+    formula = BatchFormula(
+        settings.alpha(
+            settings.start_date, simulator.data['others'],
+            settings.parameters),
+        target, [np.random.default_rng(seed) for seed in seeds])
+    results = simulator.run(formula) # pylint: disable=too-many-function-args
+    dates = [today.date for today in results]
+    positions = np.array(formula.positions).reshape(
+        (len(results), len(seeds), len(TRADING_INSTRUMENTS[target])))
+    if len(results) > 0 and dates[-1] == settings.end_date:
+        # Liquidated by the pnl function, as in the first replica.
+        positions[-1] = results[-1].position.encode_to_nparray(target)
+    return dates, positions
+
+def evaluate_batch(data_all, target, dates, positions):
+    """
+    Return indicators of every replica of positions, of shape (days,
+    replicas, instruments), computed by the vectorized pnl function.
+    """
+    _, region = target
+    instruments = TRADING_INSTRUMENTS[target]
+    middle_prices, half_spreads = price_matrices(
+        data_all[region][TRADING_CONFIGS[target][PRICE_DATASET]],
+        data_all['workdays'][region], instruments,
+        np.array(dates, dtype='datetime64[D]'))
+    evaluator = Evaluator()
+    needs_raw = POSITIONS_RAW in evaluator.get_needed_fields()
+    indicators = []
+    for replica in range(positions.shape[1]):
+        pnl, cost = TRADING_CONFIGS[target][PNL_FUNCTION].calculate_matrix(
+            positions[:, replica], middle_prices, half_spreads,
+            TRADING_CONFIGS[target].get(COST_MODEL))
+        indicators.append(evaluator.run_values({
+            DATES: dates,
+            PNLS: dict(zip(instruments, pnl.T)),
+            COSTS: dict(zip(instruments, cost.T)),
+            POSITIONS_NP: positions[:, replica],
+            POSITIONS_RAW: [
+                Portfolio(row, target) for row in positions[:, replica]]
+                           if needs_raw else None}))
+    return indicators
+
+def run_batch(data_all, alpha_settings_path, seeds):
+    """
+    Return indicators of replicas of the given seeds, run in one pass.
+    """
+    settings = load_settings(alpha_settings_path)
+    if not hasattr(settings.alpha, 'generate_batch'):
+        raise TypeError(
+            '%s does not support batch generation.' % alpha_settings_path)
+    dates, positions = simulate_batch(settings, data_all, seeds)
+    return evaluate_batch(data_all, settings.target, dates, positions)
+
+def summarize(indicators):
+    """
+    Return the distribution of each indicator over replicas, as a dict of
+    indicators to statistics. Indicators with dict results, e.g. turnover,
+    are summarized per key.
+    """
+    if not indicators:
+        return {}
+    summary = {}
+    for name, value in indicators[0].items():
+        if isinstance(value, dict):
+            summary[name] = summarize([
+                replica[name] for replica in indicators])
+            continue
+        values = np.array(
+            [replica[name] for replica in indicators], dtype=float)
+        summary[name] = {
+            'mean': float(np.nanmean(values)),
+            'std': float(np.nanstd(values)),
+            'quantiles': {
+                str(quantile): float(np.nanquantile(values, quantile))
+                for quantile in QUANTILES}}
+    return summary
+
+def main():
+    """
+    Run replicas of an alpha and report the distribution of indicators.
+    """
+    args = build_parser()
+    seeds = (
+        args.seeds if args.seeds is not None
+        else list(range(args.seed, args.seed + args.replicas)))
+    data_all = initialize()
+    if args.batch:
+        indicators = run_batch(data_all, args.alpha_settings_path, seeds)
+    else:
+        indicators = run_replicas(
+            data_all, args.alpha_settings_path, seeds, args.processes)
+    summary = summarize(indicators)
+    if args.output_path:
+        with open(args.output_path, 'w') as file:
+            json.dump({
+                'alpha_settings_path': args.alpha_settings_path,
+                'seeds': seeds,
+                'replicas': indicators,
+                'summary': summary}, file, indent=1, default=float)
+    print(json.dumps(summary, indent=1))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Unit tests for Monte Carlo simulation.
+"""
+
+import unittest
+import numpy as np
+from thousandaire.benchmark.draw_lots_formula import DrawLotsFormula
+from thousandaire.benchmark.synthetic_data import generate_raw_data
+from thousandaire.constants import TRADING_INSTRUMENTS
+from thousandaire.data_classes import Portfolio
+from thousandaire.evaluator import Evaluator
+from thousandaire.monte_carlo import QUANTILES, run_batch, run_replicas
+from thousandaire.monte_carlo import summarize
+from thousandaire.simulation import build_simulator, initialize
+from thousandaire.simulation import load_settings
+
+ALPHA = 'thousandaire.benchmark.draw_lots_settings'
+
+class FirstReplicaFormula(DrawLotsFormula):
+    """
+    Draw lots as replica 0 of the batch mode does, one day at a time.
+    """
+    def __init__(self, startdate, dataset, parameters):
+        DrawLotsFormula.__init__(self, startdate, dataset, parameters)
+        self.generator = np.random.default_rng(parameters['seed'])
+
+    def generate(self, date, dataset):
+        portfolio = Portfolio()
+        for instrument, values in self.generate_batch(
+                date, dataset, [self.generator]).items():
+            portfolio[instrument] = values[0]
+        return portfolio
+
+class TestMonteCarlo(unittest.TestCase):
+    """
+    Unit test object for replicas of a stochastic alpha.
+    """
+    @classmethod
+    def setUpClass(cls):
+        # Synthetic data covering the dates of the alpha settings.
+        cls.data_all = initialize(generate_raw_data(years=6))
+
+    def assert_close(self, results, expected):
+        """
+        Assert that indicators, possibly nested in dicts, are close.
+        """
+        self.assertEqual(set(results), set(expected))
+        for name, value in expected.items():
+            if isinstance(value, dict):
+                self.assert_close(results[name], value)
+            else:
+                np.testing.assert_allclose(results[name], value, atol=1e-9)
+
+    def test_pool_reproducible(self):
+        """
+        Replicas of the same seed should have the same indicators.
+        """
+        indicators = run_replicas(self.data_all, ALPHA, [3, 4, 3], 2)
+        self.assert_close(indicators[2], indicators[0])
+        self.assertNotEqual(indicators[0], indicators[1])
+
+    def test_batch_first_replica(self):
+        """
+        Replica 0 of the batch mode should match a usual simulation of the
+        same draws.
+        """
+        indicators = run_batch(self.data_all, ALPHA, [5, 6])
+        self.assertEqual(len(indicators), 2)
+        self.assert_close(
+            run_batch(self.data_all, ALPHA, [5])[0], indicators[0])
+        settings = load_settings(ALPHA)
+        settings.alpha = FirstReplicaFormula
+        settings.parameters = {'seed': 5}
+        results = build_simulator(settings, self.data_all).run()
+        self.assert_close(
+            indicators[0],
+            Evaluator().run(
+                TRADING_INSTRUMENTS[settings.target], results,
+                parallel=False))
+
+    def test_summarize(self):
+        """
+        Summaries should have the mean, std and quantiles of indicators,
+        also per key of dict indicators.
+        """
+        values = [4., 1., 3., 2., 5.]
+        summary = summarize([
+            {'returns': value, 'turnover': {'USD': value * 2}}
+            for value in values])
+        self.assertAlmostEqual(summary['returns']['mean'], 3.)
+        self.assertAlmostEqual(summary['returns']['std'], np.std(values))
+        self.assertEqual(
+            summary['returns']['quantiles'],
+            {str(quantile): float(np.quantile(values, quantile))
+             for quantile in QUANTILES})
+        self.assertAlmostEqual(
+            summary['turnover']['USD']['quantiles']['0.5'], 6.)
+        self.assertEqual(summarize([]), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,14 +3,20 @@ Pnl and cost calculators.
 """
 
 from collections import defaultdict
+import numpy as np
+from thousandaire.cost_models import SpreadCost
 
 class CurrencyPnl:
     """
     Calculator of pnl and cost of currency trading.
     """
-    def __init__(self, base_ins, instruments):
+    def __init__(self, base_ins, instruments, cost_model=None):
+        """
+        cost_model: see cost_models; SpreadCost if None.
+        """
         self.base_ins = base_ins
         self.instruments = instruments
+        self.cost_model = SpreadCost() if cost_model is None else cost_model
         self.last_quantity = defaultdict(float)
         self.last_price = defaultdict(float)
 
@@ -29,22 +35,80 @@ class CurrencyPnl:
         Thus, performance of alphas is more readable because it stands for
         ratio as well.
         Please check wiki page for more details.
+
+        The price dataset should have fields in derived_fields.CURRENCY_PRICE.
         """
         pnl = {instrument: 0. for instrument in self.instruments}
         cost = {instrument: 0. for instrument in self.instruments}
+        traded = []
+        differences = []
+        middle_prices = []
+        spreads = []
         for instrument in self.instruments:
-            if (price[instrument][-1].buy is not None and
-                    price[instrument][-1].sell is not None):
+            today_price = price[instrument][-1]
+            if today_price.valid:
                 position = today.get(instrument, 0)
-                spread = ((price[instrument][-1].sell -
-                           price[instrument][-1].buy) / 2)
-                middle_price = price[instrument][-1].buy + spread
+                middle_price = today_price.mid
                 quantity = position / middle_price
-                difference = (
-                    self.last_quantity[instrument] - quantity)
                 pnl[instrument] = ((middle_price - self.last_price[instrument])
                                    * self.last_quantity[instrument])
-                cost[instrument] = abs(difference * spread)
+                traded.append(instrument)
+                differences.append(self.last_quantity[instrument] - quantity)
+                middle_prices.append(middle_price)
+                spreads.append(today_price.half_spread)
                 self.last_quantity[instrument] = quantity
                 self.last_price[instrument] = middle_price
+        if traded:
+            costs = self.cost_model(
+                np.array(differences), np.array(middle_prices),
+                np.array(spreads))
+            cost.update(zip(traded, costs.tolist()))
         return pnl, cost
+
+    @staticmethod
+    def calculate_matrix(positions, middle_prices, half_spreads,
+                         cost_model=None):
+        """
+        Vectorized version of calculate over a whole period.
+
+        All inputs are 2D np.arrays of shape (days, instruments), where
+        prices are those seen by calculate on each day, and missing prices
+        are NaN. On days without prices, pnl and cost are 0 and the quantity
+        held is carried over, as in calculate.
+        cost_model: see cost_models; SpreadCost if None.
+
+        Return pnl and cost in 2D np.arrays of the same shape.
+        """
+        cost_model = SpreadCost() if cost_model is None else cost_model
+        valid = ~np.isnan(middle_prices)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            quantities = positions / middle_prices
+        last_quantities = shift_down(forward_fill(quantities, valid))
+        last_prices = shift_down(forward_fill(middle_prices, valid))
+        pnl = np.where(
+            valid, (middle_prices - last_prices) * last_quantities, 0.)
+        with np.errstate(invalid='ignore'):
+            cost = np.where(
+                valid,
+                cost_model(
+                    last_quantities - quantities, middle_prices, half_spreads),
+                0.)
+        return pnl, cost
+
+def forward_fill(values, valid):
+    """
+    Replace invalid values in a 2D np.array by the last valid value above
+    them (in the same column), or 0 if there is none.
+    """
+    rows = np.where(valid, np.arange(len(values))[:, None], -1)
+    rows = np.maximum.accumulate(rows, axis=0)
+    filled = np.take_along_axis(values, np.maximum(rows, 0), axis=0)
+    return np.where(rows >= 0, filled, 0.)
+
+def shift_down(values):
+    """
+    Shift a 2D np.array down by one row, filling the first row with 0.
+    """
+    shifted = np.zeros_like(values)
+    shifted[1:] = values[:-1]
+    return shifted
@@ -0,0 +1,74 @@
+"""
+Unit tests for pnl calculators.
+"""
+
+import collections
+import unittest
+import numpy as np
+from thousandaire.cost_models import COST_MODELS, ImpactCost, SpreadFeeCost
+from thousandaire.pnl_calculation import CurrencyPnl
+
+Price = collections.namedtuple('Price', ['valid', 'mid', 'half_spread'])
+
+class TestCurrencyPnl(unittest.TestCase):
+    """
+    Unit test object for CurrencyPnl.
+    """
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.instruments = ('USD', 'JPY', 'TWD')
+        self.positions = rng.uniform(-1, 1, (30, 3))
+        self.middle_prices = rng.uniform(1, 2, (30, 3))
+        self.middle_prices[rng.uniform(size=(30, 3)) < 0.2] = np.nan
+        self.half_spreads = self.middle_prices * 0.001
+
+    def test_calculate_matrix(self):
+        """
+        calculate_matrix should match calculate called day by day, under
+        every cost model.
+        """
+        for cost_model in COST_MODELS.values():
+            self.check_calculate_matrix(cost_model)
+
+    def check_calculate_matrix(self, cost_model):
+        """
+        Compare calculate_matrix with calculate under the cost model.
+        """
+        pnl_function = CurrencyPnl('TWD', self.instruments, cost_model)
+        expected_pnl = []
+        expected_cost = []
+        for day, positions in enumerate(self.positions):
+            price = {
+                instrument: [Price(
+                    not np.isnan(self.middle_prices[day, column]),
+                    self.middle_prices[day, column],
+                    self.half_spreads[day, column])]
+                for column, instrument in enumerate(self.instruments)}
+            pnl, cost = pnl_function.calculate(
+                dict(zip(self.instruments, positions)), price)
+            expected_pnl.append([pnl[x] for x in self.instruments])
+            expected_cost.append([cost[x] for x in self.instruments])
+        pnl, cost = CurrencyPnl.calculate_matrix(
+            self.positions, self.middle_prices, self.half_spreads, cost_model)
+        np.testing.assert_allclose(pnl, expected_pnl)
+        np.testing.assert_allclose(cost, expected_cost)
+
+    def test_cost_models(self):
+        """
+        Cost models should add their fees and impact to the half spread.
+        """
+        changes = np.array([[0.5, -0.25], [0., 1.]])
+        prices = np.array([[2., 4.], [2., 4.]])
+        half_spreads = np.array([[0.01, 0.02], [0.01, 0.02]])
+        spread = np.abs(changes) * half_spreads
+        np.testing.assert_allclose(
+            COST_MODELS['spread'](changes, prices, half_spreads), spread)
+        np.testing.assert_allclose(
+            SpreadFeeCost(0.001)(changes, prices, half_spreads),
+            spread + 0.001 * np.abs(changes) * prices)
+        np.testing.assert_allclose(
+            ImpactCost(0.1, 2.)(changes, prices, half_spreads),
+            spread + 0.1 * (np.abs(changes) * prices) ** 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,372 @@
+"""
+Generate portfolios of the next trading day for the whole alpha pool.
+
+Alphas are registered into the pool once, which warms them up over all
+history and checkpoints their formula. Every production run then loads only
+the newest data (from the oldest checkpoint minus the lookback of alphas
+on), restores each checkpoint, feeds the alpha only workdays newer than it,
+lets it generate the portfolio of the next real trading day (when
+DataController.get_today returns None), and checkpoints it again. Alphas
+run as jobs of a Scheduler, in worker processes forked from the loaded
+data, and an alpha exceeding its time budget is terminated and reported
+without delaying the others. Portfolios of all alphas and their
+combination per target are written into one output file.
+
+Register:
+    python -m thousandaire.production register \
+        -p thousandaire.benchmark.kdr_5_settings
+Run:
+    python -m thousandaire.production run --workers 8 --time_budget 30
+"""
+
+import argparse
+import bisect
+import datetime
+import json
+import multiprocessing
+import os
+import pickle
+import time
+import uuid
+from thousandaire.constants import DATA_LIST_ALL, PRODUCTION_DIR
+from thousandaire.data_loader import DataLoader
+from thousandaire.scheduler import ERROR, OK, TIMEOUT, Scheduler
+from thousandaire.simulation import initialize, load_settings
+from thousandaire.version_store import VersionStore, write_atomically
+
+POOL_FILE = 'pool.json'
+STATES_DIR = 'states'
+PORTFOLIOS_DIR = 'portfolios'
+DEFAULT_TIME_BUDGET = 60
+
+def build_parser():
+    """
+    Get the production command and its options.
+    """
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    register_parser = subparsers.add_parser(
+        'register', help='Add alphas into the pool and warm them up.')
+    register_parser.add_argument(
+        '-p', '--alpha_settings_paths',
+        help='Paths of alpha settings files, separated by spaces.',
+        nargs='*')
+    register_parser.add_argument(
+        '--time_budget',
+        help='Seconds allowed for the alpha in each run (default: the '
+             'budget of the run).',
+        type=float, default=None)
+    unregister_parser = subparsers.add_parser(
+        'unregister', help='Remove alphas from the pool.')
+    unregister_parser.add_argument(
+        'submission_ids', help='Submission ids of alphas.', nargs='*')
+    run_parser = subparsers.add_parser(
+        'run', help='Generate portfolios of the next trading day.')
+    run_parser.add_argument(
+        '-w', '--workers', help='Number of worker processes.',
+        type=int, default=os.cpu_count())
+    run_parser.add_argument(
+        '--time_budget',
+        help='Seconds allowed for alphas without their own budget.',
+        type=float, default=DEFAULT_TIME_BUDGET)
+    run_parser.add_argument(
+        '-d', '--date', help='The trading date (YYYY-MM-DD), today if unset.',
+        type=datetime.date.fromisoformat, default=datetime.date.today())
+    run_parser.add_argument(
+        '-o', '--output_path', help='File to write portfolios into.',
+        action='store', default=None)
+    for sub in (register_parser, unregister_parser, run_parser):
+        sub.add_argument(
+            '--production_path', help='Directory of the pool and states.',
+            default=PRODUCTION_DIR)
+    return parser.parse_args()
+
+def load_pool(production_path=PRODUCTION_DIR):
+    """
+    Return the pool, a dict of submission ids to their registration.
+    """
+    path = os.path.join(production_path, POOL_FILE)
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+def save_pool(pool, production_path=PRODUCTION_DIR):
+    """
+    Write the pool.
+    """
+    write_atomically(
+        os.path.join(production_path, POOL_FILE),
+        json.dumps(pool, indent=1), 'w')
+
+def state_path(submission_id, production_path=PRODUCTION_DIR):
+    """
+    Return the path of the checkpoint of an alpha.
+    Raise ValueError if the submission id is not a plain file name, which
+    could point outside the states directory.
+    """
+    if (submission_id in ('', os.curdir, os.pardir)
+            or os.path.basename(submission_id) != submission_id
+            or (os.altsep and os.altsep in submission_id)
+            or '\0' in submission_id):
+        raise ValueError('Invalid submission id: %r' % submission_id)
+    return os.path.join(production_path, STATES_DIR, submission_id)
+
+def get_first_date(pool, workdays_dataset):
+    """
+    Return the first date of data needed to catch up all alphas of the
+    pool: `lookback` workdays (plus one, for derived fields) before the
+    oldest checkpoint. Return None if all history is needed, i.e. if an
+    alpha has no checkpoint date or no lookback.
+    """
+    last_dates = [entry.get('last_date') for entry in pool.values()]
+    lookbacks = [entry.get('lookback') for entry in pool.values()]
+    if not pool or None in last_dates or None in lookbacks:
+        return None
+    since = min(map(datetime.datetime.fromisoformat, last_dates))
+    first_dates = []
+    for workdays in workdays_dataset.values():
+        dates = [today.date for today in workdays]
+        index = bisect.bisect_left(dates, since)
+        if dates:
+            first_dates.append(dates[max(0, index - max(lookbacks) - 1)])
+    return min(first_dates, default=None)
+
+def load_recent(pool, store=None):
+    """
+    Return bound data holding only the rows needed to catch up alphas of
+    the pool (see get_first_date). Workdays and datasets without versions
+    are loaded whole.
+
+    store: the VersionStore to load from, the default one if None.
+    """
+    store = VersionStore() if store is None else store
+    loader = DataLoader(['workdays'], store=store)
+    first_date = get_first_date(pool, loader.get_all()['workdays'])
+    if first_date is None:
+        loader = DataLoader(DATA_LIST_ALL, store=store)
+    raw_data = loader.get_all()
+    versions = loader.get_versions()
+    for name in DATA_LIST_ALL:
+        if name in raw_data:
+            continue
+        versions[name] = store.resolve(name)
+        raw_data[name] = (
+            store.load(name, versions[name], since=first_date)
+            if versions[name] is not None
+            else DataLoader([name], store=store).get_all()[name])
+    data_all = initialize(raw_data)
+    data_all['versions'] = versions
+    return data_all
+
+def catch_up(settings, data_all, formula=None):
+    """
+    Feed the alpha formula every workday it has not seen, in date order.
+
+    formula: a restored alpha formula, or None to create one from settings.
+    Return the formula and bound data, with the cursor after the last
+    workday, i.e. ready to generate the portfolio of the next trading day.
+    """
+    _, region = settings.target
+    workdays = data_all['workdays'][region]
+    others = {
+        name: data_all[region][name]
+        for name in settings.data_list if name in data_all[region]}
+    # Workers are forked, so the bound data are already a private copy.
+    key = uuid.uuid4()
+    workdays.set_key(key)
+    for dataset in others.values():
+        dataset.set_key(key)
+    if formula is None:
+        formula = settings.alpha(
+            settings.start_date, others, settings.parameters)
+    start_date = formula.get_last_success_date() or settings.start_date
+    if start_date <= workdays[-1].date:
+        workdays.set_date(start_date, auth_key=key)
+        for dataset in others.values():
+            dataset.set_date(start_date, key)
+        if formula.get_last_success_date() is not None:
+            for dataset in others.values():
+                dataset.move_forward(key)
+            workdays.move_forward(auth_key=key)
+    while workdays.get_today() is not None:
+        formula(workdays.get_today(), others)
+        for dataset in others.values():
+            dataset.move_forward(key)
+        workdays.move_forward(auth_key=key)
+    return formula, others
+
+def generate_portfolio(data_all, job):
+    """
+    Restore the alpha, catch it up, checkpoint it and generate its portfolio
+    of the given date.
+
+    job: (submission id, registration, date of the portfolio, production
+        path).
+    The checkpoint is taken before generating, so that running again on the
+    same data generates the same portfolio. Return a report of the
+    portfolio, with the last date of the checkpoint.
+    """
+    submission_id, registration, date, production_path = job
+    settings = load_settings(registration['alpha_settings_path'])
+    with open(state_path(submission_id, production_path), 'rb') as file:
+        formula = pickle.load(file)
+    formula, others = catch_up(settings, data_all, formula)
+    state = pickle.dumps(formula)
+    last_date = formula.get_last_success_date()
+    portfolio = formula(date, others)
+    portfolio.bind(settings.target)
+    portfolio.normalize()
+    write_atomically(state_path(submission_id, production_path), state)
+    return {
+        'status': OK,
+        'target': '/'.join(settings.target),
+        'last_date': last_date and last_date.isoformat(),
+        'positions': {
+            instrument: float(portfolio[instrument])
+            for instrument in portfolio}}
+
+def generate(data_all, job):
+    """
+    Run generate_portfolio as a job of Scheduler, and add the seconds it
+    took into the report.
+    """
+    started = time.time()
+    report = generate_portfolio(data_all, job)
+    report['seconds'] = time.time() - started
+    return report
+
+def run_pool(data_all, pool, date, args):
+    """
+    Generate portfolios of all alphas in the pool by a Scheduler, at most
+    `workers` at a time. An alpha running longer than its time budget (in
+    wall time) is terminated together with its descendants, and reported as
+    a timeout.
+
+    args: options of the run, i.e. `workers`, `time_budget` (seconds for
+        alphas registered without their own budget) and `production_path`.
+    Return a dict of submission ids to reports, which are the results of
+    generate, or results of Scheduler for alphas which failed.
+    """
+    jobs = {}
+    for submission_id, registration in pool.items():
+        budget = registration.get('time_budget')
+        jobs[submission_id] = (
+            (data_all,
+             (submission_id, registration, date, args.production_path)),
+            None, args.time_budget if budget is None else budget)
+    outcomes = Scheduler(args.workers).run(generate, jobs)
+    return {
+        submission_id: (
+            outcome['result'] if outcome['status'] == OK else outcome)
+        for submission_id, outcome in outcomes.items()}
+
+def combine_portfolios(pool, reports):
+    """
+    Return the combined positions of each target, the weighted average of
+    positions of alphas which succeeded.
+    """
+    combined = {}
+    total_weights = {}
+    for submission_id, report in reports.items():
+        if report['status'] != OK:
+            continue
+        weight = pool[submission_id].get('weight', 1.)
+        positions = combined.setdefault(report['target'], {})
+        for instrument, position in report['positions'].items():
+            positions[instrument] = (
+                positions.get(instrument, 0.) + weight * position)
+        total_weights[report['target']] = (
+            total_weights.get(report['target'], 0.) + weight)
+    return {
+        target: {
+            instrument: position / total_weights[target]
+            for instrument, position in positions.items()}
+        for target, positions in combined.items()}
+
+def warm_up(settings, data_all, path):
+    """
+    Feed a new alpha formula all history and checkpoint it into path.
+    """
+    formula, _ = catch_up(settings, data_all)
+    write_atomically(path, pickle.dumps(formula))
+
+def get_checkpoint_date(path):
+    """
+    Return the last date (in ISO format) fed to the checkpointed formula.
+    """
+    with open(path, 'rb') as file:
+        last_date = pickle.load(file).get_last_success_date()
+    return last_date and last_date.isoformat()
+
+def register(alpha_settings_paths, data_all, time_budget=None,
+             production_path=PRODUCTION_DIR):
+    """
+    Add alphas into the pool after warming them up over all history.
+    Alphas without submission_id are registered by their settings path.
+
+    time_budget: seconds allowed for the alphas in each run, or None for
+        the budget of the run.
+    """
+    pool = load_pool(production_path)
+    for path in alpha_settings_paths:
+        settings = load_settings(path)
+        submission_id = settings.submission_id or path
+        # Warm up in a child, keeping data of the parent untouched.
+        process = multiprocessing.get_context('fork').Process(
+            target=warm_up,
+            args=(settings, data_all,
+                  state_path(submission_id, production_path)))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            raise RuntimeError('Failed to warm up %s.' % path)
+        pool[submission_id] = {
+            'alpha_settings_path': path,
+            'submission_date': (
+                settings.submission_date or datetime.date.today()).isoformat(),
+            'time_budget': time_budget,
+            'lookback': settings.lookback,
+            'last_date': get_checkpoint_date(
+                state_path(submission_id, production_path))}
+    save_pool(pool, production_path)
+
+def main():
+    """
+    Register alphas, unregister alphas, or run the pool.
+    """
+    args = build_parser()
+    if args.command == 'unregister':
+        pool = load_pool(args.production_path)
+        for submission_id in args.submission_ids:
+            del pool[submission_id]
+        save_pool(pool, args.production_path)
+        return
+    if args.command == 'register':
+        register(args.alpha_settings_paths, initialize(), args.time_budget,
+                 args.production_path)
+        return
+    pool = load_pool(args.production_path)
+    data_all = load_recent(pool)
+    reports = run_pool(
+        data_all, pool,
+        datetime.datetime.combine(args.date, datetime.time()), args)
+    for submission_id, report in reports.items():
+        if report['status'] == OK:
+            pool[submission_id]['last_date'] = report['last_date']
+    save_pool(pool, args.production_path)
+    output = {
+        'date': args.date.isoformat(),
+        'data_versions': data_all['versions'],
+        'alphas': reports,
+        'combined': combine_portfolios(pool, reports)}
+    write_atomically(
+        args.output_path or os.path.join(
+            args.production_path, PORTFOLIOS_DIR, args.date.isoformat()),
+        json.dumps(output, indent=1), 'w')
+    print(json.dumps({
+        status: sum(report['status'] == status for report in reports.values())
+        for status in (OK, ERROR, TIMEOUT)}))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Unit tests for the production runner.
+"""
+
+import argparse
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from thousandaire.benchmark.synthetic_data import generate_raw_data
+from thousandaire.data_classes import Data, Dataset
+from thousandaire.production import DEFAULT_TIME_BUDGET, load_pool
+from thousandaire.production import load_recent, register, run_pool
+from thousandaire.production import state_path
+from thousandaire.simulation import initialize
+from thousandaire.version_store import VersionStore
+
+ALPHA = 'thousandaire.benchmark.kdr_5_settings'
+
+def truncate(raw_data, end_date):
+    """
+    Return a copy of raw data without rows after end_date.
+    """
+    truncated = {}
+    for name, dataset in raw_data.items():
+        instruments = {}
+        for instrument, data in dataset.items():
+            instruments[instrument] = Data(data.name, data.get_fields())
+            instruments[instrument].extend(
+                tuple(row) for row in data if row.date <= end_date)
+        truncated[name] = Dataset(name, instruments)
+    return truncated
+
+class TestProduction(unittest.TestCase):
+    """
+    Unit test object for the production runner.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = VersionStore(os.path.join(self.path, 'versions'))
+        raw_data = generate_raw_data(instruments=6, years=6)
+        for dataset in raw_data.values():
+            self.store.commit(dataset)
+        self.data_all = initialize(raw_data)
+        # Alphas are registered before the last months of data.
+        self.production_path = os.path.join(self.path, 'production')
+        register(
+            [ALPHA], initialize(truncate(raw_data, datetime.datetime(
+                2020, 6, 30))), production_path=self.production_path)
+        shutil.copytree(self.production_path, self.production_path + '2')
+        self.args = argparse.Namespace(
+            workers=1, time_budget=DEFAULT_TIME_BUDGET,
+            production_path=self.production_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_registration(self):
+        """
+        Registered alphas should take the budget of the run by default,
+        and keep the last date of their checkpoint.
+        """
+        registration = load_pool(self.production_path)[ALPHA]
+        self.assertIsNone(registration['time_budget'])
+        self.assertEqual(registration['lookback'], 5)
+        self.assertEqual(registration['last_date'][:10], '2020-06-30')
+
+    def test_recent_data(self):
+        """
+        Portfolios from only the newest data should match those from all
+        history.
+        """
+        pool = load_pool(self.production_path)
+        recent = load_recent(pool, self.store)
+        # Half a year to catch up, out of six years of data.
+        self.assertLess(len(recent['TW']['currency_price_tw']['USD']), 150)
+        date = datetime.datetime(2021, 1, 4)
+        reports = run_pool(recent, pool, date, self.args)
+        self.args.production_path += '2'
+        expected = run_pool(self.data_all, pool, date, self.args)
+        self.assertEqual(reports[ALPHA]['status'], 'ok')
+        self.assertEqual(
+            reports[ALPHA]['positions'], expected[ALPHA]['positions'])
+        self.assertEqual(
+            reports[ALPHA]['last_date'], expected[ALPHA]['last_date'])
+
+    def test_submission_id(self):
+        """
+        Submission ids should not point outside the states directory.
+        """
+        for submission_id in ('../pool.json', '..', '', 'a/b'):
+            with self.assertRaises(ValueError):
+                state_path(submission_id, self.production_path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Opt-in instrumentation that records where the time of a simulation goes.
+"""
+
+import contextlib
+import time
+
+class Profiler:
+    """
+    Record wall time and call counts of named phases.
+
+    sample_interval: if positive, also keep a per-day breakdown of phases
+        for every `sample_interval`-th simulated day.
+    """
+    def __init__(self, sample_interval=0):
+        self.sample_interval = sample_interval
+        self.phases = {}
+        self.samples = []
+        self.__day_count = 0
+        self.__today = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Context manager which times the enclosed block as phase `name`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds, calls=1):
+        """
+        Add `seconds` of wall time and `calls` calls to phase `name`.
+        """
+        total = self.phases.setdefault(name, [0., 0])
+        total[0] += seconds
+        total[1] += calls
+        if self.__today is not None:
+            self.__today[name] = self.__today.get(name, 0.) + seconds
+
+    def start_day(self, date):
+        """
+        Mark the beginning of a simulated day.
+        Phases recorded until the next call will be sampled if needed.
+        """
+        self.__today = None
+        if (self.sample_interval > 0
+                and self.__day_count % self.sample_interval == 0):
+            self.__today = {'date': date}
+            self.samples.append(self.__today)
+        self.__day_count += 1
+
+    def end_day(self):
+        """
+        Mark the end of a simulated day.
+        """
+        self.__today = None
+
+    def merge(self, results, prefix=''):
+        """
+        Merge phases in the results of another profiler into this one.
+        """
+        for name, phase in results['phases'].items():
+            self.record(prefix + name, phase['seconds'], phase['calls'])
+
+    def get_results(self):
+        """
+        Return recorded phases (and samples, if any) in a picklable dict.
+        """
+        results = {
+            'phases': {
+                name: {'seconds': seconds, 'calls': calls}
+                for name, (seconds, calls) in self.phases.items()}}
+        if self.sample_interval > 0:
+            results['samples'] = self.samples
+        return results
+
+class NullProfiler:
+    """
+    Profiler which records nothing, used when profiling is disabled.
+    """
+    @staticmethod
+    def phase(_name):
+        """
+        Return a context manager doing nothing.
+        """
+        return contextlib.nullcontext()
+
+    def record(self, name, seconds, calls=1):
+        """
+        Do nothing.
+        """
+
+    def start_day(self, date):
+        """
+        Do nothing.
+        """
+
+    def end_day(self):
+        """
+        Do nothing.
+        """
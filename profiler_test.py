@@ -0,0 +1,74 @@
+"""
+Unit tests for Profiler.
+"""
+
+import datetime
+import unittest
+from unittest import mock
+from thousandaire.profiler import Profiler
+
+class TestProfiler(unittest.TestCase):
+    """
+    Unit test object for Profiler.
+    """
+    def test_phases(self):
+        """
+        Phases should add up their wall time and calls.
+        """
+        profiler = Profiler()
+        with mock.patch('time.perf_counter', side_effect=[1., 3., 10., 10.5]):
+            with profiler.phase('generate'):
+                pass
+            with profiler.phase('generate'):
+                pass
+        profiler.record('normalize', 0.25, calls=4)
+        self.assertEqual(profiler.get_results(), {
+            'phases': {
+                'generate': {'seconds': 2.5, 'calls': 2},
+                'normalize': {'seconds': 0.25, 'calls': 4}}})
+
+    def test_failing_phase(self):
+        """
+        A phase should be recorded even if its block raises.
+        """
+        profiler = Profiler()
+        with self.assertRaises(ValueError):
+            with profiler.phase('generate'):
+                raise ValueError
+        self.assertEqual(
+            profiler.get_results()['phases']['generate']['calls'], 1)
+
+    def test_samples(self):
+        """
+        Every sample_interval-th day should keep its own breakdown.
+        """
+        profiler = Profiler(sample_interval=2)
+        dates = [datetime.date(2020, 1, day) for day in range(1, 6)]
+        for date in dates:
+            profiler.start_day(date)
+            profiler.record('generate', 1.)
+            profiler.end_day()
+            profiler.record('dump', 1.)
+        results = profiler.get_results()
+        self.assertEqual(results['samples'], [
+            {'date': dates[0], 'generate': 1.},
+            {'date': dates[2], 'generate': 1.},
+            {'date': dates[4], 'generate': 1.}])
+        self.assertEqual(results['phases']['generate']['calls'], 5)
+        self.assertEqual(results['phases']['dump']['seconds'], 5.)
+
+    def test_merge(self):
+        """
+        Phases of another profiler should be merged under a prefix.
+        """
+        other = Profiler()
+        other.record('encode', 2., calls=3)
+        profiler = Profiler()
+        profiler.record('evaluator:encode', 1.)
+        profiler.merge(other.get_results(), 'evaluator:')
+        self.assertEqual(
+            profiler.get_results()['phases']['evaluator:encode'],
+            {'seconds': 3., 'calls': 4})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+"""
+On-disk cache of HTTP responses shared by crawlers.
+"""
+
+import hashlib
+import os
+import pickle
+import time
+import requests
+from thousandaire.constants import CRAWLER_CACHE_DIR, CRAWLER_CACHE_MAX_SIZE
+from thousandaire.constants import CRAWLER_CACHE_TTL, CRAWLER_TIMEOUT
+
+CACHE_FILE_SUFFIX = '.response'
+# Fraction of max_size left after eviction, so that it is not run again
+# on each of the next saves.
+EVICTION_RATIO = 0.9
+
+class ResponseCache:
+    """
+    Cache responses on disk, keyed by URL.
+
+    A cached response younger than `ttl` seconds is returned without touching
+    the network. An expired response is revalidated with a conditional
+    request (If-None-Match / If-Modified-Since) when the server has given us
+    an ETag or a Last-Modified header, so an unchanged page costs only a 304.
+    If revalidation fails with a server error (5xx) or a connection error,
+    the stale response is served instead.
+    The total size of cached responses is kept under `max_size` bytes by
+    evicting the least recently used entries. The size is tracked as entries
+    are saved, so the cache directory is only listed when it has to be
+    evicted, which then goes down to `EVICTION_RATIO` of max_size.
+    """
+    def __init__(self, cache_dir=CRAWLER_CACHE_DIR, ttl=CRAWLER_CACHE_TTL,
+                 max_size=CRAWLER_CACHE_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size = max_size
+        # Total size of cached responses, unknown until the first save.
+        self.size = None
+
+    def get(self, url):
+        """
+        Return the content (in bytes) of the given url.
+        """
+        entry = self.load(url)
+        now = time.time()
+        if entry is not None and now - entry['fetched'] < self.ttl:
+            self.touch(url)
+            return entry['content']
+        headers = {}
+        if entry is not None:
+            if entry['etag'] is not None:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified'] is not None:
+                headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            response = requests.get(
+                url, headers=headers, timeout=CRAWLER_TIMEOUT)
+        except requests.RequestException:
+            if entry is None:
+                raise
+            return entry['content']
+        if entry is not None and response.status_code >= 500:
+            return entry['content']
+        if response.status_code == 304 and entry is not None:
+            entry['fetched'] = now
+            self.save(url, entry)
+            return entry['content']
+        if response.status_code == 200:
+            self.save(url, {
+                'url': url,
+                'content': response.content,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched': now})
+        return response.content
+
+    def path(self, url):
+        """
+        Return the path of the cache file of the given url.
+        """
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest + CACHE_FILE_SUFFIX)
+
+    def load(self, url):
+        """
+        Return the cached entry of the given url, or None if there is none.
+        """
+        try:
+            with open(self.path(url), 'rb') as file:
+                entry = pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        # Guard against hash collisions.
+        return entry if entry['url'] == url else None
+
+    def save(self, url, entry):
+        """
+        Atomically write the entry of the given url, then evict old entries.
+        """
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        if self.size is None:
+            self.size = self.get_size()
+        path = self.path(url)
+        try:
+            self.size -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        with open(path + '.tmp', 'wb') as file:
+            pickle.dump(entry, file)
+        os.replace(path + '.tmp', path)
+        self.size += os.path.getsize(path)
+        if self.size > self.max_size:
+            self.evict()
+
+    def touch(self, url):
+        """
+        Mark the entry of the given url as recently used.
+        """
+        try:
+            os.utime(self.path(url))
+        except FileNotFoundError:
+            pass
+
+    def list_entries(self):
+        """
+        Return (mtime, size, file name) of all cached entries.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(CACHE_FILE_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def get_size(self):
+        """
+        Return the total size of cached entries in bytes.
+        """
+        return sum(size for _, size, _ in self.list_entries())
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in
+        EVICTION_RATIO of max_size.
+        """
+        entries = self.list_entries()
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if self.size <= self.max_size * EVICTION_RATIO:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            self.size -= size
+
+    def clear(self):
+        """
+        Remove all cached entries.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(CACHE_FILE_SUFFIX):
+                os.remove(os.path.join(self.cache_dir, name))
+        self.size = 0
@@ -0,0 +1,108 @@
+"""
+Unit tests for ResponseCache.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+import requests
+from thousandaire.response_cache import ResponseCache
+
+def make_response(status_code, content=b'', headers=None):
+    """
+    Build a fake requests.Response.
+    """
+    response = mock.Mock()
+    response.status_code = status_code
+    response.content = content
+    response.headers = headers or {}
+    return response
+
+class TestResponseCache(unittest.TestCase):
+    """
+    Unit test object for ResponseCache.
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.temp_dir.name, ttl=60, max_size=1024)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_fresh_hit(self):
+        """
+        Fresh entries should be served without any request.
+        """
+        with mock.patch('requests.get') as get:
+            get.return_value = make_response(200, b'page')
+            self.assertEqual(self.cache.get('http://a'), b'page')
+            self.assertEqual(self.cache.get('http://a'), b'page')
+            self.assertEqual(get.call_count, 1)
+
+    def test_conditional_request(self):
+        """
+        Expired entries should be revalidated with their ETag.
+        """
+        self.cache.ttl = 0
+        with mock.patch('requests.get') as get:
+            get.return_value = make_response(200, b'page', {'ETag': '"v1"'})
+            self.cache.get('http://a')
+            get.return_value = make_response(304)
+            self.assertEqual(self.cache.get('http://a'), b'page')
+            self.assertEqual(
+                get.call_args[1]['headers'], {'If-None-Match': '"v1"'})
+
+    def test_errors_not_cached(self):
+        """
+        Non-200 responses should not be cached.
+        """
+        with mock.patch('requests.get') as get:
+            get.return_value = make_response(500, b'error')
+            self.cache.get('http://a')
+            self.assertIsNone(self.cache.load('http://a'))
+
+    def test_stale_on_server_error(self):
+        """
+        Expired entries should be served when revalidation fails.
+        """
+        self.cache.ttl = 0
+        with mock.patch('requests.get') as get:
+            get.return_value = make_response(200, b'page', {'ETag': '"v1"'})
+            self.cache.get('http://a')
+            get.return_value = make_response(503, b'error')
+            self.assertEqual(self.cache.get('http://a'), b'page')
+            get.side_effect = requests.ConnectionError
+            self.assertEqual(self.cache.get('http://a'), b'page')
+            with self.assertRaises(requests.ConnectionError):
+                self.cache.get('http://b')
+
+    def test_eviction(self):
+        """
+        Least recently used entries should be evicted first.
+        """
+        with mock.patch('requests.get') as get:
+            get.return_value = make_response(200, b'x' * 400)
+            self.cache.get('http://a')
+            os.utime(self.cache.path('http://a'), (0, 0))
+            self.cache.get('http://b')
+            self.cache.get('http://c')
+        self.assertIsNone(self.cache.load('http://a'))
+        self.assertIsNotNone(self.cache.load('http://c'))
+
+    def test_size_tracking(self):
+        """
+        The cache directory should only be listed when it has to be evicted.
+        """
+        with mock.patch('requests.get') as get:
+            get.return_value = make_response(200, b'x' * 100)
+            self.cache.get('http://a')
+            with mock.patch('os.listdir') as listdir:
+                self.cache.ttl = 0
+                self.cache.get('http://a')
+                self.cache.get('http://b')
+                listdir.assert_not_called()
+        self.assertEqual(self.cache.size, self.cache.get_size())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,367 @@
+"""
+Persistent store of daily pnl series of the alpha pool.
+
+All series live in one matrix (alphas x dates) saved as a .npy file, which
+is opened memory-mapped, so that queries against the whole pool read it
+in blocks without unpickling anything. Missing days are NaN. An index maps
+rows to submission id, author, submission date, dates covered and target.
+Alphas whose simulation failed are kept in the index too, with the status
+and error of the simulation (see scheduler) and an all-NaN row.
+Daily positions of every alpha are kept in a memory-mapped .npy file of its
+own (days x instruments of its target), which combiner reads.
+
+Example:
+    store = ResultStore()
+    store.add('alpha-42', results, author='Black')
+    submission_id, correlation = store.max_correlation(dates, pnl)
+"""
+
+import datetime
+import os
+import pickle
+import numpy as np
+from thousandaire.constants import RESULT_STORE_DIR
+from thousandaire.scheduler import OK
+
+INDEX_FILE = 'index.pkl'
+PNLS_FILE = 'pnls.npy'
+POSITIONS_FILE = 'positions-%d.npy'
+MIN_ROWS = 64
+MIN_DAYS = 1024
+# Correlations with less common days than this are NaN.
+MIN_OVERLAP = 20
+# Number of stored series read from the matrix at once.
+BLOCK_SIZE = 1024
+
+def to_ordinals(dates):
+    """
+    Convert a list of dates into an np.array of day ordinals.
+    """
+    return np.array([date.toordinal() for date in dates], dtype=np.int64)
+
+class ResultStore:
+    """
+    Indexed store of daily pnl series keyed by submission id.
+
+    Column i of the matrix is the day with ordinal first_ordinal + i, so
+    that dates map to columns without lookups. Rows and columns are
+    allocated ahead (doubling when full), so adding an alpha usually
+    writes only its own row in place.
+    """
+    def __init__(self, path=RESULT_STORE_DIR):
+        self.path = path
+        self.min_overlap = MIN_OVERLAP
+        self.block_size = BLOCK_SIZE
+        self.index = []
+        self.first_ordinal = None
+        self.load()
+
+    def file(self, name):
+        """
+        Return the path of a file of the store.
+        """
+        return os.path.join(self.path, name)
+
+    def load(self):
+        """
+        Load the index of the store, if it exists.
+        """
+        if not os.path.isfile(self.file(INDEX_FILE)):
+            return
+        with open(self.file(INDEX_FILE), 'rb') as file:
+            self.index, self.first_ordinal = pickle.load(file)
+
+    def matrix(self, mode='r'):
+        """
+        Return the memory-mapped pnl matrix (capacity x days).
+        Only the first len(self.index) rows are in use.
+        """
+        return np.load(self.file(PNLS_FILE), mmap_mode=mode)
+
+    def row_of(self, submission_id):
+        """
+        Return the row of the submission id, or None if it is not stored.
+        """
+        for entry in self.index:
+            if entry['submission_id'] == submission_id:
+                return entry['row']
+        return None
+
+    def reserve(self, rows, first_ordinal, last_ordinal):
+        """
+        Make sure the matrix has the given number of rows and covers days
+        between the ordinals, reallocating it (doubling) if it does not.
+        """
+        if self.first_ordinal is not None:
+            old = self.matrix()
+            capacity, days = old.shape
+            if (rows <= capacity and first_ordinal >= self.first_ordinal
+                    and last_ordinal < self.first_ordinal + days):
+                return
+            first_ordinal = min(first_ordinal, self.first_ordinal)
+            last_ordinal = max(last_ordinal, self.first_ordinal + days - 1)
+        else:
+            old = None
+            capacity, days = MIN_ROWS // 2, MIN_DAYS // 2
+        while capacity < rows:
+            capacity *= 2
+        while days < last_ordinal - first_ordinal + 1:
+            days *= 2
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        new = np.lib.format.open_memmap(
+            self.file(PNLS_FILE) + '.tmp', 'w+', float, (capacity, days))
+        new[:] = np.nan
+        if old is not None:
+            offset = self.first_ordinal - first_ordinal
+            new[:len(self.index), offset:offset + old.shape[1]] = (
+                old[:len(self.index)])
+        new.flush()
+        del new
+        os.replace(self.file(PNLS_FILE) + '.tmp', self.file(PNLS_FILE))
+        self.first_ordinal = first_ordinal
+
+    def add(self, submission_id, results, **info):
+        """
+        Store the daily pnl series of simulation results.
+        Results stored with the same submission id will be replaced.
+
+        info: optional `author`, `submission_date` and `alpha_settings_path`
+            of the alpha, kept in its index entry, and `status` and `error`
+            of its simulation if it failed, when results are empty.
+        """
+        status = info.get('status', OK)
+        if status == OK and len(results) == 0:
+            raise ValueError('No results of %s to store.' % submission_id)
+        row = self.row_of(submission_id)
+        if row is None:
+            row = len(self.index)
+        entry = {
+            'submission_id': submission_id,
+            'row': row,
+            'author': info.get('author'),
+            'submission_date': info.get('submission_date'),
+            'alpha_settings_path': info.get('alpha_settings_path'),
+            'status': status,
+            'error': info.get('error'),
+            'start_date': None,
+            'end_date': None,
+            'target': None}
+        if status == OK:
+            entry['start_date'] = results[0].date
+            entry['end_date'] = results[-1].date
+            entry['target'] = self.save_series(row, results)
+        else:
+            self.clear(row)
+        if row == len(self.index):
+            self.index.append(entry)
+        else:
+            self.index[row] = entry
+        self.save_index()
+
+    def save_series(self, row, results):
+        """
+        Write the daily pnl series and positions of results into the row.
+        Return the target of the positions, see save_positions.
+        """
+        ordinals = to_ordinals([today.date for today in results])
+        pnl = np.array([sum(today.pnl.values()) for today in results])
+        self.reserve(row + 1, ordinals.min(), ordinals.max())
+        matrix = self.matrix('r+')
+        matrix[row] = np.nan
+        matrix[row, ordinals - self.first_ordinal] = pnl
+        matrix.flush()
+        del matrix
+        return self.save_positions(row, ordinals, results)
+
+    def clear(self, row):
+        """
+        Remove the daily pnl series and positions of the row, if any.
+        """
+        if os.path.isfile(self.file(POSITIONS_FILE % row)):
+            os.remove(self.file(POSITIONS_FILE % row))
+        if self.first_ordinal is None:
+            return
+        self.reserve(row + 1, self.first_ordinal, self.first_ordinal)
+        matrix = self.matrix('r+')
+        matrix[row] = np.nan
+        matrix.flush()
+        del matrix
+
+    def save_positions(self, row, ordinals, results):
+        """
+        Write daily positions of results into the positions file of the
+        row, with one row per day from the first to the last date (zero on
+        days without results).
+        Return the target of the positions, or None if results have no
+        bound positions, which are then not stored.
+        """
+        path = self.file(POSITIONS_FILE % row)
+        target = getattr(results[0].position, 'encoding', None)
+        if target is None:
+            if os.path.isfile(path):
+                os.remove(path)
+            return None
+        positions = np.zeros(
+            (ordinals[-1] - ordinals[0] + 1,
+             len(results[0].position.positions)))
+        positions[ordinals - ordinals[0]] = [
+            today.position.positions for today in results]
+        np.save(path + '.tmp.npy', positions)
+        os.replace(path + '.tmp.npy', path)
+        return target
+
+    def get_positions(self, entry):
+        """
+        Return the first date (np.datetime64) and the memory-mapped daily
+        positions (days x instruments) of an index entry, see
+        save_positions.
+        """
+        if entry.get('target') is None:
+            raise KeyError('No positions of %s.' % entry['submission_id'])
+        return (np.datetime64(entry['start_date'], 'D'), np.load(
+            self.file(POSITIONS_FILE % entry['row']), mmap_mode='r'))
+
+    def get_pnl_matrix(self, entries):
+        """
+        Return dates (np.datetime64) covered by any of the index entries,
+        and their daily pnl series on those dates (entries x dates, NaN on
+        missing days).
+        """
+        if not entries:
+            return np.array([], dtype='datetime64[D]'), np.zeros((0, 0))
+        pnls = self.matrix()[[entry['row'] for entry in entries]]
+        columns = np.flatnonzero(~np.isnan(pnls).all(axis=0))
+        dates = (
+            np.datetime64(datetime.date.fromordinal(self.first_ordinal), 'D')
+            + columns)
+        return dates, pnls[:, columns]
+
+    def save_index(self):
+        """
+        Atomically write the index.
+        Rows are only visible to readers once the index is written.
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        with open(self.file(INDEX_FILE) + '.tmp', 'wb') as file:
+            pickle.dump((self.index, self.first_ordinal), file)
+        os.replace(self.file(INDEX_FILE) + '.tmp', self.file(INDEX_FILE))
+
+    def select(self, submission_ids=None, author=None, submitted_after=None,
+               submitted_before=None, failed=False):
+        """
+        Return index entries matching all given conditions.
+
+        failed: whether to also return entries of alphas whose simulation
+            failed, which have no results.
+        """
+        return [
+            entry for entry in self.index
+            if (failed or entry.get('status', OK) == OK)
+            and (submission_ids is None
+                or entry['submission_id'] in submission_ids)
+            and (author is None or entry['author'] == author)
+            and (submitted_after is None or (
+                entry['submission_date'] is not None
+                and entry['submission_date'] >= submitted_after))
+            and (submitted_before is None or (
+                entry['submission_date'] is not None
+                and entry['submission_date'] <= submitted_before))]
+
+    def get_pnl(self, submission_id):
+        """
+        Return dates and the daily pnl series of the submission id.
+        """
+        row = self.row_of(submission_id)
+        if row is None:
+            raise KeyError('Submission not found: %s' % submission_id)
+        if self.first_ordinal is None:
+            return [], np.array([])
+        pnl = np.array(self.matrix()[row])
+        columns = np.flatnonzero(~np.isnan(pnl))
+        return ([datetime.datetime.fromordinal(int(column + self.first_ordinal))
+                 for column in columns], pnl[columns])
+
+    def correlations(self, dates, pnl, entries=None, period=None):
+        """
+        Return correlations between the given daily pnl series and stored
+        series, on days both have, in the order of entries.
+
+        entries: index entries to compare with (see select); all if None.
+        period: if given, (start date, end date) of days to use, where
+            either may be None.
+        Correlations with less than min_overlap common days are NaN.
+        """
+        if entries is None:
+            entries = self.index
+        results = np.full(len(entries), np.nan)
+        if not entries:
+            return results
+        matrix = self.matrix()
+        columns, pnl = self.to_columns(dates, pnl, period, matrix.shape[1])
+        if len(columns) == 0:
+            return results
+        # Only the span of the given series is read from the matrix.
+        first, last = columns.min(), columns.max() + 1
+        target = np.full(last - first, np.nan)
+        target[columns - first] = pnl
+        rows = np.array([entry['row'] for entry in entries], dtype=np.int64)
+        for start in range(0, len(rows), self.block_size):
+            block = matrix[rows[start:start + self.block_size], first:last]
+            results[start:start + self.block_size] = block_correlations(
+                block, target, self.min_overlap)
+        return results
+
+    def to_columns(self, dates, pnl, period, days):
+        """
+        Return matrix columns of dates and pnl on them, keeping only dates
+        in the period (see correlations) and in the `days` columns.
+        """
+        columns = to_ordinals(dates) - self.first_ordinal
+        pnl = np.asarray(pnl, dtype=float)
+        inside = (columns >= 0) & (columns < days)
+        start_date, end_date = period or (None, None)
+        if start_date is not None:
+            inside &= columns >= start_date.toordinal() - self.first_ordinal
+        if end_date is not None:
+            inside &= columns <= end_date.toordinal() - self.first_ordinal
+        return columns[inside], pnl[inside]
+
+    def max_correlation(self, dates, pnl, exclude=None, period=None,
+                        **conditions):
+        """
+        Return the submission id and correlation of the stored series most
+        correlated with the given series, or (None, None) if there is none.
+
+        exclude: a submission id to skip, e.g. the alpha itself.
+        period: see correlations.
+        conditions: passed to select.
+        """
+        entries = [
+            entry for entry in self.select(**conditions)
+            if entry['submission_id'] != exclude]
+        correlations = self.correlations(dates, pnl, entries, period)
+        if np.isnan(correlations).all():
+            return None, None
+        best = int(np.nanargmax(correlations))
+        return entries[best]['submission_id'], float(correlations[best])
+
+def block_correlations(block, target, min_overlap):
+    """
+    Return Pearson correlations between each row of block and target,
+    on columns where both are not NaN.
+    """
+    common = ~np.isnan(block) & ~np.isnan(target)
+    counts = common.sum(axis=1)
+    x_values = np.where(common, target, 0.)
+    y_values = np.where(common, block, 0.)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_means = x_values.sum(axis=1) / counts
+        y_means = y_values.sum(axis=1) / counts
+        x_values = np.where(common, x_values - x_means[:, None], 0.)
+        y_values = np.where(common, y_values - y_means[:, None], 0.)
+        correlations = (x_values * y_values).sum(axis=1) / np.sqrt(
+            (x_values ** 2).sum(axis=1) * (y_values ** 2).sum(axis=1))
+    correlations[counts < min_overlap] = np.nan
+    return correlations
@@ -0,0 +1,124 @@
+"""
+Unit tests for the result store.
+"""
+
+import datetime
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from thousandaire.data_classes import Data
+from thousandaire.result_store import ResultStore
+
+def make_results(dates, pnl):
+    """
+    Build simulation results with the given daily pnl.
+    """
+    results = Data('result', ['pnl', 'cost', 'position'])
+    results.extend([
+        (date, {'USD': value}, {'USD': 0.}, None)
+        for date, value in zip(dates, pnl)])
+    return results
+
+class TestResultStore(unittest.TestCase):
+    """
+    Unit test object for ResultStore.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.dates = [
+            datetime.datetime(2019, 1, 1) + datetime.timedelta(days=day)
+            for day in range(0, 1500, 3)]
+        self.pnls = rng.normal(size=(3, len(self.dates)))
+        self.store = ResultStore(self.path)
+        for number, pnl in enumerate(self.pnls):
+            self.store.add(
+                'alpha-%d' % number, make_results(self.dates, pnl),
+                author='even' if number % 2 == 0 else 'odd')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_get_pnl(self):
+        """
+        Stored series should be read back from a reopened store.
+        """
+        dates, pnl = ResultStore(self.path).get_pnl('alpha-1')
+        self.assertEqual(dates, self.dates)
+        np.testing.assert_allclose(pnl, self.pnls[1])
+
+    def test_correlations(self):
+        """
+        Correlations should match np.corrcoef on days both series have.
+        """
+        dates = self.dates[100:]
+        pnl = self.pnls[2, 100:] + self.pnls[0, 100:]
+        expected = [
+            np.corrcoef(pnl, stored[100:])[0, 1] for stored in self.pnls]
+        self.store.block_size = 2
+        np.testing.assert_allclose(
+            self.store.correlations(dates, pnl), expected)
+
+    def test_max_correlation(self):
+        """
+        max_correlation should respect filters and exclusion.
+        """
+        pnl = self.pnls[2] + self.pnls[1] * 0.5
+        self.assertEqual(
+            self.store.max_correlation(self.dates, pnl)[0], 'alpha-2')
+        self.assertEqual(
+            self.store.max_correlation(self.dates, pnl, 'alpha-2')[0],
+            'alpha-1')
+        self.assertEqual(
+            self.store.max_correlation(
+                self.dates, pnl, 'alpha-2', author='even')[0],
+            'alpha-0')
+
+    def test_replace_and_grow(self):
+        """
+        Re-adding an alpha replaces it, and later dates grow the store.
+        """
+        dates = [
+            self.dates[-1] + datetime.timedelta(days=day)
+            for day in range(1, 3000)]
+        self.store.add('alpha-0', make_results(dates, np.ones(len(dates))))
+        store = ResultStore(self.path)
+        self.assertEqual(len(store.index), 3)
+        self.assertEqual(store.get_pnl('alpha-0')[0], dates)
+        np.testing.assert_allclose(store.get_pnl('alpha-2')[1], self.pnls[2])
+
+    def test_failures(self):
+        """
+        Failed alphas should be kept without results, and be selected only
+        when asked for.
+        """
+        self.store.add('alpha-1', [], status='timeout', error='too long')
+        self.store.add('alpha-3', [], status='error', error='crashed')
+        store = ResultStore(self.path)
+        self.assertEqual(
+            [entry['submission_id'] for entry in store.select()],
+            ['alpha-0', 'alpha-2'])
+        self.assertEqual(
+            [(entry['submission_id'], entry['status'], entry['error'])
+             for entry in store.select(failed=True)],
+            [('alpha-0', 'ok', None), ('alpha-1', 'timeout', 'too long'),
+             ('alpha-2', 'ok', None), ('alpha-3', 'error', 'crashed')])
+        self.assertEqual(store.get_pnl('alpha-1')[0], [])
+        self.assertNotEqual(
+            store.max_correlation(self.dates, self.pnls[1])[0], 'alpha-1')
+        store.add('alpha-3', make_results(self.dates, self.pnls[1]))
+        self.assertEqual(store.row_of('alpha-3'), 3)
+        self.assertEqual(
+            store.max_correlation(self.dates, self.pnls[1])[0], 'alpha-3')
+        with self.assertRaises(ValueError):
+            store.add('alpha-4', [])
+        empty = ResultStore(self.path + '/empty')
+        empty.add('alpha-0', [], status='error', error='crashed')
+        self.assertEqual(empty.get_pnl('alpha-0')[0], [])
+        empty.add('alpha-1', make_results(self.dates, self.pnls[0]))
+        self.assertEqual(
+            [entry['submission_id'] for entry in empty.select()], ['alpha-1'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,248 @@
+"""
+Incremental rolling-window statistics bound to DataControllers.
+
+Most alphas look at a fixed number of recent rows of each instrument.
+Instead of re-scanning the window every day, ask `rolling` for a
+RollingWindow: it keeps running aggregates which are updated in O(1) per
+simulated day as the DataController moves forward. Windows are cached per
+DataController, so alphas (or parameter sets) asking for the same window
+share one computation. Windows only keep a weak reference to their
+DataController, so that they are dropped together with it.
+
+Example:
+    for instrument, price_data in dataset['currency_price_tw'].items():
+        mean = rolling(price_data, 'buy', 5).mean()
+"""
+
+import collections
+import math
+import weakref
+
+WINDOWS = weakref.WeakKeyDictionary()
+
+def rolling(controller, field, window):
+    """
+    Return the shared RollingWindow of `field` over the last `window` rows
+    of the DataController.
+
+    field: a field name of the data, or a function which maps a row to a
+        value (None for missing). Use a module-level function rather than a
+        lambda, so that windows can be shared.
+    """
+    windows = WINDOWS.setdefault(controller, {})
+    key = (field, window)
+    if key not in windows:
+        windows[key] = RollingWindow(controller, field, window)
+    return windows[key]
+
+class RollingWindow: # pylint: disable=too-many-instance-attributes
+    """
+    Running statistics of a field over the last `window` rows.
+
+    Rows whose value is None are missing: they take a place in the window,
+    but are excluded from sum, mean, std, min and max, and they break
+    monotonic runs.
+
+    The window follows the DataController lazily. Every query first takes in
+    the rows added since the last query, which is a single row per simulated
+    day. If the controller is moved backwards, the window is rebuilt.
+    """
+    def __init__(self, controller, field, window):
+        if window <= 0:
+            raise ValueError('Window size should be positive.')
+        # A strong reference would keep the key of WINDOWS alive.
+        self.__controller = weakref.ref(controller)
+        self.field = field
+        self.window = window
+        self.__reset()
+
+    @property
+    def controller(self):
+        """
+        The DataController followed by the window.
+        """
+        controller = self.__controller()
+        if controller is None:
+            raise ReferenceError('The DataController has been dropped.')
+        return controller
+
+    def __reset(self):
+        self.__values = collections.deque()
+        self.__count = 0
+        self.__sum = 0.
+        # Sums of squares are taken around a shift to reduce cancellation.
+        self.__shift = None
+        self.__shifted_sum = 0.
+        self.__shifted_square_sum = 0.
+        # Monotonic deques of (sequence number, value) for min and max.
+        self.__min = collections.deque()
+        self.__max = collections.deque()
+        self.__sequence = 0
+        self.__rising = 0
+        self.__falling = 0
+        self.__last_date = None
+
+    def __value(self, row):
+        if callable(self.field):
+            return self.field(row)
+        return getattr(row, self.field)
+
+    def __push(self, value):
+        last = self.__values[-1] if self.__values else None
+        self.__values.append(value)
+        self.__sequence += 1
+        if value is None:
+            self.__rising = self.__falling = 0
+        else:
+            self.__count += 1
+            self.__sum += value
+            if self.__shift is None:
+                self.__shift = value
+            self.__shifted_sum += value - self.__shift
+            self.__shifted_square_sum += (value - self.__shift) ** 2
+            while self.__min and self.__min[-1][1] >= value:
+                self.__min.pop()
+            self.__min.append((self.__sequence, value))
+            while self.__max and self.__max[-1][1] <= value:
+                self.__max.pop()
+            self.__max.append((self.__sequence, value))
+            # Runs are counted within the window only, so that they do not
+            # depend on how often the window is queried.
+            self.__rising = min(self.__rising + 1, self.window - 1) if (
+                last is not None and value > last) else 0
+            self.__falling = min(self.__falling + 1, self.window - 1) if (
+                last is not None and value < last) else 0
+        if len(self.__values) > self.window:
+            self.__pop()
+
+    def __pop(self):
+        value = self.__values.popleft()
+        oldest = self.__sequence - self.window
+        while self.__min and self.__min[0][0] <= oldest:
+            self.__min.popleft()
+        while self.__max and self.__max[0][0] <= oldest:
+            self.__max.popleft()
+        if value is not None:
+            self.__count -= 1
+            self.__sum -= value
+            self.__shifted_sum -= value - self.__shift
+            self.__shifted_square_sum -= (value - self.__shift) ** 2
+
+    def update(self):
+        """
+        Take in rows added to the DataController since the last update.
+        """
+        controller = self.controller
+        length = len(controller)
+        if length == 0:
+            if self.__last_date is not None:
+                self.__reset()
+            return
+        newest = controller[-1].date
+        if self.__last_date is not None and newest == self.__last_date:
+            return
+        new_rows = 0
+        if self.__last_date is not None and newest > self.__last_date:
+            while (new_rows < min(length, self.window)
+                   and controller[-new_rows - 1].date
+                   > self.__last_date):
+                new_rows += 1
+        if new_rows in (0, self.window):
+            # Moved backwards, or too far to reuse anything.
+            self.__reset()
+            new_rows = min(length, self.window)
+        for index in range(-new_rows, 0):
+            self.__push(self.__value(controller[index]))
+        self.__last_date = newest
+
+    def size(self):
+        """
+        Return the number of rows in the window, including missing ones.
+        """
+        self.update()
+        return len(self.__values)
+
+    def count(self):
+        """
+        Return the number of non-missing values in the window.
+        """
+        self.update()
+        return self.__count
+
+    def is_full(self):
+        """
+        Return whether the window has `window` rows and none is missing.
+        """
+        return self.count() == self.window
+
+    def first(self):
+        """
+        Return the value of the oldest row in the window.
+        """
+        self.update()
+        return self.__values[0] if self.__values else None
+
+    def last(self):
+        """
+        Return the value of the newest row in the window.
+        """
+        self.update()
+        return self.__values[-1] if self.__values else None
+
+    def sum(self):
+        """
+        Return the sum of non-missing values.
+        """
+        self.update()
+        return self.__sum
+
+    def mean(self):
+        """
+        Return the mean of non-missing values, or None if there is none.
+        """
+        count = self.count()
+        return self.__sum / count if count else None
+
+    def std(self):
+        """
+        Return the population standard deviation of non-missing values,
+        or None if there is none.
+        """
+        count = self.count()
+        if not count:
+            return None
+        mean = self.__shifted_sum / count
+        return math.sqrt(max(self.__shifted_square_sum / count - mean ** 2, 0.))
+
+    def min(self):
+        """
+        Return the minimum of non-missing values, or None if there is none.
+        """
+        self.update()
+        return self.__min[0][1] if self.__min else None
+
+    def max(self):
+        """
+        Return the maximum of non-missing values, or None if there is none.
+        """
+        self.update()
+        return self.__max[0][1] if self.__max else None
+
+    def rising(self):
+        """
+        Return the number of consecutive rises within the window ending at
+        the newest row, at most `window - 1`.
+
+        For example, it is `window - 1` iff all values in a full window are
+        strictly increasing.
+        """
+        self.update()
+        return self.__rising
+
+    def falling(self):
+        """
+        Return the number of consecutive falls within the window ending at
+        the newest row, at most `window - 1`.
+        """
+        self.update()
+        return self.__falling
@@ -0,0 +1,143 @@
+"""
+Unit tests for rolling-window statistics.
+"""
+
+import gc
+import random
+import statistics
+import unittest
+from datetime import datetime, timedelta
+from thousandaire.data_classes import Data, DataController
+from thousandaire.rolling import WINDOWS, rolling
+
+def buy_of(row):
+    """
+    Return the buy price of a row, as a field function of a window.
+    """
+    return row.buy
+
+class TestRollingWindow(unittest.TestCase):
+    """
+    Unit test object for RollingWindow.
+    """
+    def setUp(self):
+        rng = random.Random(0)
+        dates = [datetime(2020, 1, 1) + timedelta(days=x) for x in range(60)]
+        workdays = Data('workdays', [])
+        workdays.extend((date,) for date in dates)
+        prices = Data('test', ['buy', 'sell'])
+        prices.extend(
+            (date, None if rng.random() < 0.1 else rng.uniform(1, 2), 1.)
+            for date in dates)
+        self.workdays = DataController(workdays)
+        self.prices = DataController(prices)
+        self.prices.set_workdays(self.workdays)
+        self.workdays.set_date(dates[10])
+        self.prices.set_date(dates[10])
+
+    def move_forward(self):
+        """
+        Move the workdays and the prices to the next day.
+        """
+        self.prices.move_forward()
+        self.workdays.move_forward()
+
+    def expected(self, window):
+        """
+        Return non-missing values in the window, computed from scratch.
+        """
+        values = [self.prices[x].buy for x in range(-window, 0)]
+        return [value for value in values if value is not None]
+
+    def test_statistics(self):
+        """
+        Statistics should match the ones computed from scratch.
+        """
+        window = rolling(self.prices, 'buy', 5)
+        for _ in range(40):
+            values = self.expected(5)
+            self.assertEqual(window.count(), len(values))
+            self.assertAlmostEqual(window.sum(), sum(values))
+            if values:
+                self.assertAlmostEqual(window.mean(), statistics.mean(values))
+                self.assertAlmostEqual(window.std(), statistics.pstdev(values))
+                self.assertEqual(window.min(), min(values))
+                self.assertEqual(window.max(), max(values))
+            self.move_forward()
+
+    def test_monotonic_runs(self):
+        """
+        Runs should match the ones computed from scratch.
+        """
+        window = rolling(self.prices, 'buy', 4)
+        for _ in range(40):
+            rows = [self.prices[x].buy for x in range(-4, 0)]
+            full = None not in rows
+            increasing = full and all(
+                rows[x] < rows[x + 1] for x in range(3))
+            decreasing = full and all(
+                rows[x] > rows[x + 1] for x in range(3))
+            self.assertEqual(window.is_full(), full)
+            self.assertEqual(full and window.rising() >= 3, increasing)
+            self.assertEqual(full and window.falling() >= 3, decreasing)
+            self.move_forward()
+
+    def test_runs_within_window(self):
+        """
+        Runs should only count rows in the window, whether the window is
+        queried every day or once after many days.
+        """
+        dates = [datetime(2020, 1, 1) + timedelta(days=x) for x in range(30)]
+        workdays = Data('workdays', [])
+        workdays.extend((date,) for date in dates)
+        prices = Data('test', ['buy', 'sell'])
+        prices.extend(
+            (date, float(x if x != 22 else 0), 1.)
+            for x, date in enumerate(dates))
+        workdays = DataController(workdays)
+        prices = DataController(prices)
+        prices.set_workdays(workdays)
+        workdays.set_date(dates[1])
+        prices.set_date(dates[1])
+        daily = rolling(prices, 'buy', 4)
+        queried = rolling(prices, buy_of, 4)
+        for _ in range(18):
+            daily.rising()
+            prices.move_forward()
+            workdays.move_forward()
+        self.assertEqual(daily.rising(), 3)
+        self.assertEqual(queried.rising(), 3)
+        for _ in range(4):
+            daily.rising()
+            prices.move_forward()
+            workdays.move_forward()
+        self.assertEqual(daily.rising(), queried.rising())
+        self.assertEqual(daily.falling(), queried.falling())
+        self.assertEqual((daily.rising(), daily.falling()), (0, 1))
+
+    def test_shared(self):
+        """
+        Same windows should be shared, and follow the controller backwards.
+        """
+        window = rolling(self.prices, 'buy', 5)
+        self.assertIs(rolling(self.prices, 'buy', 5), window)
+        self.assertIsNot(rolling(self.prices, 'buy', 6), window)
+        for _ in range(10):
+            self.move_forward()
+        window.mean()
+        self.prices.set_date(datetime(2020, 1, 15))
+        self.assertEqual(window.count(), len(self.expected(5)))
+        self.assertAlmostEqual(window.sum(), sum(self.expected(5)))
+
+    def test_dropped_controller(self):
+        """
+        Windows should be dropped together with their controller.
+        """
+        rolling(self.prices, 'buy', 5).mean()
+        self.assertIn(self.prices, WINDOWS)
+        del self.prices
+        gc.collect()
+        self.assertEqual(len(WINDOWS), 0)
+
+if __name__ == '__main__':
+    unittest.main()
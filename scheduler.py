@@ -0,0 +1,217 @@
+"""
+Scheduler running jobs in a bounded number of processes under budgets.
+
+Each job runs `target(*args)` in its own process. Its result is a dict of
+`status` ('ok', 'timeout' or 'error') and `result` (what target returns) or
+`error` (a traceback or the reason), where a TimeoutError raised by target
+is a timeout. The scheduler enforces the CPU time and wall time budgets of
+every job and an optional MemoryBudget, and gives every job such a result
+even if its process is terminated or dies. The wall time budget catches
+jobs which use little CPU time but never end, e.g. blocked on a lock or on
+I/O.
+
+When no job is waiting and a worker is idle, a job running much longer than
+finished jobs did (a straggler) may be speculatively started again. The
+first attempt to finish wins and the others are terminated, so this is only
+meant for jobs whose attempts give the same results.
+
+Every attempt sends its result through a pipe of its own, since a process
+terminated while writing into a shared multiprocessing.Queue may leave it
+locked for all others.
+"""
+
+import os
+import statistics
+import time
+import traceback
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+from thousandaire.memory import MEGABYTE, POLL_INTERVAL, terminate_tree
+from thousandaire.time_budget import get_tree_cpu_time
+from thousandaire.tracing import span
+
+OK = 'ok'
+TIMEOUT = 'timeout'
+ERROR = 'error'
+
+def run_job(target, connection, *args):
+    """
+    Run target in a job process and send its result, turning a TimeoutError
+    or another exception into a result of that status.
+    """
+    try:
+        result = {'status': OK, 'result': target(*args)}
+    except TimeoutError:
+        result = {'status': TIMEOUT, 'error': traceback.format_exc()}
+    except Exception: # pylint: disable=broad-except
+        result = {'status': ERROR, 'error': traceback.format_exc()}
+    connection.send(result)
+    connection.close()
+
+class Scheduler:
+    """
+    Run named jobs in processes, enforcing budgets.
+    """
+    def __init__(self, processes=None, memory_budget=None, speculation=None):
+        """
+        processes: max number of concurrent processes, the number of CPUs
+            by default.
+        memory_budget: an optional MemoryBudget of every job.
+        speculation: if not None, start a job again when a worker is idle
+            and the job has run for more than this many times the median
+            wall time of jobs finished successfully.
+        """
+        self.processes = processes or os.cpu_count()
+        self.memory_budget = memory_budget
+        self.speculation = speculation
+        # Job names to the time the first attempt started and processes of
+        # all attempts.
+        self.attempts = {}
+        self.readers = {}
+        self.durations = []
+        self.results = {}
+
+    def start(self, name, target, args):
+        """
+        Start an attempt of a job.
+        """
+        reader, writer = Pipe(duplex=False)
+        process = Process(target=run_job, args=(target, writer) + tuple(args))
+        with span('start_process', job=name):
+            process.start()
+        writer.close()
+        self.attempts.setdefault(name, (time.time(), []))[1].append(process)
+        self.readers[reader] = (name, process)
+
+    def finish(self, name, result, winner=None):
+        """
+        Keep the first result of a job and terminate its attempts other than
+        winner, the process which gave the result.
+        Return whether the result is kept.
+        """
+        if name in self.results:
+            return False
+        self.results[name] = result
+        if result['status'] == OK:
+            self.durations.append(time.time() - self.attempts[name][0])
+        for process in self.attempts[name][1]:
+            if process is not winner and process.is_alive():
+                terminate_tree(process.pid)
+        return True
+
+    def enforce(self, name, process, budgets):
+        """
+        Fail a job whose attempt is over its CPU time or memory budget, or
+        which has run for longer than its wall time budget.
+
+        budgets: CPU time budget and wall time budget of the job in seconds,
+            either may be None.
+        """
+        time_budget, wall_budget = budgets
+        if wall_budget is not None:
+            seconds = time.time() - self.attempts[name][0]
+            if seconds > wall_budget:
+                self.finish(name, {
+                    'status': TIMEOUT,
+                    'error': '%.1f seconds run, over the wall time budget of '
+                             '%.1f' % (seconds, wall_budget)})
+                return
+        if time_budget is not None:
+            seconds = get_tree_cpu_time(process.pid)
+            if seconds > time_budget:
+                self.finish(name, {
+                    'status': TIMEOUT,
+                    'error': '%.1f CPU seconds used, over the budget of %.1f'
+                             % (seconds, time_budget)})
+                return
+        if self.memory_budget is not None and self.memory_budget.check(
+                name, process):
+            self.finish(name, {
+                'status': ERROR,
+                'error': '%.1f MB used, over the memory budget of %.1f MB'
+                         % (self.memory_budget.aborted[name] / MEGABYTE,
+                            self.memory_budget.budget / MEGABYTE)})
+
+    def receive(self, timeout, discard=None):
+        """
+        Wait up to timeout seconds for results of attempts and record them.
+        A job whose attempts have all ended without a result, e.g. killed
+        by the system, gets an error result.
+
+        discard: an optional function called with results which lose to
+            another attempt.
+        """
+        for reader in wait(list(self.readers), timeout):
+            name, process = self.readers.pop(reader)
+            try:
+                result = reader.recv()
+            except (EOFError, OSError):
+                result = None
+            reader.close()
+            if result is not None:
+                if (not self.finish(name, result, process)
+                        and discard is not None):
+                    discard(result)
+            elif name not in self.get_running_names():
+                for attempt in self.attempts[name][1]:
+                    attempt.join()
+                self.finish(name, {
+                    'status': ERROR,
+                    'error': 'Worker exited with code %s.' % ', '.join(
+                        str(attempt.exitcode)
+                        for attempt in self.attempts[name][1])})
+
+    def get_running_names(self):
+        """
+        Return names of jobs with attempts which have not ended.
+        """
+        return {name for name, _ in self.readers.values()}
+
+    def pick_straggler(self):
+        """
+        Return the name of a running job to start again, or None.
+        """
+        if self.speculation is None or not self.durations:
+            return None
+        limit = self.speculation * statistics.median(self.durations)
+        now = time.time()
+        stragglers = [
+            name for name in self.get_running_names()
+            if name not in self.results and len(self.attempts[name][1]) == 1
+            and now - self.attempts[name][0] > limit]
+        return min(
+            stragglers, key=lambda name: self.attempts[name][0], default=None)
+
+    def run(self, target, jobs, discard=None):
+        """
+        Run jobs and return a dict of their names to results.
+
+        jobs: a dict of job names to (args of target, CPU time budget in
+            seconds or None, wall time budget in seconds or None), started
+            in this order.
+        discard: an optional function called with results of attempts which
+            lose to another attempt, e.g. to clean up what they hand over.
+        """
+        pending = list(jobs)
+        while pending or self.readers:
+            running = [
+                (name, process)
+                for name, (_, processes) in self.attempts.items()
+                for process in processes if process.is_alive()]
+            for name, process in running:
+                if name not in self.results:
+                    self.enforce(name, process, jobs[name][1:])
+            idle = self.processes - len(running)
+            while pending and idle > 0:
+                name = pending.pop(0)
+                self.start(name, target, jobs[name][0])
+                idle -= 1
+            if not pending and idle > 0:
+                name = self.pick_straggler()
+                if name is not None:
+                    self.start(name, target, jobs[name][0])
+            self.receive(POLL_INTERVAL, discard)
+        for _, processes in self.attempts.values():
+            for process in processes:
+                process.join()
+        return self.results
@@ -0,0 +1,132 @@
+"""
+Unit tests for the scheduler.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from thousandaire.memory import MEGABYTE, MemoryBudget
+from thousandaire.scheduler import ERROR, OK, TIMEOUT, Scheduler
+
+def call(function, *args):
+    """
+    Target of jobs calling the given function.
+    """
+    return function(*args)
+
+def square(value):
+    """
+    Return quickly.
+    """
+    return value * value
+
+def spin():
+    """
+    Use CPU time forever.
+    """
+    while True:
+        pass
+
+def crash():
+    """
+    Exit without a result.
+    """
+    os._exit(3)
+
+def stall(path):
+    """
+    Sleep for long in the first attempt, which creates the file at path,
+    and return quickly in later attempts.
+    """
+    try:
+        with open(path, 'x'):
+            pass
+    except FileExistsError:
+        return os.getpid()
+    time.sleep(60)
+    return None
+
+def hold(size):
+    """
+    Hold size bytes of memory for long.
+    """
+    content = b'x' * size
+    time.sleep(60)
+    return len(content)
+
+class TestScheduler(unittest.TestCase):
+    """
+    Unit test object for Scheduler.
+    """
+    def test_statuses(self):
+        """
+        Every job should get a result, with the status of how it ended.
+        """
+        results = Scheduler(processes=2).run(
+            call,
+            {'square': ((square, 3), None, None),
+             'spin': ((spin,), 0.2, None),
+             'fail': ((square, None), None, None),
+             'crash': ((crash,), None, None)})
+        self.assertEqual(results['square'], {'status': OK, 'result': 9})
+        self.assertEqual(results['spin']['status'], TIMEOUT)
+        self.assertEqual(results['fail']['status'], ERROR)
+        self.assertIn('TypeError', results['fail']['error'])
+        self.assertEqual(results['crash']['status'], ERROR)
+        self.assertIn('3', results['crash']['error'])
+
+    def test_wall_budget(self):
+        """
+        A job using little CPU time should still time out after its wall
+        time budget.
+        """
+        started = time.time()
+        results = Scheduler(processes=2).run(
+            call,
+            {'sleep': ((time.sleep, 60), 10, 0.5),
+             'square': ((square, 3), 10, 10)})
+        self.assertLess(time.time() - started, 30)
+        self.assertEqual(results['sleep']['status'], TIMEOUT)
+        self.assertIn('wall time', results['sleep']['error'])
+        self.assertEqual(results['square']['status'], OK)
+
+    def test_speculation(self):
+        """
+        A straggler should be started again on an idle worker, and the
+        first attempt to finish should win.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            started = time.time()
+            results = Scheduler(processes=2, speculation=2).run(
+                call,
+                {'square': ((square, 3), None, None),
+                 'stall': ((stall, os.path.join(directory, 'stall')),
+                           None, None)})
+        finally:
+            shutil.rmtree(directory)
+        self.assertLess(time.time() - started, 30)
+        self.assertEqual(results['square'], {'status': OK, 'result': 9})
+        self.assertEqual(results['stall']['status'], OK)
+        self.assertIsNotNone(results['stall']['result'])
+
+    def test_memory_budget(self):
+        """
+        A job over the memory budget should be aborted with an error, and
+        others should not.
+        """
+        budget = MemoryBudget(200 * MEGABYTE)
+        results = Scheduler(processes=2, memory_budget=budget).run(
+            call,
+            {'hold': ((hold, 400 * MEGABYTE), None, None),
+             'square': ((square, 3), None, None)})
+        self.assertEqual(results['hold']['status'], ERROR)
+        self.assertIn('memory budget', results['hold']['error'])
+        self.assertEqual(results['square']['status'], OK)
+        self.assertTrue(budget.get_results('hold')['aborted'])
+        self.assertFalse(budget.get_results('square')['aborted'])
+
+if __name__ == '__main__':
+    unittest.main()
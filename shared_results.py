@@ -0,0 +1,136 @@
+"""
+Hand simulation results between processes through memory-mapped files.
+
+Instead of pickling a whole Data of results (per-day dicts and Portfolios)
+through a pipe, a worker writes the results as arrays of shape
+(days, instruments) into .npy files in a temporary directory, and sends
+only a small descriptor. The parent maps the files without reading them,
+and rows are rebuilt from the arrays only when they are accessed.
+"""
+
+import datetime
+import os
+import shutil
+import tempfile
+import numpy as np
+from thousandaire.codec import get_date_type
+from thousandaire.data_classes import Data, Portfolio
+
+ARRAYS = ('ordinals', 'pnls', 'costs', 'positions', 'held')
+RESULT_FIELDS = ['pnl', 'cost', 'position']
+
+def dump_results(results, instruments, directory=None):
+    """
+    Write simulation results into a new temporary directory, and return its
+    descriptor, which is a dict of:
+        path: the directory.
+        instruments: instruments (columns) of the arrays.
+        encoding: the target which positions are bound to.
+        date_type: 'datetime' or 'date'.
+
+    results: a Data of simulation results, or anything with a length which
+        iterates over them, e.g. a ResultSpool. They are read in one pass.
+    directory: where to create the temporary directory; the system default
+        if None.
+    """
+    instruments = list(instruments)
+    shape = (len(results), len(instruments))
+    arrays = {
+        'ordinals': np.empty(shape[0], dtype=np.int64),
+        'pnls': np.empty(shape, dtype=np.float64),
+        'costs': np.empty(shape, dtype=np.float64),
+        'positions': np.empty(shape, dtype=np.float64),
+        'held': np.empty(shape, dtype=bool)}
+    encoding = None
+    date_types = set()
+    for index, today in enumerate(results):
+        if index == 0:
+            encoding = today.position.encoding
+        date_types.add(get_date_type([today.date]))
+        arrays['ordinals'][index] = today.date.toordinal()
+        arrays['pnls'][index] = [
+            today.pnl[instrument] for instrument in instruments]
+        arrays['costs'][index] = [
+            today.cost[instrument] for instrument in instruments]
+        arrays['positions'][index] = today.position.encode_to_nparray(encoding)
+        arrays['held'][index] = [
+            instrument in today.position for instrument in instruments]
+    if len(date_types) > 1:
+        raise TypeError('Dates should be all datetime or all date.')
+    path = tempfile.mkdtemp(prefix='results-', dir=directory)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, '%s.npy' % name), array)
+    return {
+        'path': path,
+        'instruments': instruments,
+        'encoding': encoding,
+        'date_type': date_types.pop() if date_types else get_date_type([])}
+
+def load_results(descriptor, remove=True):
+    """
+    Map results written by dump_results into SharedResults.
+
+    remove: whether to remove the files right after mapping them. Mapped
+        arrays stay readable until they are released.
+    """
+    arrays = {
+        name: np.load(
+            os.path.join(descriptor['path'], '%s.npy' % name), mmap_mode='r')
+        for name in ARRAYS}
+    if remove:
+        shutil.rmtree(descriptor['path'])
+    return SharedResults(
+        arrays, descriptor['instruments'], descriptor['encoding'],
+        descriptor['date_type'])
+
+class SharedResults:
+    """
+    Read-only sequence of simulation results over mapped arrays.
+
+    Rows are the same as those of a Data of results, i.e. (date, pnl, cost,
+    position), built when they are accessed. The arrays themselves are
+    available in `arrays`, e.g. `arrays['pnls']` of shape (days,
+    instruments). Pickling gives a Data of results.
+    """
+    def __init__(self, arrays, instruments, encoding, date_type):
+        self.arrays = arrays
+        self.instruments = instruments
+        self.encoding = encoding
+        self.to_date = (
+            datetime.datetime.fromordinal if date_type == 'datetime'
+            else datetime.date.fromordinal)
+        self.data_type = Data('result', RESULT_FIELDS).data_type
+
+    def __len__(self):
+        return len(self.arrays['ordinals'])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Results index out of range.')
+        position = Portfolio()
+        position.decode_from_nparray(
+            self.arrays['positions'][index], self.encoding,
+            self.arrays['held'][index])
+        return self.data_type(
+            self.to_date(int(self.arrays['ordinals'][index])),
+            dict(zip(self.instruments, self.arrays['pnls'][index].tolist())),
+            dict(zip(self.instruments, self.arrays['costs'][index].tolist())),
+            position)
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def __reduce__(self):
+        return self.to_data().__reduce_ex__(2)
+
+    def to_data(self):
+        """
+        Return the results as a Data.
+        """
+        results = Data('result', RESULT_FIELDS)
+        results.extend(self)
+        return results
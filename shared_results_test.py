@@ -0,0 +1,91 @@
+"""
+Unit tests for handing simulation results over by memory-mapped files.
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from thousandaire.benchmark.synthetic_data import generate_raw_data
+from thousandaire.constants import TRADING_INSTRUMENTS
+from thousandaire.data_classes import Data
+from thousandaire.shared_results import RESULT_FIELDS
+from thousandaire.shared_results import dump_results, load_results
+from thousandaire.simulation import build_simulator, initialize
+from thousandaire.simulation import load_settings
+
+class TestSharedResults(unittest.TestCase):
+    """
+    Unit test object for dump_results and load_results.
+    """
+    def setUp(self):
+        data_all = initialize(generate_raw_data(instruments=4, years=2))
+        settings = load_settings('thousandaire.benchmark.kdr_5_settings')
+        workdays = data_all['workdays']['TW']
+        settings.start_date = workdays[60 - len(workdays)].date
+        settings.end_date = workdays[-1].date
+        self.instruments = TRADING_INSTRUMENTS[settings.target]
+        self.results = build_simulator(settings, data_all).run()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_same(self, results):
+        """
+        Assert that results have the same rows as the simulation results.
+        """
+        self.assertEqual(len(results), len(self.results))
+        for expected, result in zip(self.results, results):
+            self.assertEqual(result.date, expected.date)
+            self.assertEqual(type(result.date), type(expected.date))
+            self.assertEqual(result.pnl, expected.pnl)
+            self.assertEqual(result.cost, expected.cost)
+            self.assertEqual(
+                dict(result.position.items()), dict(expected.position.items()))
+
+    def test_round_trip(self):
+        """
+        Loaded results should have the same rows, and the files should be
+        removed once they are mapped.
+        """
+        descriptor = dump_results(
+            self.results, self.instruments, self.directory)
+        self.assertEqual(os.path.dirname(descriptor['path']), self.directory)
+        results = load_results(descriptor)
+        self.assertFalse(os.path.exists(descriptor['path']))
+        self.assert_same(results)
+        self.assertEqual(
+            [today.date for today in results[-3:]],
+            [today.date for today in self.results[-3:]])
+        self.assertEqual(results[-1].date, self.results[-1].date)
+        self.assertEqual(
+            results.arrays['pnls'].shape,
+            (len(self.results), len(self.instruments)))
+        with self.assertRaises(IndexError):
+            _ = results[len(self.results)]
+
+    def test_pickle(self):
+        """
+        Pickled results should be a Data of results.
+        """
+        results = pickle.loads(pickle.dumps(load_results(
+            dump_results(self.results, self.instruments, self.directory))))
+        self.assertIsInstance(results, Data)
+        self.assert_same(results)
+
+    def test_empty(self):
+        """
+        No results should round-trip too.
+        """
+        results = load_results(dump_results(
+            Data('result', RESULT_FIELDS), self.instruments, self.directory))
+        self.assertEqual(len(results), 0)
+        self.assertEqual(list(results), [])
+        np.testing.assert_array_equal(
+            results.arrays['held'].shape, (0, len(self.instruments)))
+
+if __name__ == '__main__':
+    unittest.main()
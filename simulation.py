@@ -3,22 +3,42 @@ Fuctions for a process to simulate an alpha.
 """
 
 import argparse
+import contextlib
 import copy
 import importlib
 import json
 import os
 import pickle
-from multiprocessing import Process, Queue
+import shutil
+import sys
+import tempfile
+import traceback
 import pandas
-from thousandaire.constants import DATA_LIST_ALL, OFFICIAL_CURRENCY
+from thousandaire.constants import DATA_LIST_ALL, DERIVED_FIELDS
+from thousandaire.constants import OFFICIAL_CURRENCY, RESULT_STORE_DIR
 from thousandaire.constants import TRADING_CONFIGS
 from thousandaire.constants import TRADING_INSTRUMENTS, TRADING_REGIONS
 from thousandaire.data_loader import DataLoader
 from thousandaire.evaluator import Evaluator
+from thousandaire.memory import MEGABYTE, MemoryBudget
+from thousandaire.memory import UsageSampler, exit_on_terminate, get_size
+from thousandaire.profiler import Profiler
+from thousandaire.result_store import ResultStore
+from thousandaire.scheduler import ERROR, OK, Scheduler
+from thousandaire.shared_results import dump_results, load_results
 from thousandaire.simulator import Simulator
+from thousandaire.streaming import StreamingSimulator
+from thousandaire.time_budget import min_budget
+from thousandaire.tracing import disable, enable, merge, name_process
+from thousandaire.tracing import span, traced
+from thousandaire.version_store import LATEST, VersionStore
 
 PRICE_DATASET = 'price_dataset'
 PNL_FUNCTION = 'pnl_function'
+COST_MODEL = 'cost_model'
+# Wall time budget of an alpha without --wall_budget, in multiples of its CPU
+# time budget, leaving room for a busy machine.
+WALL_RATIO = 4
 
 def build_parser():
     """
@@ -41,24 +61,109 @@ def build_parser():
         '-o', '--output_path',
         help='Path to dump simulation results.',
         action='store')
+    parser.add_argument(
+        '-t', '--profile',
+        help='Record time spent in each phase of simulation and evaluation.',
+        action='store_true')
+    parser.add_argument(
+        '--profile_sample_interval',
+        help='With --profile, also record a per-day breakdown of phases '
+             'every N simulated days.',
+        type=int, default=0)
+    parser.add_argument(
+        '-r', '--result_store',
+        help='Store daily pnl into the result store (at the given path, or '
+             'the default one) and report the max correlation against '
+             'alphas already there.',
+        nargs='?', const=RESULT_STORE_DIR, default=None)
+    parser.add_argument(
+        '-v', '--data_versions',
+        help='Pin datasets to versions, as dataset=version separated by '
+             'spaces. Other datasets are at their latest version.',
+        nargs='*', default=[])
+    parser.add_argument(
+        '--streaming',
+        help='Read data year by year and keep only the lookback window of '
+             'each alpha in memory, spilling results to disk.',
+        action='store_true')
+    parser.add_argument(
+        '-m', '--memory',
+        help='Report the peak RSS of every alpha process and indicator '
+             'process, and the size of data bound by every alpha.',
+        action='store_true')
+    parser.add_argument(
+        '--memory_budget',
+        help='Abort an alpha whose process, with its indicator processes, '
+             'uses more than this many megabytes.',
+        type=float, default=None)
+    parser.add_argument(
+        '--time_budget',
+        help='Stop an alpha whose process, with its indicator processes, '
+             'uses more than this many CPU seconds, or than its own '
+             'time_budget setting if that is tighter.',
+        type=float, default=None)
+    parser.add_argument(
+        '--wall_budget',
+        help='Stop an alpha which runs for more than this many seconds of '
+             'wall time, %d times its CPU time budget by default.'
+             % WALL_RATIO,
+        type=float, default=None)
+    parser.add_argument(
+        '--day_time_budget',
+        help='Stop an alpha whose generate uses more than this many CPU '
+             'seconds on a day, or than its own day_time_budget setting if '
+             'that is tighter.',
+        type=float, default=None)
+    parser.add_argument(
+        '--processes',
+        help='Max number of alphas simulated at the same time, the number '
+             'of CPUs by default.',
+        type=int, default=None)
+    parser.add_argument(
+        '--speculation',
+        help='When a process is idle, start again an alpha which has run '
+             'for more than this many times the median time of finished '
+             'alphas, and keep the first results. Only for alphas which '
+             'give the same results every run.',
+        type=float, default=None)
+    parser.add_argument(
+        '--trace',
+        help='Trace spans of the run in all processes into this Chrome '
+             'trace-event JSON file.',
+        default=None)
     return parser.parse_args()
 
-def initialize():
+@traced('initialize')
+def initialize(raw_data=None, versions=None):
     """
-    Load all available dataset and bind them with workdays.
+    Load all available dataset, bind them with workdays and compute their
+    derived fields.
 
-    Return bound data, which is a dict of regions to Dataset.
+    raw_data: a dict of dataset names to Dataset. If None, all datasets in
+        DATA_LIST_ALL will be loaded by DataLoader.
+    versions: a dict of dataset names to pinned version ids, used when
+        loading by DataLoader. Other datasets are at their latest version.
+
+    Return bound data, which is a dict of regions to Dataset. Version ids of
+    loaded datasets are kept in bound_data['versions'].
     """
-    raw_data = DataLoader(DATA_LIST_ALL).get_all()
+    data_versions = {}
+    if raw_data is None:
+        loader = DataLoader(DATA_LIST_ALL, versions)
+        raw_data = loader.get_all()
+        data_versions = loader.get_versions()
     workdays_all = {
         region : raw_data['workdays'][region]
         for region in TRADING_REGIONS if region in raw_data['workdays']}
     bound_data = {}
     for region, workdays in workdays_all.items():
         bound_data[region] = copy.deepcopy(raw_data)
-        for dataset in bound_data[region].values():
+        for name, dataset in bound_data[region].items():
             dataset.set_workdays(workdays)
+            if name in DERIVED_FIELDS:
+                dataset.derive_fields(DERIVED_FIELDS[name])
     bound_data['workdays'] = workdays_all
+    bound_data['versions'] = data_versions
     return bound_data
 
 def extract_data(raw_data, data_list, price_dataset, region):
@@ -99,30 +204,119 @@ def convert_to_dataframe(results, instruments):
             form['pnl'].append(today.pnl[instrument])
             form['cost'].append(today.cost[instrument])
             form['position'].append(
-                today.position_raw.get(instrument, 0.))
+                today.position.get(instrument, 0.))
     return pandas.DataFrame(data=form)
 
-def handle_result(alpha_path, results_set, quiet_mode, output_path):
+def handle_result(alpha_path, results_set, quiet_mode, output_path,
+                  report=None):
     """
     Handle results of simulation.
+
+    results_set: results, evaluation results, instruments and profile
+        results of the simulation, or None if it failed.
+    report: an optional dict dumped with results, of e.g.:
+        data_versions: version ids of datasets the simulation used, so
+            that the run can be reproduced.
+        memory_results: a memory report of the alpha, also printed.
+        status: how the simulation ended (see scheduler), and error: why
+            it failed, also printed (to stderr even in quiet mode).
     """
-    results, eval_results, instruments = results_set
+    results, eval_results, instruments, profile_results = (
+        results_set or (None, None, None, None))
+    report = {} if report is None else report
     if output_path:
         output_data = {
             'simulation_results': results,
-            'evaluation_results': eval_results}
+            'evaluation_results': eval_results,
+            'data_versions': report.get('data_versions')}
+        output_data.update(
+            (key, value) for key, value in report.items() if value is not None)
+        if profile_results is not None:
+            output_data['profile_results'] = profile_results
         with open(os.path.join(output_path, 'results'), 'wb') as file:
             pickle.dump(output_data, file)
-    if not quiet_mode:
+    if results_set is None:
+        print('%s %s:' % (alpha_path, report.get('status')),
+              report.get('error'), sep='\n', file=sys.stderr)
+    elif not quiet_mode:
         with pandas.option_context(
                 'display.max_rows', None, 'display.max_columns', None):
             print(alpha_path,
                   convert_to_dataframe(results, instruments),
                   json.dumps(eval_results, indent=1), sep='\n')
+            if profile_results is not None:
+                print(json.dumps(profile_results, indent=1, default=str))
+            if report.get('memory_results') is not None:
+                print(json.dumps(report['memory_results'], indent=1))
+
+def store_result(store, alpha_path, results, quiet_mode):
+    """
+    Report the max correlation of the alpha against the pool in the result
+    store, then add the alpha into the store.
+    Alphas without submission_id are stored by their settings path.
+    """
+    settings = load_settings(alpha_path)
+    submission_id = settings.submission_id or alpha_path
+    dates = [today.date for today in results]
+    pnl = [sum(today.pnl.values()) for today in results]
+    most_correlated, correlation = store.max_correlation(
+        dates, pnl, exclude=submission_id)
+    store.add(
+        submission_id, results, author=settings.author,
+        submission_date=settings.submission_date,
+        alpha_settings_path=alpha_path)
+    if not quiet_mode:
+        print('Max correlation of %s: %s (%s)'
+              % (alpha_path, correlation, most_correlated))
+    return most_correlated, correlation
 
-def simulate(results_queue, data_all, alpha_settings_path, skip_evaluation):
+def store_failure(store, alpha_path, outcome):
     """
-    Act the process of simulating.
+    Add an alpha whose simulation failed into the result store, with the
+    status and error of its outcome (see scheduler) and no results.
+    Alphas whose settings cannot be loaded are stored by their settings
+    path.
+    """
+    try:
+        settings = load_settings(alpha_path)
+    except Exception: # pylint: disable=broad-except
+        settings = None
+    store.add(
+        getattr(settings, 'submission_id', None) or alpha_path, [],
+        author=getattr(settings, 'author', None),
+        submission_date=getattr(settings, 'submission_date', None),
+        alpha_settings_path=alpha_path, status=outcome['status'],
+        error=outcome['error'])
+
+def build_simulator(settings, data_all, profiler=None, streaming=False):
+    """
+    Build a Simulator for the given settings on the bound data.
+
+    end_date of settings will be clipped to the last workday of its region.
+    streaming: build a StreamingSimulator instead, which reads data by
+        itself at data_all['versions'].
+    """
+    config = TRADING_CONFIGS[settings.target]
+    if streaming:
+        return StreamingSimulator(
+            settings, config[PNL_FUNCTION](
+                OFFICIAL_CURRENCY[settings.target[1]],
+                TRADING_INSTRUMENTS[settings.target], config.get(COST_MODEL)),
+            data_all['versions'], profiler)
+    _, region = settings.target
+    if (settings.end_date is None or
+            settings.end_date > data_all['workdays'][region][-1].date):
+        settings.end_date = data_all['workdays'][region][-1].date
+    data_required = extract_data(
+        data_all, settings.data_list, config[PRICE_DATASET], region)
+    pnl_function = config[PNL_FUNCTION](
+        OFFICIAL_CURRENCY[region], TRADING_INSTRUMENTS[settings.target],
+        config.get(COST_MODEL))
+    return Simulator(settings, data_required, pnl_function, profiler)
+
+def load_settings(alpha_settings_path):
+    """
+    Import the alpha settings module and return its valid AlphaSettings.
     """
     try:
         settings = importlib.import_module(alpha_settings_path).AlphaSettings()
@@ -133,49 +327,210 @@ def simulate(results_queue, data_all, alpha_settings_path, skip_evaluation):
                           % alpha_settings_path) from error
     if not settings.is_valid():
         raise TypeError("Incorrect type in %s settings" % alpha_settings_path)
-    _, region = settings.target
-    if (settings.end_date is None or
-            settings.end_date > data_all['workdays'][region][-1].date):
-        settings.end_date = data_all['workdays'][region][-1].date
-    data_required = extract_data(
-        data_all, settings.data_list,
-        TRADING_CONFIGS[settings.target][PRICE_DATASET], region)
-    pnl_function = TRADING_CONFIGS[settings.target][PNL_FUNCTION](
-        OFFICIAL_CURRENCY[region], TRADING_INSTRUMENTS[settings.target])
-    results = Simulator(settings, data_required, pnl_function).run()
+    return settings
+
+def run_alpha(data_all, alpha_settings_path, skip_evaluation, options=None,
+              memory_results=None):
+    """
+    Simulate and evaluate an alpha on the bound data.
+
+    options: an optional dict of:
+        profile_sample_interval: if not None, profile the simulation and
+            the evaluation, sampling a per-day breakdown every that many
+            days (0 for no sampling).
+        streaming: simulate by StreamingSimulator, see build_simulator.
+        parameters: if given, override these parameters of the alpha
+            settings, e.g. for a point of a parameter sweep.
+        day_time_budget: if given, CPU seconds generate may use on a day,
+            or day_time_budget of the settings if that is tighter.
+    memory_results: an optional dict to fill with the size in bytes of the
+        data bound by the simulator (`data_size`, None in streaming), and
+        the peak usage (PSS, see memory) in bytes of this process during
+        the simulation and after the evaluation (`process_peak_usage`) and
+        of each indicator (`indicators`).
+
+    Return tradable instruments, simulation results, evaluation results and
+    profile results.
+    """
+    options = {} if options is None else options
+    settings = load_settings(alpha_settings_path)
+    if options.get('parameters'):
+        settings.parameters = dict(
+            settings.parameters, **options['parameters'])
+    settings.day_time_budget = min_budget(
+        settings.day_time_budget, options.get('day_time_budget'))
+    profiler = (
+        Profiler(options['profile_sample_interval'])
+        if options.get('profile_sample_interval') is not None else None)
+    with span('build_simulator'):
+        simulator = build_simulator(
+            settings, data_all, profiler, options.get('streaming', False))
+    sampler = None
+    if memory_results is not None:
+        memory_results['data_size'] = (
+            None if options.get('streaming') else get_size(simulator.data))
+        memory_results['indicators'] = {}
+        sampler = UsageSampler()
+    # Indicators are forked after sampling stops, see UsageSampler.
+    with sampler if sampler is not None else contextlib.nullcontext():
+        results = simulator.run()
     eval_results = (
-        Evaluator().run(TRADING_INSTRUMENTS[settings.target], results)
+        Evaluator().run(
+            TRADING_INSTRUMENTS[settings.target], results, profiler,
+            memory=(
+                memory_results['indicators']
+                if memory_results is not None else None))
         if not skip_evaluation else None)
-    results_queue.put(
-        (alpha_settings_path, TRADING_INSTRUMENTS[settings.target],
-         results, eval_results))
+    if memory_results is not None:
+        memory_results['process_peak_usage'] = sampler.sample()
+    return (
+        TRADING_INSTRUMENTS[settings.target], results, eval_results,
+        profiler.get_results() if profiler is not None else None)
+
+def simulate(data_all, alpha_settings_path, options):
+    """
+    Act the process of simulating, run as a job of Scheduler.
+    Return what run_alpha returns, where simulation results are handed over
+    by a descriptor of dump_results, and a memory report of run_alpha if
+    memory.
+
+    options: a dict of skip_evaluation and options of run_alpha, plus
+        memory (whether to report memory) and directory (where to dump
+        results, see dump_results).
+    """
+    exit_on_terminate()
+    name_process(alpha_settings_path)
+    memory_results = {} if options['memory'] else None
+    with span('simulate', alpha=alpha_settings_path):
+        instruments, results, eval_results, profile_results = run_alpha(
+            data_all, alpha_settings_path, options['skip_evaluation'],
+            options, memory_results)
+        with span('dump_results'):
+            descriptor = dump_results(
+                results, instruments, options['directory'])
+    return (
+        instruments, descriptor, eval_results, profile_results,
+        memory_results)
+
+def discard(result):
+    """
+    Remove simulation results handed over by a losing attempt of simulate.
+    """
+    if result['status'] == OK:
+        shutil.rmtree(result['result'][1]['path'], ignore_errors=True)
+
+def build_jobs(args, directory=None):
+    """
+    Return bound data, jobs of simulate for Scheduler, and error results
+    (as Scheduler gives) of alphas whose settings cannot be loaded, which
+    get no job so that the other alphas still run.
+
+    Every job has the CPU time budget of its alpha: the tighter of its
+    settings and the command line, and its wall time budget: --wall_budget,
+    or WALL_RATIO times its CPU time budget.
+
+    directory: where jobs dump their results; the system default if None.
+    """
+    data_all = initialize_data(args)
+    options = {
+        'skip_evaluation': args.skip_evaluation,
+        'profile_sample_interval': (
+            args.profile_sample_interval if args.profile else None),
+        'streaming': args.streaming,
+        'memory': args.memory,
+        'day_time_budget': args.day_time_budget,
+        'directory': directory}
+    jobs = {}
+    failures = {}
+    for path in args.alpha_settings_paths:
+        try:
+            settings = load_settings(path)
+        except Exception: # pylint: disable=broad-except
+            failures[path] = {'status': ERROR, 'error': traceback.format_exc()}
+            continue
+        time_budget = min_budget(settings.time_budget, args.time_budget)
+        wall_budget = args.wall_budget
+        if wall_budget is None and time_budget is not None:
+            wall_budget = WALL_RATIO * time_budget
+        jobs[path] = ((data_all, path, options), time_budget, wall_budget)
+    return data_all, jobs, failures
+
+def initialize_data(args):
+    """
+    Return bound data at the pinned versions of the parsed arguments, or
+    only the versions in streaming.
+    """
+    versions = dict(pin.split('=', 1) for pin in args.data_versions)
+    if not args.streaming:
+        return initialize(versions=versions)
+    store = VersionStore()
+    return {'versions': {
+        name: store.resolve(name, versions.get(name, LATEST))
+        for name in DATA_LIST_ALL}}
+
+def run_simulations(args):
+    """
+    Simulate alphas of the parsed arguments by a Scheduler, and handle
+    their results, including the status and error of alphas which failed.
+
+    Jobs dump their results into a temporary directory which is removed at
+    the end, together with results of jobs terminated before handing them
+    over.
+    """
+    with tempfile.TemporaryDirectory(prefix='results-') as directory:
+        data_all, jobs, outcomes = build_jobs(args, directory)
+        budget = (
+            MemoryBudget(int(args.memory_budget * MEGABYTE))
+            if args.memory_budget is not None else None)
+        outcomes.update(Scheduler(
+            args.processes, budget, args.speculation).run(
+                simulate, jobs, discard))
+        store = (
+            ResultStore(args.result_store)
+            if args.result_store is not None else None)
+        for path in args.alpha_settings_paths:
+            report = {
+                'data_versions': data_all['versions'],
+                'status': outcomes[path]['status'],
+                'error': outcomes[path].get('error'),
+                'memory_results': (
+                    budget.get_results(path) if budget is not None else None)}
+            if outcomes[path]['status'] != OK:
+                handle_result(
+                    path, None, args.quiet_mode, args.output_path, report)
+                if store is not None:
+                    store_failure(store, path, outcomes[path])
+                continue
+            (instruments, descriptor, eval_results, profile_results,
+             memory_report) = outcomes[path]['result']
+            with span('receive', alpha=path):
+                results = load_results(descriptor)
+            if memory_report is not None:
+                report['memory_results'] = dict(
+                    memory_report, **report['memory_results'] or {})
+            with span('handle_result', alpha=path):
+                handle_result(
+                    path,
+                    (results, eval_results, instruments, profile_results),
+                    args.quiet_mode, args.output_path, report)
+            if store is not None:
+                store_result(store, path, results, args.quiet_mode)
 
 def main():
     """
     Run the simulation process.
     """
     args = build_parser()
-    data_all = initialize()
-    processes = []
-    results_queue = Queue()
-    for path in args.alpha_settings_paths:
-        process = Process(
-            target=simulate,
-            args=(
-                results_queue, data_all,
-                path, args.skip_evaluation))
-        process.start()
-        processes.append(process)
-    unordered_results = {}
-    while any(process.is_alive() for process in processes):
-        if not results_queue.empty():
-            path, instruments, results, eval_results = results_queue.get()
-            unordered_results[path] = (results, eval_results, instruments)
-    for process in processes:
-        process.join()
-    for path in args.alpha_settings_paths:
-        handle_result(
-            path, unordered_results[path], args.quiet_mode, args.output_path)
+    directory = enable() if args.trace is not None else None
+    try:
+        with span('main', alphas=len(args.alpha_settings_paths)):
+            run_simulations(args)
+    finally:
+        if directory is not None:
+            disable()
+            count = merge(directory, args.trace)
+            if not args.quiet_mode:
+                print('%d trace events written to %s' % (count, args.trace))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,403 @@
+"""
+Long-running simulation server which keeps the bound data resident.
+
+Every `simulation.py` run pays for imports, loading and binding data before
+the first alpha runs. The server does it once, then accepts alpha settings
+submissions over local HTTP, runs each of them in a worker process forked
+from the warm data (at most `workers` at a time) by a single-threaded
+dispatcher process, and streams results back
+as newline-delimited JSON, one line per alpha as soon as it is done. Newly
+crawled data are picked up on the next submission without a restart.
+
+Serve:
+    python -m thousandaire.simulation_server serve --workers 4
+Submit:
+    python -m thousandaire.simulation_server submit \
+        -p thousandaire.benchmark.kdr_5_settings
+"""
+
+import argparse
+import http.client
+import http.server
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import threading
+import traceback
+from thousandaire.constants import DATA_DIR, DATA_LIST_ALL
+from thousandaire.simulation import initialize, run_alpha
+from thousandaire.version_store import VersionStore
+
+DEFAULT_PORT = 8642
+
+def build_parser():
+    """
+    Get the server or submission options.
+    """
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve = subparsers.add_parser('serve', help='Run the server.')
+    serve.add_argument(
+        '-w', '--workers', help='Number of worker processes.',
+        type=int, default=os.cpu_count())
+    submit_parser = subparsers.add_parser(
+        'submit', help='Submit alphas to a running server.')
+    submit_parser.add_argument(
+        '-p', '--alpha_settings_paths',
+        help='Paths of alpha settings files, separated by spaces.',
+        nargs='*')
+    submit_parser.add_argument(
+        '-s', '--skip_evaluation',
+        help='Running the simulation without evaluation..',
+        action='store_true')
+    submit_parser.add_argument(
+        '-t', '--profile',
+        help='Record time spent in each phase of simulation and evaluation.',
+        action='store_true')
+    for sub in (serve, submit_parser):
+        sub.add_argument(
+            '--port', help='Port on localhost.', type=int,
+            default=DEFAULT_PORT)
+    return parser.parse_args()
+
+def get_data_stamp():
+    """
+    Return latest version ids of all datasets (or modification times of
+    legacy data files), to detect new data.
+    """
+    store = VersionStore()
+    stamp = {}
+    for data_name in DATA_LIST_ALL:
+        path = os.path.join(DATA_DIR, data_name)
+        stamp[data_name] = store.resolve(data_name) or (
+            os.path.getmtime(path) if os.path.isfile(path) else None)
+    return stamp
+
+def summarize(alpha_settings_path, alpha_results, data_versions=None):
+    """
+    Convert results of run_alpha into a JSON-serializable dict.
+    """
+    _, results, eval_results, profile_results = alpha_results
+    return {
+        'alpha_settings_path': alpha_settings_path,
+        'status': 'ok',
+        'data_versions': data_versions,
+        'dates': [today.date.isoformat() for today in results],
+        'pnl': [sum(today.pnl.values()) for today in results],
+        'cost': [sum(today.cost.values()) for today in results],
+        'evaluation_results': eval_results,
+        'profile_results': profile_results}
+
+def run_job(connection, data_all, job):
+    """
+    Run a submitted alpha in a worker and send its summary by connection.
+    Errors are reported in the summary instead of killing the worker.
+    """
+    alpha_settings_path, skip_evaluation, profile = job
+    try:
+        results = run_alpha(
+            data_all, alpha_settings_path, skip_evaluation,
+            {'profile_sample_interval': 0 if profile else None})
+        summary = summarize(
+            alpha_settings_path, results, data_all['versions'])
+    except Exception: # pylint: disable=broad-except
+        summary = {
+            'alpha_settings_path': alpha_settings_path,
+            'status': 'error',
+            'error': traceback.format_exc()}
+    connection.send(summary)
+    connection.close()
+
+class Dispatcher:
+    """
+    Run submitted jobs in worker processes, at most `workers` at a time.
+
+    It runs in a single-threaded process of its own, started before the
+    HTTP server starts any thread, since forking a multithreaded process may
+    give a child locks held by other threads forever. Through its connection
+    it receives (request id, jobs) and sends (request id, summary) for every
+    job, or (None, data stamp) when data are loaded. None stops it once its
+    jobs are done.
+
+    Data are refreshed on every submission. Jobs already submitted keep the
+    data they were submitted with.
+    """
+    def __init__(self, connection, workers):
+        self.connection = connection
+        self.workers = workers
+        self.data_stamp = None
+        self.data_all = None
+        self.pending = []
+        self.running = {}
+
+    def refresh(self):
+        """
+        Reload data if data files have changed, and send the new stamp.
+        """
+        data_stamp = get_data_stamp()
+        if data_stamp == self.data_stamp:
+            return
+        # Pin the versions just seen, in case a crawl commits more.
+        self.data_all = initialize(versions={
+            name: version for name, version in data_stamp.items()
+            if isinstance(version, str)})
+        self.data_stamp = data_stamp
+        self.connection.send((None, data_stamp))
+
+    def run(self):
+        """
+        Serve submissions until stopped.
+        """
+        self.refresh()
+        stopped = False
+        while not stopped or self.pending or self.running:
+            waited = list(self.running) + ([] if stopped else [self.connection])
+            for ready in multiprocessing.connection.wait(waited):
+                if ready is self.connection:
+                    stopped = not self.receive_jobs()
+                else:
+                    self.receive_summary(ready)
+            self.start_workers()
+
+    def receive_jobs(self):
+        """
+        Receive a submission and queue its jobs.
+        Return False if the dispatcher is stopped.
+        """
+        try:
+            message = self.connection.recv()
+        except EOFError:
+            message = None
+        if message is None:
+            return False
+        request_id, jobs = message
+        self.refresh()
+        self.pending.extend((request_id, job, self.data_all) for job in jobs)
+        return True
+
+    def receive_summary(self, receiver):
+        """
+        Receive the summary of a job from its worker and send it on.
+        """
+        request_id, job, process = self.running.pop(receiver)
+        try:
+            summary = receiver.recv()
+        except EOFError:
+            summary = None
+        receiver.close()
+        process.join()
+        if summary is None:
+            summary = {
+                'alpha_settings_path': job[0],
+                'status': 'error',
+                'error': 'Worker exited with code %s.' % process.exitcode}
+        try:
+            self.connection.send((request_id, summary))
+        except OSError:
+            pass
+
+    def start_workers(self):
+        """
+        Start queued jobs in free slots.
+
+        Each job runs in a new process, so that alpha modules are always
+        re-imported and jobs cannot affect each other.
+        """
+        while self.pending and len(self.running) < self.workers:
+            request_id, job, data_all = self.pending.pop(0)
+            receiver, sender = multiprocessing.Pipe(False)
+            process = multiprocessing.get_context('fork').Process(
+                target=run_job, args=(sender, data_all, job))
+            process.start()
+            sender.close()
+            self.running[receiver] = (request_id, job, process)
+
+def dispatch(connection, workers):
+    """
+    Run a Dispatcher in this process.
+    """
+    Dispatcher(connection, workers).run()
+
+class SimulationServer(http.server.ThreadingHTTPServer):
+    """
+    HTTP server passing submissions to a dispatcher process holding the
+    bound data.
+    """
+    def __init__(self, port, workers):
+        # Fork the dispatcher first, while this process has a single thread.
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.dispatcher = multiprocessing.get_context('fork').Process(
+            target=dispatch, args=(child_connection, workers))
+        self.dispatcher.start()
+        child_connection.close()
+        # Wait until the data are loaded.
+        _, self.data_stamp = self.connection.recv()
+        http.server.ThreadingHTTPServer.__init__(
+            self, ('127.0.0.1', port), SimulationHandler)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.requests = {}
+        threading.Thread(target=self.route, daemon=True).start()
+
+    def route(self):
+        """
+        Forward summaries from the dispatcher to the queues of their
+        requests. If the dispatcher dies, put None into all of them.
+        """
+        while True:
+            try:
+                request_id, content = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                if request_id is None:
+                    self.data_stamp = content
+                elif request_id in self.requests:
+                    self.requests[request_id].put(content)
+        with self.lock:
+            for summaries in self.requests.values():
+                summaries.put(None)
+            self.requests = None
+
+    def submit(self, jobs):
+        """
+        Pass jobs to the dispatcher.
+        Return a queue.Queue into which their summaries will be put.
+        """
+        summaries = queue.Queue()
+        with self.lock:
+            if self.requests is None:
+                summaries.put(None)
+                return summaries
+            self.request_count += 1
+            request_id = self.request_count
+            self.requests[request_id] = summaries
+            self.connection.send((request_id, jobs))
+        return summaries
+
+    def forget(self, summaries):
+        """
+        Stop forwarding summaries into the queue of a finished request.
+        """
+        with self.lock:
+            if self.requests is not None:
+                self.requests = {
+                    request_id: other
+                    for request_id, other in self.requests.items()
+                    if other is not summaries}
+
+    def server_close(self):
+        """
+        Close the socket and stop the dispatcher once its jobs are done.
+        """
+        http.server.ThreadingHTTPServer.server_close(self)
+        with self.lock:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+        self.dispatcher.join()
+        self.connection.close()
+
+class SimulationHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Handle submissions (POST /simulate) and status queries (GET /status).
+    """
+    def do_GET(self): # pylint: disable=invalid-name
+        """
+        Report datasets the server is using.
+        """
+        if self.path != '/status':
+            self.send_error(404)
+            return
+        self.send_json(200, {'data_stamp': self.server.data_stamp})
+
+    def do_POST(self): # pylint: disable=invalid-name
+        """
+        Run submitted alphas and stream their results.
+
+        The request body is a JSON object with `alpha_settings_paths`, and
+        optional `skip_evaluation` and `profile` flags.
+        """
+        if self.path != '/simulate':
+            self.send_error(404)
+            return
+        try:
+            request = json.loads(self.rfile.read(
+                int(self.headers.get('Content-Length', 0))))
+            jobs = [
+                (path, bool(request.get('skip_evaluation')),
+                 bool(request.get('profile')))
+                for path in request['alpha_settings_paths']]
+        except (ValueError, KeyError, TypeError) as error:
+            self.send_json(400, {'error': str(error)})
+            return
+        summaries = self.server.submit(jobs)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        try:
+            for job in jobs:
+                summary = summaries.get()
+                if summary is None:
+                    summary = {
+                        'alpha_settings_path': job[0],
+                        'status': 'error',
+                        'error': 'Dispatcher exited.'}
+                    summaries.put(None)
+                self.wfile.write(json.dumps(
+                    summary, default=str).encode('utf-8') + b'\n')
+                self.wfile.flush()
+        finally:
+            self.server.forget(summaries)
+
+    def send_json(self, code, content):
+        """
+        Send a JSON response.
+        """
+        body = json.dumps(content, default=str).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def submit(alpha_settings_paths, port=DEFAULT_PORT, skip_evaluation=False,
+           profile=False):
+    """
+    Submit alphas to a running server.
+    Yield summaries of alphas in the order they are done.
+    """
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request(
+        'POST', '/simulate',
+        json.dumps({
+            'alpha_settings_paths': alpha_settings_paths,
+            'skip_evaluation': skip_evaluation,
+            'profile': profile}),
+        {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    if response.status != 200:
+        raise IOError(response.read().decode('utf-8'))
+    for line in response:
+        yield json.loads(line)
+    connection.close()
+
+def main():
+    """
+    Serve, or submit alphas to the server.
+    """
+    args = build_parser()
+    if args.command == 'serve':
+        with SimulationServer(args.port, args.workers) as server:
+            server.serve_forever()
+    else:
+        for summary in submit(
+                args.alpha_settings_paths, args.port,
+                args.skip_evaluation, args.profile):
+            print(json.dumps(summary, indent=1))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Unit tests for the simulation server.
+"""
+
+import http.client
+import json
+import threading
+import unittest
+from unittest import mock
+from thousandaire.benchmark.synthetic_data import generate_raw_data
+from thousandaire.simulation import initialize
+from thousandaire.simulation_server import SimulationServer, submit
+
+ALPHA = 'thousandaire.benchmark.kdr_5_settings'
+
+class TestSimulationServer(unittest.TestCase):
+    """
+    Unit test object for SimulationServer.
+    """
+    @classmethod
+    def setUpClass(cls):
+        # Synthetic data covering the dates of the alpha settings.
+        data_all = initialize(generate_raw_data(instruments=6, years=6))
+        stamps = iter([{'currency_price_tw': 'v1'}])
+        with mock.patch(
+                'thousandaire.simulation_server.get_data_stamp',
+                side_effect=lambda: next(stamps, {'currency_price_tw': 'v2'})):
+            with mock.patch(
+                    'thousandaire.simulation_server.initialize',
+                    return_value=data_all):
+                # The dispatcher is forked here, with the mocks.
+                cls.server = SimulationServer(0, 2)
+        cls.port = cls.server.server_address[1]
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.thread.join()
+        cls.server.server_close()
+
+    def get(self, path):
+        """
+        Return the status and the JSON content of a GET request.
+        """
+        connection = http.client.HTTPConnection('127.0.0.1', self.port)
+        connection.request('GET', path)
+        response = connection.getresponse()
+        content = response.read()
+        connection.close()
+        return response.status, (
+            json.loads(content) if response.status == 200 else None)
+
+    def test_submit(self):
+        """
+        Every submitted alpha should get its summary, errors included.
+        """
+        summaries = list(submit(
+            [ALPHA, 'thousandaire.no_such_settings', ALPHA], self.port,
+            skip_evaluation=True))
+        self.assertEqual(len(summaries), 3)
+        by_status = {}
+        for summary in summaries:
+            by_status.setdefault(summary['status'], []).append(summary)
+        self.assertEqual(len(by_status['ok']), 2)
+        self.assertIn('no_such_settings', by_status['error'][0]['error'])
+        result = by_status['ok'][0]
+        self.assertEqual(result['alpha_settings_path'], ALPHA)
+        self.assertEqual(len(result['dates']), len(result['pnl']))
+        self.assertGreater(len(result['dates']), 100)
+        self.assertEqual(result, by_status['ok'][1])
+
+    def test_concurrent_submissions(self):
+        """
+        Concurrent submissions should each get their own summaries.
+        """
+        results = {}
+        def run(name):
+            results[name] = list(submit([ALPHA], self.port, True))
+        threads = [
+            threading.Thread(target=run, args=(name,)) for name in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(
+            [len(summaries) for summaries in results.values()], [1, 1, 1])
+
+    def test_status(self):
+        """
+        The status should report the data the server uses.
+        """
+        status, content = self.get('/status')
+        self.assertEqual(status, 200)
+        self.assertIn(
+            content['data_stamp'], [{'currency_price_tw': version}
+                                    for version in ('v1', 'v2')])
+        self.assertEqual(self.get('/unknown')[0], 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,9 @@ Simulator that simulates trading process and estimates profits and losses.
 import copy
 import uuid
 from thousandaire.data_classes import Data
-from thousandaire.constants import TRADING_INSTRUMENTS
+from thousandaire.profiler import NullProfiler
+from thousandaire.time_budget import cpu_limit
+from thousandaire.tracing import traced
 
 def decode_data(data):
     """
@@ -26,12 +28,16 @@ class Simulator:
     """
     Handler to simulate a single alpha.
     """
-    def __init__(self, settings, data, pnl_function):
+    def __init__(self, settings, data, pnl_function, profiler=None):
+        """
+        profiler: an optional Profiler to record time spent in each phase.
+        """
         self.pnl_function = pnl_function
+        self.profiler = NullProfiler() if profiler is None else profiler
         self.data = decode_data(data)
         self.settings = settings
         self.__result = Data(
-            'result', ['pnl', 'cost', 'position_raw', 'position_np'])
+            'result', ['pnl', 'cost', 'position'])
         self.__portfolio = list()
         self.__key = uuid.uuid4()
         self.initialize_data()
@@ -46,11 +52,10 @@ class Simulator:
         liquidation = False
         if date == end_date:
             liquidation = True
-        pnl, cost = self.pnl_function(
-            self.__portfolio, self.data['price'], liquidation)
-        self.__result.append(
-            (date, pnl, cost, self.__portfolio[-1],
-             self.__portfolio[-1].encode_to_nparray(self.settings.target)))
+        with self.profiler.phase('pnl_function'):
+            pnl, cost = self.pnl_function(
+                self.__portfolio, self.data['price'], liquidation)
+        self.__result.append((date, pnl, cost, self.__portfolio[-1]))
 
     def move_forward(self):
         """
@@ -61,31 +66,61 @@ class Simulator:
         self.data['price'].move_forward(self.__key)
         self.data['workdays'].move_forward(auth_key=self.__key)
 
-    def run(self):
+    @traced('Simulator.run')
+    def run(self, alpha_formula=None, stop_date=None):
         """
         Start the simulation.
+
+        alpha_formula: an alpha formula to continue with, e.g. one from a
+            previous window of a streaming simulation. If None, a new one is
+            built by build_formula.
+        stop_date: stop before generating the portfolio of this date,
+            which is end_date by default. Positions are liquidated only on
+            end_date.
         """
-        alpha_formula = self.settings.alpha(
-            self.settings.start_date, self.data['others'],
-            self.settings.parameters)
-        while self.data['workdays'].get_today() < self.settings.end_date:
-            portfolio = alpha_formula(
-                self.data['workdays'].get_today(), self.data['others'])
+        if alpha_formula is None:
+            alpha_formula = self.build_formula()
+        if stop_date is None:
+            stop_date = self.settings.end_date
+        calendar, _ = self.data['workdays'].get_calendar()
+        stop_index = calendar.index_on_or_after(stop_date)
+        while self.data['workdays'].get_index() < stop_index:
+            self.profiler.start_day(self.data['workdays'].get_today())
+            with self.profiler.phase('generate'), cpu_limit(
+                    self.settings.day_time_budget,
+                    'Generate on %s is over the time budget.'
+                    % self.data['workdays'].get_today()):
+                portfolio = alpha_formula(
+                    self.data['workdays'].get_today(), self.data['others'])
             try:
-                portfolio.normalize()
-            except ZeroDivisionError as error:
-                raise ("Zero position on %s"
-                       % self.data['workdays'].get_today()) from error
-            if not portfolio.is_tradable(
-                    TRADING_INSTRUMENTS[self.settings.target]):
+                with self.profiler.phase('bind'):
+                    portfolio.bind(self.settings.target)
+            except KeyError as error:
                 raise KeyError("Some instruments on %s are not tradable."
-                               % self.data['workdays'].get_today())
+                               % self.data['workdays'].get_today()) from error
+            try:
+                with self.profiler.phase('normalize'):
+                    portfolio.normalize()
+            except ZeroDivisionError as error:
+                raise ZeroDivisionError(
+                    "Zero position on %s"
+                    % self.data['workdays'].get_today()) from error
             self.__portfolio.append(portfolio)
-            self.move_forward()
+            with self.profiler.phase('move_forward'):
+                self.move_forward()
             self.generate_pnl(
                 self.data['workdays'].get_today(), self.settings.end_date)
+            self.profiler.end_day()
         return self.__result
 
+    def build_formula(self):
+        """
+        Return a new alpha formula of the settings on the data.
+        """
+        return self.settings.alpha(
+            self.settings.start_date, self.data['others'],
+            self.settings.parameters)
+
     def initialize_data(self):
         """
         Initialize the data before the simulation, including:
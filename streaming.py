@@ -0,0 +1,277 @@
+"""
+Out-of-core simulation over a bounded look-back window.
+
+Instead of loading and binding every dataset up front, datasets are read
+year by year from their yearly segments in the VersionStore. Only the
+current year plus `lookback` earlier workdays (declared in AlphaSettings)
+are bound and handed to a Simulator, which runs the year, and then the
+window slides forward. The alpha formula and the pnl function carry over
+between windows, so results are the same as a full simulation as long as
+the alpha never reads further back than its lookback. Alphas without
+lookback keep all earlier rows in the window, which is still the same as a
+full simulation but bounds nothing. Results of each window are spilled to
+a file as soon as they are produced, and read back from it one window at a
+time by whoever consumes them.
+
+In this mode alphas should read data only from the argument of generate,
+since datasets are rebuilt for every window.
+"""
+
+import bisect
+import copy
+import os
+import pickle
+import tempfile
+import weakref
+from thousandaire import codec
+from thousandaire.constants import DERIVED_FIELDS, TRADING_CONFIGS
+from thousandaire.data_classes import Data, Dataset
+from thousandaire.data_loader import DataLoader
+from thousandaire.shared_results import RESULT_FIELDS
+from thousandaire.simulator import Simulator
+from thousandaire.version_store import LATEST, VersionStore
+
+# Derived fields look at the previous row, so one more row than the lookback
+# of an alpha is kept.
+DERIVATION_MARGIN = 1
+
+def iter_years(store, data_name, version=LATEST):
+    """
+    Return a dict of instruments to (name of Data, fields, iterator of row
+    lists of one year each, in date order) of a dataset.
+    Datasets without versions are loaded whole and split by year.
+    """
+    version = store.resolve(data_name, version)
+    if version is None:
+        dataset = DataLoader([data_name], store=store).get_all()[data_name]
+        return {
+            instrument: (data.name, data.get_fields(), iter(split_years(data)))
+            for instrument, data in dataset.items()}
+    manifest = store.get_manifest(data_name, version)
+    return {
+        instrument: (
+            content['name'], content['fields'],
+            read_segments(store, content))
+        for instrument, content in manifest['instruments'].items()}
+
+def split_years(rows):
+    """
+    Split rows in date order into lists of rows of one year each.
+    """
+    years = []
+    for row in rows:
+        if not years or years[-1][0][0].year != row.date.year:
+            years.append([])
+        years[-1].append(tuple(row))
+    return years
+
+def read_segments(store, content):
+    """
+    Yield rows of segments of an instrument in a manifest, one at a time.
+    """
+    for digest in content['segments']:
+        if content.get('encoding') == 'codec':
+            yield codec.decode_rows(store.get(digest))
+        else:
+            yield pickle.loads(store.get(digest))
+
+class WindowReader:
+    """
+    Keep a sliding window of raw rows of a dataset.
+    """
+    def __init__(self, store, data_name, version=LATEST):
+        self.data_name = data_name
+        self.sources = iter_years(store, data_name, version)
+        self.pending = {instrument: None for instrument in self.sources}
+        self.rows = {instrument: [] for instrument in self.sources}
+
+    def peek(self, instrument):
+        """
+        Return the next unread rows of the instrument, or None at the end.
+        """
+        if self.pending[instrument] is None:
+            self.pending[instrument] = next(
+                self.sources[instrument][2], None)
+        return self.pending[instrument]
+
+    def read(self, year):
+        """
+        Append rows up to the end of the year into the window.
+        """
+        for instrument in self.sources:
+            rows = self.peek(instrument)
+            while rows and rows[0][0].year <= year:
+                self.rows[instrument].extend(rows)
+                self.pending[instrument] = None
+                rows = self.peek(instrument)
+
+    def is_finished(self):
+        """
+        Whether all rows have been read.
+        """
+        return all(self.peek(instrument) is None for instrument in self.sources)
+
+    def trim(self, first_date):
+        """
+        Drop rows before first_date from the window.
+        """
+        for rows in self.rows.values():
+            index = bisect.bisect_left([row[0] for row in rows], first_date)
+            del rows[:index]
+
+    def get_dataset(self):
+        """
+        Return the window as an unbound Dataset.
+        """
+        instruments = {}
+        for instrument, (name, fields, _) in self.sources.items():
+            instruments[instrument] = Data(name, fields)
+            instruments[instrument].extend(self.rows[instrument])
+        return Dataset(self.data_name, instruments)
+
+class ResultSpool:
+    """
+    Append-only file of simulation results, written window by window.
+
+    It is also a read-only view of the results: iterating it reads the file
+    back one window at a time, so that results are never all in memory.
+    Pickling gives a Data of results. A temporary file is removed once the
+    spool is garbage collected, or by remove.
+    """
+    def __init__(self, path=None):
+        """
+        path: where to spill results; a temporary file if None.
+        """
+        self.finalizer = None
+        if path is None:
+            handle, path = tempfile.mkstemp(suffix='.results')
+            os.close(handle)
+            self.finalizer = weakref.finalize(self, os.remove, path)
+        self.path = path
+        self.count = 0
+        self.data_type = Data('result', RESULT_FIELDS).data_type
+        with open(self.path, 'wb'):
+            pass
+
+    def append(self, results):
+        """
+        Spill results (a Data of simulation results) to the file.
+        """
+        with open(self.path, 'ab') as file:
+            pickle.dump([tuple(row) for row in results], file)
+        self.count += len(results)
+
+    def remove(self):
+        """
+        Remove a temporary file right away.
+        """
+        if self.finalizer is not None:
+            self.finalizer()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        with open(self.path, 'rb') as file:
+            while True:
+                try:
+                    rows = pickle.load(file)
+                except EOFError:
+                    return
+                for row in rows:
+                    yield self.data_type(*row)
+
+    def __reduce__(self):
+        return self.load().__reduce_ex__(2)
+
+    def load(self):
+        """
+        Return all spilled results as one Data.
+        """
+        results = Data('result', RESULT_FIELDS)
+        results.extend(self)
+        return results
+
+class StreamingSimulator:
+    """
+    Simulate an alpha over a sliding window of its data.
+    """
+    def __init__(self, settings, pnl_function, versions=None, profiler=None,
+                 store=None):
+        """
+        versions: a dict of dataset names to pinned version ids.
+        """
+        self.settings = settings
+        self.pnl_function = pnl_function
+        self.profiler = profiler
+        store = VersionStore() if store is None else store
+        versions = {} if versions is None else versions
+        _, self.region = settings.target
+        self.price_dataset = TRADING_CONFIGS[settings.target]['price_dataset']
+        self.readers = {
+            name: WindowReader(store, name, versions.get(name, LATEST))
+            for name in set(settings.data_list) | {self.price_dataset}}
+        self.workdays = WindowReader(
+            store, 'workdays', versions.get('workdays', LATEST))
+
+    def bind(self):
+        """
+        Return the current window as data for a Simulator.
+        """
+        workdays = self.workdays.get_dataset()[self.region]
+        bound = {}
+        for name, reader in self.readers.items():
+            bound[name] = reader.get_dataset()
+            bound[name].set_workdays(workdays)
+            if name in DERIVED_FIELDS:
+                bound[name].derive_fields(DERIVED_FIELDS[name])
+        return {
+            'workdays': workdays,
+            'price': bound[self.price_dataset],
+            'others': {
+                name: bound[name]
+                for name in self.settings.data_list if name in bound}}
+
+    def run(self, spool=None):
+        """
+        Start the simulation, and return the ResultSpool of its results.
+
+        spool: a ResultSpool to spill results into; a temporary one if None.
+        """
+        spool = ResultSpool() if spool is None else spool
+        settings = copy.copy(self.settings)
+        alpha_formula = None
+        resume_date = settings.start_date
+        year = None
+        while not self.workdays.is_finished():
+            year = self.workdays.peek(self.region)[0][0].year
+            self.workdays.read(year)
+            for reader in self.readers.values():
+                reader.read(year)
+            dates = [row[0] for row in self.workdays.rows[self.region]]
+            if self.workdays.is_finished() and (
+                    settings.end_date is None or settings.end_date > dates[-1]):
+                settings.end_date = dates[-1]
+            stop_date = min(dates[-1], settings.end_date)
+            if resume_date < stop_date:
+                window_settings = copy.copy(settings)
+                window_settings.start_date = resume_date
+                simulator = Simulator(
+                    window_settings, self.bind(), self.pnl_function,
+                    self.profiler)
+                if alpha_formula is None:
+                    alpha_formula = simulator.build_formula()
+                spool.append(simulator.run(alpha_formula, stop_date))
+                resume_date = max(resume_date, stop_date)
+            if stop_date >= settings.end_date:
+                break
+            if settings.lookback is None:
+                continue
+            # Keep lookback workdays before the next day to generate.
+            index = bisect.bisect_left(dates, resume_date)
+            first_date = dates[max(
+                0, index - settings.lookback - DERIVATION_MARGIN)]
+            self.workdays.trim(first_date)
+            for reader in self.readers.values():
+                reader.trim(first_date)
+        return spool
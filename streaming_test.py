@@ -0,0 +1,114 @@
+"""
+Unit tests for streaming simulation.
+"""
+
+import copy
+import datetime
+import gc
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from thousandaire.benchmark.synthetic_data import generate_raw_data
+from thousandaire.simulation import build_simulator, initialize
+from thousandaire.simulation import load_settings
+from thousandaire.rolling import WINDOWS
+from thousandaire.shared_results import dump_results, load_results
+from thousandaire.streaming import ResultSpool, StreamingSimulator
+from thousandaire.version_store import VersionStore
+
+class TestStreamingSimulator(unittest.TestCase):
+    """
+    Unit test object for StreamingSimulator.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = VersionStore(self.path)
+        raw_data = generate_raw_data(instruments=6, years=3)
+        for dataset in raw_data.values():
+            self.store.commit(dataset)
+        self.data_all = initialize(raw_data)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def simulate(self, lookback=5):
+        """
+        Return results of kdr_5 by a full and by a streaming simulation.
+        """
+        settings = load_settings('thousandaire.benchmark.kdr_5_settings')
+        settings.start_date = datetime.datetime(2015, 3, 2)
+        settings.end_date = datetime.datetime(2017, 6, 30)
+        settings.lookback = lookback
+        full = build_simulator(copy.copy(settings), self.data_all).run()
+        pnl_function = copy.deepcopy(
+            build_simulator(settings, self.data_all).pnl_function)
+        streamed = StreamingSimulator(
+            settings, pnl_function, store=self.store).run()
+        return full, streamed
+
+    def assert_same(self, full, streamed):
+        """
+        Assert that streamed results match full ones.
+        """
+        self.assertEqual(len(streamed), len(full))
+        self.assertEqual(
+            [today.date for today in streamed],
+            [today.date for today in full])
+        for expected, result in zip(full, streamed):
+            # Rolling sums restart in every window, so allow rounding.
+            np.testing.assert_allclose(
+                result.position.positions, expected.position.positions,
+                atol=1e-12)
+            np.testing.assert_allclose(
+                list(result.pnl.values()), list(expected.pnl.values()),
+                atol=1e-12)
+
+    def test_same_as_full_simulation(self):
+        """
+        Results should match a simulation on fully loaded data.
+        """
+        self.assert_same(*self.simulate())
+
+    def test_without_lookback(self):
+        """
+        Alphas without lookback should keep all past data in the window.
+        """
+        self.assert_same(*self.simulate(lookback=None))
+
+    def test_no_leaked_windows(self):
+        """
+        Rolling windows of datasets of past windows should be dropped.
+        """
+        self.simulate()
+        gc.collect()
+        self.assertEqual(len(WINDOWS), 0)
+
+    def test_spool(self):
+        """
+        The spool should be read by consumers without loading it whole,
+        and be removed once dropped.
+        """
+        full, streamed = self.simulate()
+        path = streamed.path
+        self.assertTrue(os.path.exists(path))
+        self.assert_same(full, pickle.loads(pickle.dumps(streamed)))
+        descriptor = dump_results(streamed, full[0].pnl.keys())
+        self.assert_same(full, load_results(descriptor))
+        del streamed
+        gc.collect()
+        self.assertFalse(os.path.exists(path))
+
+    def test_spool_path(self):
+        """
+        A spool at a given path should be kept.
+        """
+        spool = ResultSpool(os.path.join(self.path, 'results'))
+        spool.append(self.simulate()[0])
+        spool.remove()
+        self.assertTrue(os.path.exists(spool.path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+CPU time accounting and limits of simulation processes.
+
+Time is CPU time (user plus system) rather than wall time, so that an alpha
+is not charged for waiting on a busy machine.
+"""
+
+import contextlib
+import os
+import signal
+import threading
+from thousandaire.memory import get_descendants
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+def get_cpu_time(pid):
+    """
+    Return CPU seconds used by a process and its children which it has
+    waited for, or None if the process does not exist anymore.
+    """
+    try:
+        with open('/proc/%s/stat' % pid) as file:
+            stat = file.read()
+    except OSError:
+        return None
+    # utime, stime, cutime and cstime, after the command name and its ')'.
+    fields = stat[stat.rindex(')') + 2:].split()[11:15]
+    return sum(int(field) for field in fields) / CLOCK_TICKS
+
+def get_tree_cpu_time(pid):
+    """
+    Return CPU seconds used by a process and all its descendants, e.g. an
+    alpha process and its indicator processes.
+    """
+    return sum(
+        seconds or 0.
+        for seconds in map(get_cpu_time, [pid] + get_descendants(pid)))
+
+def min_budget(*budgets):
+    """
+    Return the tightest of budgets which are not None, or None.
+    """
+    budgets = [budget for budget in budgets if budget is not None]
+    return min(budgets) if budgets else None
+
+@contextlib.contextmanager
+def cpu_limit(seconds, message='CPU time limit exceeded'):
+    """
+    Context manager which raises TimeoutError(message) in the enclosed block
+    once it has used `seconds` of CPU time of this process.
+
+    It relies on SIGPROF, so there is no limit if seconds is None or outside
+    the main thread. Long calls into C code are interrupted only when they
+    return.
+    """
+    if seconds is None or (
+            threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+    def handler(_signum, _frame):
+        raise TimeoutError(message)
+    previous = signal.signal(signal.SIGPROF, handler)
+    signal.setitimer(signal.ITIMER_PROF, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, previous)
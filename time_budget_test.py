@@ -0,0 +1,89 @@
+"""
+Unit tests for CPU time limits.
+"""
+
+import signal
+import time
+import unittest
+from unittest import mock
+from thousandaire.benchmark.kdr_5_settings import AlphaSettings
+from thousandaire.benchmark.kdr_formula import AlphaFormula
+from thousandaire.benchmark.synthetic_data import generate_raw_data
+from thousandaire.simulation import build_simulator, initialize
+from thousandaire.simulation import load_settings, run_alpha
+from thousandaire.time_budget import cpu_limit, min_budget
+
+ALPHA = 'thousandaire.benchmark.kdr_5_settings'
+
+class SpinFormula(AlphaFormula):
+    """
+    Use CPU time forever on the third day.
+    """
+    def __init__(self, startdate, dataset, parameters):
+        AlphaFormula.__init__(self, startdate, dataset, parameters)
+        self.days = 0
+
+    def generate(self, date, dataset):
+        self.days += 1
+        while self.days == 3:
+            pass
+        return AlphaFormula.generate(self, date, dataset)
+
+def spin():
+    """
+    Use CPU time forever.
+    """
+    while True:
+        pass
+
+class TestTimeBudget(unittest.TestCase):
+    """
+    Unit test object for cpu_limit and day_time_budget of alphas.
+    """
+    @classmethod
+    def setUpClass(cls):
+        # Synthetic data covering the dates of the alpha settings.
+        cls.data_all = initialize(generate_raw_data(instruments=4, years=6))
+
+    def test_cpu_limit(self):
+        """
+        CPU time over the limit should raise TimeoutError, while wall time
+        should not count, and the handler should be restored.
+        """
+        previous = signal.getsignal(signal.SIGPROF)
+        with self.assertRaisesRegex(TimeoutError, 'too long'):
+            with cpu_limit(0.2, 'too long'):
+                spin()
+        with cpu_limit(0.2):
+            time.sleep(0.5)
+        with cpu_limit(None):
+            time.sleep(0.1)
+        self.assertIs(signal.getsignal(signal.SIGPROF), previous)
+        self.assertEqual(min_budget(None, 3., 2.), 2.)
+        self.assertIsNone(min_budget(None, None))
+
+    def test_day_time_budget(self):
+        """
+        Generate over day_time_budget of the settings should stop the
+        simulation on that day.
+        """
+        settings = load_settings(ALPHA)
+        settings.alpha = SpinFormula
+        settings.day_time_budget = 0.2
+        simulator = build_simulator(settings, self.data_all)
+        with self.assertRaisesRegex(TimeoutError, 'Generate on'):
+            simulator.run()
+
+    def test_day_time_budget_option(self):
+        """
+        day_time_budget of run_alpha should be used when it is tighter than
+        the settings.
+        """
+        with mock.patch.object(AlphaSettings, 'alpha', SpinFormula), \
+                mock.patch.object(AlphaSettings, 'day_time_budget', 1000.):
+            with self.assertRaisesRegex(TimeoutError, 'Generate on'):
+                run_alpha(
+                    self.data_all, ALPHA, True, {'day_time_budget': 0.2})
+
+if __name__ == '__main__':
+    unittest.main()
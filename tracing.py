@@ -0,0 +1,112 @@
+"""
+Opt-in tracing of spans across processes, exported as Chrome trace events.
+
+Once enabled, every process started afterwards (by fork or spawn) finds the
+trace directory in its environment, and appends its spans to a file of its
+own there as they finish, so that spans of crashed or terminated processes
+are kept up to their last finished one. merge collects all of them into one
+JSON file, which chrome://tracing or https://ui.perfetto.dev can open.
+"""
+
+import contextlib
+import functools
+import glob
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+TRACE_DIR = 'THOUSANDAIRE_TRACE_DIR'
+
+def enable(directory=None):
+    """
+    Start tracing in this process and in processes it starts afterwards.
+    Return the trace directory, a temporary one if directory is None.
+    """
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix='trace')
+    os.environ[TRACE_DIR] = directory
+    return directory
+
+def disable():
+    """
+    Stop tracing in this process and in processes it starts afterwards.
+    """
+    os.environ.pop(TRACE_DIR, None)
+
+def is_enabled():
+    """
+    Whether spans are being recorded.
+    """
+    return TRACE_DIR in os.environ
+
+def get_timestamp():
+    """
+    Return the wall clock in microseconds, which is comparable across
+    processes.
+    """
+    return time.time_ns() // 1000
+
+def emit(event):
+    """
+    Append a trace event of this process to its file.
+    """
+    event = dict(event, pid=os.getpid(), tid=threading.get_native_id())
+    path = os.path.join(os.environ[TRACE_DIR], '%d.jsonl' % os.getpid())
+    with open(path, 'a') as file:
+        file.write(json.dumps(event, default=str) + '\n')
+
+@contextlib.contextmanager
+def span(name, category='simulation', **args):
+    """
+    Context manager which records the enclosed block as a span, with args
+    shown in its details. Do nothing if tracing is disabled.
+    """
+    if not is_enabled():
+        yield
+        return
+    start = get_timestamp()
+    try:
+        yield
+    finally:
+        emit({
+            'name': name, 'cat': category, 'ph': 'X', 'ts': start,
+            'dur': get_timestamp() - start, 'args': args})
+
+def traced(name, category='simulation'):
+    """
+    Decorator recording every call of a function as a span.
+    """
+    def middle(func):
+        @functools.wraps(func)
+        def final(*args, **kwargs):
+            with span(name, category):
+                return func(*args, **kwargs)
+        return final
+    return middle
+
+def name_process(name):
+    """
+    Label this process in the trace, e.g. by the alpha it simulates.
+    """
+    if is_enabled():
+        emit({'name': 'process_name', 'ph': 'M', 'args': {'name': name}})
+
+def merge(directory, output_path, remove=True):
+    """
+    Merge spans of all processes in a trace directory into one Chrome
+    trace-event JSON file, removing the directory if remove.
+    Return the number of merged events.
+    """
+    events = []
+    for path in glob.glob(os.path.join(directory, '*.jsonl')):
+        with open(path) as file:
+            events.extend(json.loads(line) for line in file if line.strip())
+    events.sort(key=lambda event: event.get('ts', 0))
+    with open(output_path, 'w') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+    if remove:
+        shutil.rmtree(directory)
+    return len(events)
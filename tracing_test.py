@@ -0,0 +1,62 @@
+"""
+Unit tests for tracing.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from multiprocessing import Process
+from thousandaire import tracing
+
+def child():
+    """
+    Record a span in a child process.
+    """
+    tracing.name_process('child')
+    with tracing.span('work', size=3):
+        pass
+
+class TestTracing(unittest.TestCase):
+    """
+    Unit test object for tracing.
+    """
+    def test_merge(self):
+        """
+        Spans of a child process should be merged with those of its parent.
+        """
+        directory = tracing.enable()
+        try:
+            with tracing.span('parent'):
+                process = Process(target=child)
+                process.start()
+                process.join()
+        finally:
+            tracing.disable()
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        try:
+            self.assertEqual(tracing.merge(directory, path), 3)
+            with open(path) as file:
+                events = json.load(file)['traceEvents']
+        finally:
+            os.remove(path)
+        self.assertFalse(os.path.exists(directory))
+        spans = {
+            event['name']: event for event in events if event['ph'] == 'X'}
+        self.assertEqual(spans['parent']['pid'], os.getpid())
+        self.assertEqual(spans['work']['pid'], process.pid)
+        self.assertEqual(spans['work']['args'], {'size': 3})
+        self.assertLessEqual(spans['parent']['ts'], spans['work']['ts'])
+
+    def test_disabled(self):
+        """
+        Nothing should be recorded while tracing is disabled.
+        """
+        self.assertFalse(tracing.is_enabled())
+        with tracing.span('ignored'):
+            pass
+        tracing.name_process('ignored')
+
+if __name__ == '__main__':
+    unittest.main()
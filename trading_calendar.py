@@ -0,0 +1,110 @@
+"""
+Dense integer index of the workdays of a region.
+
+Workdays are numbered 0, 1, ... in date order once per region. Controllers
+aligned with the workdays keep their rows as a contiguous range of these
+indices, so that finding the row of a date is a table lookup instead of a
+binary search over datetime objects, and comparing days is comparing
+integers. Dates are looked up through a table over every calendar day
+between the first and the last workday.
+"""
+
+import numpy as np
+
+class TradingCalendar:
+    """
+    Map dates to indices of workdays and back.
+    Calendars are immutable, so copies share the same one.
+    """
+    def __init__(self, dates):
+        """
+        dates: workdays in strictly increasing order. Raise ValueError
+            otherwise, since lookups would silently return wrong days.
+        """
+        self.dates = list(dates)
+        for index, (earlier, later) in enumerate(
+                zip(self.dates, self.dates[1:])):
+            if not earlier < later:
+                raise ValueError(
+                    'Workdays should be strictly increasing: %s at %d is '
+                    'followed by %s.' % (earlier, index, later))
+        self.ordinals = np.array(
+            [date.toordinal() for date in self.dates], dtype=np.int64)
+        ordinals = self.ordinals
+        self.first_ordinal = int(ordinals[0]) if len(ordinals) > 0 else 0
+        marks = np.zeros(
+            int(ordinals[-1]) - self.first_ordinal + 1
+            if len(ordinals) > 0 else 0, dtype=np.int64)
+        marks[ordinals - self.first_ordinal] = 1
+        # Index of the last workday on or before each calendar day.
+        self.floor = (np.cumsum(marks) - 1).tolist()
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def index_on_or_before(self, date):
+        """
+        Return the index of the last workday on or before the date, or -1 if
+        the date is before the first workday.
+        """
+        day = date.toordinal() - self.first_ordinal
+        if day < 0:
+            return -1
+        index = self.floor[day] if day < len(self.floor) else len(self) - 1
+        # Dates within the same day, e.g. datetimes not at midnight.
+        while index >= 0 and self.dates[index] > date:
+            index -= 1
+        return index
+
+    def index_on_or_after(self, date):
+        """
+        Return the index of the first workday on or after the date, which is
+        len(self) if the date is after the last workday.
+        """
+        index = self.index_on_or_before(date)
+        if index < 0 or self.dates[index] < date:
+            index += 1
+        return index
+
+    def date_of(self, index):
+        """
+        Return the workday of an index.
+        """
+        return self.dates[index]
+
+class CalendarCursor:
+    """
+    The current simulating day of data aligned with a calendar.
+
+    All instruments of a Dataset synchronized with workdays share one
+    cursor, so that moving the Dataset is one step however many instruments
+    it has.
+    """
+    def __init__(self, calendar, stop):
+        """
+        stop: the number of visible workdays. The cursor starts there, i.e.
+            after all data.
+        """
+        self.calendar = calendar
+        self.stop = stop
+        self.index = stop
+
+    def move_forward(self):
+        """
+        Move to the next workday.
+        """
+        if self.index >= self.stop:
+            raise ValueError("Date not found.")
+        self.index += 1
+
+    def set_date(self, target_date):
+        """
+        Move to the last workday on or before target_date, or to the first
+        workday if target_date is earlier.
+        """
+        if self.stop == 0 or self.calendar.date_of(self.stop - 1) < target_date:
+            raise ValueError("Date not found.")
+        self.index = max(self.calendar.index_on_or_before(target_date), 0)
@@ -0,0 +1,58 @@
+"""
+Unit tests for TradingCalendar.
+"""
+
+import datetime
+import unittest
+from thousandaire.trading_calendar import TradingCalendar
+
+class TestTradingCalendar(unittest.TestCase):
+    """
+    Unit test object for TradingCalendar.
+    """
+    def setUp(self):
+        self.dates = [
+            datetime.date(2020, 1, 2), datetime.date(2020, 1, 3),
+            datetime.date(2020, 1, 6), datetime.date(2020, 1, 7)]
+        self.calendar = TradingCalendar(self.dates)
+
+    def test_lookup(self):
+        """
+        Dates should map to the workdays around them.
+        """
+        self.assertEqual(len(self.calendar), 4)
+        self.assertEqual(
+            self.calendar.index_on_or_before(datetime.date(2020, 1, 1)), -1)
+        self.assertEqual(
+            self.calendar.index_on_or_before(datetime.date(2020, 1, 5)), 1)
+        self.assertEqual(
+            self.calendar.index_on_or_after(datetime.date(2020, 1, 5)), 2)
+        self.assertEqual(
+            self.calendar.index_on_or_after(datetime.date(2020, 1, 8)), 4)
+        self.assertEqual(self.calendar.date_of(2), self.dates[2])
+
+    def test_within_days(self):
+        """
+        Datetimes within the same day should be told apart.
+        """
+        dates = [
+            datetime.datetime(2020, 1, 2, 9), datetime.datetime(2020, 1, 2, 13),
+            datetime.datetime(2020, 1, 3, 9)]
+        calendar = TradingCalendar(dates)
+        self.assertEqual(
+            calendar.index_on_or_before(datetime.datetime(2020, 1, 2, 12)), 0)
+        self.assertEqual(
+            calendar.index_on_or_after(datetime.datetime(2020, 1, 2, 12)), 1)
+
+    def test_invalid_dates(self):
+        """
+        Dates out of order or duplicated should be rejected.
+        """
+        with self.assertRaises(ValueError):
+            TradingCalendar([self.dates[1], self.dates[0]])
+        with self.assertRaises(ValueError):
+            TradingCalendar(self.dates[:2] + self.dates[1:])
+        self.assertEqual(len(TradingCalendar([])), 0)
+
+if __name__ == '__main__':
+    unittest.main()
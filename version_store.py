@@ -0,0 +1,228 @@
+"""
+Immutable, content-addressed versions of datasets.
+
+Rows of each instrument are split into yearly segments, encoded by codec,
+and every segment is stored once under the sha256 of its content. A
+version of a dataset is a manifest listing segments of its instruments,
+also stored under its own hash, which is the version id. Committing a
+dataset after a crawl only writes segments that changed (usually those of
+the current year), so versions are cheap snapshots sharing everything
+else.
+
+Refs name versions: `refs/<dataset>/latest` is replaced atomically on each
+commit, and `refs/<dataset>/log` keeps every committed version. Readers
+resolve a ref once and then only read immutable objects, so they keep a
+consistent snapshot while a crawl is committing.
+
+Layout:
+    objects/<first 2 hex digits>/<hash>
+    refs/<dataset>/latest
+    refs/<dataset>/log
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import pickle
+import numpy as np
+from thousandaire import codec
+from thousandaire.constants import STORAGE_COMPRESSION, STORAGE_DTYPES
+from thousandaire.constants import VERSIONS_DIR
+from thousandaire.data_classes import Data, Dataset
+
+LATEST = 'latest'
+
+class VersionStore:
+    """
+    Store of dataset versions.
+    """
+    def __init__(self, path=VERSIONS_DIR):
+        self.path = path
+
+    def object_path(self, digest):
+        """
+        Return the path of the object with the given hash.
+        """
+        return os.path.join(self.path, 'objects', digest[:2], digest)
+
+    def ref_path(self, dataset_name, ref=LATEST):
+        """
+        Return the path of a ref of the dataset.
+        """
+        return os.path.join(self.path, 'refs', dataset_name, ref)
+
+    def put(self, content):
+        """
+        Store content (bytes) unless it already exists, and return its hash.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.isfile(path):
+            write_atomically(path, content)
+        return digest
+
+    def get(self, digest):
+        """
+        Return the content of the object with the given hash.
+        """
+        try:
+            with open(self.object_path(digest), 'rb') as file:
+                return file.read()
+        except FileNotFoundError as error:
+            raise KeyError('Object not found: %s' % digest) from error
+
+    def commit(self, dataset, metadata=None):
+        """
+        Store a Dataset as a new version, point `latest` to it, and return
+        the version id.
+        Committing the same content again returns the same version id.
+
+        metadata: an optional picklable object committed with the data, e.g.
+            last modified dates of a crawl, so that both change together.
+        """
+        dtypes = STORAGE_DTYPES.get(dataset.data_name)
+        instruments = {}
+        for instrument, data in dataset.items():
+            segments = {}
+            for row in data:
+                segments.setdefault(row.date.year, []).append(tuple(row))
+            instruments[instrument] = {
+                'name': data.name,
+                'fields': data.get_fields(),
+                'encoding': 'codec',
+                'segments': [
+                    self.put(codec.encode(
+                        rows, data.get_fields(), dtypes, STORAGE_COMPRESSION))
+                    for _, rows in sorted(segments.items())]}
+        manifest = {'dataset': dataset.data_name, 'instruments': instruments}
+        if metadata is not None:
+            manifest['metadata'] = self.put(pickle.dumps(metadata))
+        version = self.put(json.dumps(manifest, sort_keys=True).encode('utf-8'))
+        write_atomically(
+            self.ref_path(dataset.data_name), version.encode('utf-8'))
+        with open(self.ref_path(dataset.data_name, 'log'), 'a') as file:
+            file.write('%s %s\n' % (
+                datetime.datetime.now().isoformat(), version))
+        return version
+
+    def resolve(self, dataset_name, version=LATEST):
+        """
+        Return the version id of a ref (`latest`) or a version id,
+        or None if the dataset has no versions.
+        """
+        if version != LATEST:
+            return version
+        try:
+            with open(self.ref_path(dataset_name), 'rb') as file:
+                return file.read().decode('utf-8')
+        except FileNotFoundError:
+            return None
+
+    def get_manifest(self, dataset_name, version=LATEST):
+        """
+        Return the manifest of the given version (or ref).
+        """
+        version = self.resolve(dataset_name, version)
+        if version is None:
+            raise KeyError('No versions of %s.' % dataset_name)
+        manifest = json.loads(self.get(version).decode('utf-8'))
+        if manifest['dataset'] != dataset_name:
+            raise ValueError('Version %s is not of %s.'
+                             % (version, dataset_name))
+        return manifest
+
+    def load(self, dataset_name, version=LATEST, since=None):
+        """
+        Return the Dataset of the given version (or ref).
+
+        since: if given, only rows from this date on are loaded. Yearly
+            segments are then read from the newest one back, so that older
+            segments are not read at all.
+        """
+        manifest = self.get_manifest(dataset_name, version)
+        instruments = {}
+        for instrument, content in manifest['instruments'].items():
+            segments = []
+            for digest in reversed(content['segments']):
+                segments.append(self.read_segment(content, digest))
+                if since is not None and segments[-1] and (
+                        segments[-1][0][0] < since):
+                    break
+            data = Data(content['name'], content['fields'])
+            for rows in reversed(segments):
+                data.extend(
+                    rows if since is None
+                    else [row for row in rows if row[0] >= since])
+            instruments[instrument] = data
+        return Dataset(dataset_name, instruments)
+
+    def read_segment(self, content, digest):
+        """
+        Return rows of a segment of an instrument in a manifest.
+        """
+        # Versions committed before codec hold pickled rows.
+        if content.get('encoding') == 'codec':
+            return codec.decode_rows(self.get(digest))
+        return pickle.loads(self.get(digest))
+
+    def load_arrays(self, dataset_name, version=LATEST):
+        """
+        Return a dict of instruments to (dates, dict of fields to arrays) of
+        the given version (or ref), decoded without building rows, see
+        codec.decode_arrays.
+        """
+        manifest = self.get_manifest(dataset_name, version)
+        arrays = {}
+        for instrument, content in manifest['instruments'].items():
+            if content.get('encoding') == 'codec':
+                segments = [
+                    codec.decode_arrays(self.get(digest))
+                    for digest in content['segments']]
+            else:
+                segments = [
+                    codec.rows_to_arrays(
+                        pickle.loads(self.get(digest)), content['fields'])
+                    for digest in content['segments']]
+            if not segments:
+                segments = [(np.zeros(0, dtype=np.int64), {
+                    field: np.zeros(0) for field in content['fields']})]
+            arrays[instrument] = (
+                np.concatenate([dates for dates, _ in segments]),
+                {field: np.concatenate(
+                    [values[field] for _, values in segments])
+                 for field in content['fields']})
+        return arrays
+
+    def get_metadata(self, dataset_name, version=LATEST):
+        """
+        Return metadata committed with the given version (or ref), or None
+        if there is none or the dataset has no versions.
+        """
+        if self.resolve(dataset_name, version) is None:
+            return None
+        digest = self.get_manifest(dataset_name, version).get('metadata')
+        return None if digest is None else pickle.loads(self.get(digest))
+
+    def log(self, dataset_name):
+        """
+        Return (commit time, version id) of all commits of the dataset.
+        """
+        path = self.ref_path(dataset_name, 'log')
+        if not os.path.isfile(path):
+            return []
+        with open(path) as file:
+            return [tuple(line.split()) for line in file if line.strip()]
+
+def write_atomically(path, content, mode='wb'):
+    """
+    Write content into path through a temporary file, so that readers never
+    see a partial file.
+
+    mode: 'wb' for bytes, or 'w' for text.
+    """
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', mode) as file:
+        file.write(content)
+    os.replace(path + '.tmp', path)
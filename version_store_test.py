@@ -0,0 +1,108 @@
+"""
+Unit tests for the version store.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+import numpy as np
+from thousandaire.data_classes import Data, Dataset
+from thousandaire.data_loader import DataLoader
+from thousandaire.version_store import VersionStore
+
+def make_dataset(rows):
+    """
+    Build a price dataset with the given rows of USD.
+    """
+    data = Data('USD', ['buy', 'sell'])
+    data.extend(rows)
+    return Dataset('currency_price_tw', {'USD': data})
+
+def count_objects(path):
+    """
+    Return the number of objects in the store.
+    """
+    return sum(len(files) for _, _, files in os.walk(
+        os.path.join(path, 'objects')))
+
+class TestVersionStore(unittest.TestCase):
+    """
+    Unit test object for VersionStore.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = VersionStore(self.path)
+        self.rows = [
+            (datetime(2019, 12, 30), 30., 31.),
+            (datetime(2019, 12, 31), None, None),
+            (datetime(2020, 1, 2), 32., 33.)]
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_round_trip(self):
+        """
+        Loaded datasets should have the committed rows and fields.
+        """
+        version = self.store.commit(make_dataset(self.rows))
+        dataset = self.store.load('currency_price_tw', version)
+        self.assertEqual([tuple(row) for row in dataset['USD']], self.rows)
+        self.assertEqual(dataset['USD'].get_fields(), ['buy', 'sell'])
+        self.assertEqual(self.store.commit(dataset), version)
+
+    def test_snapshots(self):
+        """
+        New versions should share unchanged segments, and old versions
+        should stay loadable by id while latest moves on.
+        """
+        old = self.store.commit(make_dataset(self.rows[:2]))
+        objects = count_objects(self.path)
+        new = self.store.commit(make_dataset(self.rows))
+        # Only the 2020 segment and the manifest are new.
+        self.assertEqual(count_objects(self.path), objects + 2)
+        self.assertEqual(self.store.resolve('currency_price_tw'), new)
+        self.assertEqual(
+            [version for _, version in self.store.log('currency_price_tw')],
+            [old, new])
+        loader = DataLoader(
+            ['currency_price_tw'], {'currency_price_tw': old}, self.store)
+        self.assertEqual(len(loader.get_all()['currency_price_tw']['USD']), 2)
+        self.assertEqual(loader.get_versions(), {'currency_price_tw': old})
+
+    def test_intraday(self):
+        """
+        Rows within days should be stored and loaded as rows and arrays.
+        """
+        rows = [
+            (datetime(2019, 12, 31, 9, 0, 5), 30., 31.),
+            (datetime(2020, 1, 2, 13, 30), None, 32.)]
+        version = self.store.commit(make_dataset(rows))
+        dataset = self.store.load('currency_price_tw', version)
+        self.assertEqual([tuple(row) for row in dataset['USD']], rows)
+        dates, values = self.store.load_arrays('currency_price_tw')['USD']
+        self.assertEqual(dates.tolist(), [row[0] for row in rows])
+        self.assertTrue(np.isnan(values['buy'][1]))
+
+    def test_since(self):
+        """
+        Only rows from the given date on should be loaded, without reading
+        older segments.
+        """
+        rows = [(datetime(2018, 6, 1), 29., 30.)] + self.rows
+        self.store.commit(make_dataset(rows))
+        get = self.store.get
+        read = []
+        def get_and_record(digest):
+            read.append(digest)
+            return get(digest)
+        self.store.get = get_and_record
+        dataset = self.store.load(
+            'currency_price_tw', since=datetime(2019, 12, 31))
+        self.assertEqual([tuple(row) for row in dataset['USD']], rows[2:])
+        # The manifest, then the 2020 and 2019 segments.
+        self.assertEqual(len(read), 3)
+
+if __name__ == '__main__':
+    unittest.main()